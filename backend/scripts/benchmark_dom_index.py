@@ -0,0 +1,152 @@
+"""
+DOM map benchmark: the old BeautifulSoup dom_map (live Tag objects from a
+full html.parser tree) versus utils.dom_index.DomIndex built by the
+streaming stdlib parser, on synthetic pages of 10k and 100k nodes.
+
+Reports build time, and with tracemalloc in a second build, the memory
+still held by the finished map and the peak while building it. Also times
+the selector repair index built from the DomIndex: its build and the
+average lookup for selectors that match nothing.
+
+Usage: python scripts/benchmark_dom_index.py [nodes ...]
+"""
+import os
+import re
+import sys
+import gc
+import time
+import random
+import tracemalloc
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.dom_index import DomIndex
+from utils.selector_repair import SelectorRepairIndex
+
+TAGS = ["div", "div", "div", "span", "p", "a", "button", "input", "img", "label", "li", "ul", "section"]
+WORDS = ["alpha", "beta", "gamma", "delta", "submit", "login", "search", "menu", "card", "item"]
+
+
+def synthetic_page(nodes: int, seed: int = 7) -> str:
+    """Nested page of roughly `nodes` elements with ids, classes, names and text."""
+    rng = random.Random(seed)
+    parts = ["<html><head><meta charset='utf-8'><title>bench</title></head><body>"]
+    open_tags = []
+    for n in range(nodes):
+        tag = rng.choice(TAGS)
+        attrs = []
+        roll = rng.random()
+        if roll < 0.2:
+            attrs.append(f'id="el-{n}"')
+        elif roll < 0.7:
+            attrs.append(f'class="{rng.choice(WORDS)} {rng.choice(WORDS)}-{n % 50}"')
+        elif tag in ("input", "button"):
+            attrs.append(f'name="{rng.choice(WORDS)}-{n}"')
+        parts.append(f"<{tag} {' '.join(attrs)}>" if attrs else f"<{tag}>")
+        if tag in ("input", "img"):
+            continue
+        parts.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))))
+        if len(open_tags) < 12 and rng.random() < 0.45:
+            open_tags.append(tag)
+            continue
+        parts.append(f"</{tag}>")
+        while open_tags and rng.random() < 0.3:
+            parts.append(f"</{open_tags.pop()}>")
+    parts.extend(f"</{tag}>" for tag in reversed(open_tags))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def css_escape(s):
+    return re.sub(r'([!"#$%&\'()*+,./:;<=>?@[\\]^`{|}~])', r'\\\1', s)
+
+
+def build_bs4_dom_map(html):
+    """The dom_map test_runner built before the DomIndex, kept here as the baseline."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    elements = {}
+    for tag in soup.find_all(["input", "button", "a", "form", "div", "img", "meta", "label", "textarea", "select"]):
+        if tag.get("id"):
+            elements[f"#{tag['id']}"] = tag
+        elif tag.get("class"):
+            classes = tag.get("class")
+            if isinstance(classes, list):
+                escaped = [css_escape(c) for c in classes]
+                elements["." + ".".join(escaped)] = tag
+            else:
+                elements[f".{css_escape(classes)}"] = tag
+        elif tag.get("name"):
+            elements[f"[name='{tag['name']}']"] = tag
+    return elements
+
+
+def measure(build, html):
+    # Timed without tracemalloc, which slows allocation-heavy code several times over
+    gc.collect()
+    start = time.perf_counter()
+    result = build(html)
+    elapsed = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(html)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained, peak
+
+
+def measure_repair(index, queries: int = 2000):
+    """
+    Lookup time and repair rate for selectors that match nothing: misses
+    built from the page's own vocabulary, which must not be "repaired", and
+    near misses of real ids (a dropped or swapped character), which should be.
+    """
+    start = time.perf_counter()
+    repair_index = SelectorRepairIndex(index)
+    built = time.perf_counter() - start
+    rng = random.Random(11)
+    misses = [f"#{rng.choice(WORDS)}-{rng.choice(WORDS)}-btn" for _ in range(queries // 2)] + \
+             [f"button:has-text('{rng.choice(WORDS).capitalize()} now')" for _ in range(queries // 2)]
+    ids = [record.id for record in index.records if record.id and index.is_unique(f"#{record.id}")]
+    # The same id in another naming style, as generated plans often write them
+    near = [f"#{element_id.replace('-', '_')}" for element_id in rng.sample(ids, min(len(ids), queries // 4))]
+    start = time.perf_counter()
+    false_repairs = sum(1 for selector in misses if repair_index.repair(selector, "click"))
+    per_query = (time.perf_counter() - start) / len(misses)
+    repaired = sum(1 for selector in near if repair_index.repair(selector))
+    print(f"  repair     build {built * 1000:9.1f} ms   lookup {per_query * 1e6:8.1f} us   "
+          f"{len(repair_index)} elements, {false_repairs}/{len(misses)} misses repaired, "
+          f"{repaired}/{len(near)} near misses repaired")
+
+
+def report(label, elapsed, retained, peak, entries):
+    print(f"  {label:<10} build {elapsed * 1000:9.1f} ms   retained {retained / 1e6:8.2f} MB   "
+          f"peak {peak / 1e6:8.2f} MB   {entries} selectors")
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    for nodes in sizes:
+        html = synthetic_page(nodes)
+        print(f"{nodes} nodes ({len(html) / 1e6:.1f} MB of HTML)")
+
+        index, elapsed, retained, peak = measure(DomIndex.from_html, html)
+        report("DomIndex", elapsed, retained, peak, len(index))
+        measure_repair(index)
+        del index
+
+        try:
+            dom_map, elapsed, retained, peak = measure(build_bs4_dom_map, html)
+        except ImportError:
+            print("  bs4        not installed, baseline skipped")
+            continue
+        report("bs4", elapsed, retained, peak, len(dom_map))
+        del dom_map
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Startup-cost benchmark: one fresh `python` process per test type (the old
+run_all_tests path) versus dispatching to a warm execution engine worker.
+
+Both paths import the full runner stack (Playwright, PyMuPDF, gemini_client);
+no LLM call or navigation is made.
+
+Usage: python scripts/benchmark_startup.py [runs]
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS_DIR = os.path.join(BACKEND_DIR, "scripts")
+sys.path.insert(0, BACKEND_DIR)
+
+# gemini_client refuses to import without a key; nothing is sent during the benchmark.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+
+from utils.execution_engine import ExecutionEngine
+
+
+def cold_start():
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "import test_runner"],
+        cwd=SCRIPTS_DIR,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+async def warm_dispatch(engine):
+    start = time.perf_counter()
+    await engine.ping()
+    return time.perf_counter() - start
+
+
+def report(label, samples):
+    print(f"{label:<28} mean {statistics.mean(samples) * 1000:9.1f} ms   "
+          f"p50 {statistics.median(samples) * 1000:9.1f} ms   "
+          f"max {max(samples) * 1000:9.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    cold = [cold_start() for _ in range(runs)]
+
+    engine = ExecutionEngine(workers=1)
+    boot_start = time.perf_counter()
+    engine.start(warm=True)
+    boot = time.perf_counter() - boot_start
+    try:
+        warm = [asyncio.run(warm_dispatch(engine)) for _ in range(runs)]
+    finally:
+        engine.shutdown()
+
+    print(f"Runs per path: {runs}")
+    report("subprocess per type", cold)
+    report("engine dispatch (warm)", warm)
+    print(f"{'engine one-time boot':<28} {boot * 1000:9.1f} ms")
+    print(f"Per five-type run: subprocess {sum(cold) / runs * 5:.2f} s "
+          f"vs engine {sum(warm) / runs * 5:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import sys, asyncio
+from test_runner import capture_run_snapshot_standalone
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python capture_snapshot.py <url> <test_run_id>")
+        sys.exit(1)
+    url, test_run_id = sys.argv[1], sys.argv[2]
+    asyncio.run(capture_run_snapshot_standalone(url, test_run_id))
@@ -0,0 +1,117 @@
+"""
+Local stand-in for the Gemini generateContent and streamGenerateContent
+endpoints, for exercising the LLM client's pooling, retries and circuit
+breaker without network access or an API key.
+
+Every request gets the same canned testcases (an object keyed by test type
+for batched prompts). The first --fail-first requests answer --fail-status
+instead, and --delay holds every response back, so backoff and the breaker
+can be watched in the client's stats.
+
+Usage: python scripts/gemini_stub_server.py [--port 8765] [--fail-first N] [--fail-status 503] [--delay S]
+Then:  GEMINI_API_BASE=http://127.0.0.1:8765 GEMINI_API_KEY=stub python ...
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TESTCASES = [
+    {"id": "stub_home_loads", "name": "Home page loads", "action": "assert", "selector": "body",
+     "expected": "visible", "description": "The page renders", "srsReference": "N/A"},
+    {"id": "stub_has_link", "name": "Page has a link", "action": "assert", "selector": "a",
+     "expected": "visible", "description": "At least one link is shown", "srsReference": "N/A"},
+    {"id": "stub_open_link", "name": "Open first link", "action": "click", "selector": "a",
+     "expected": "navigates", "description": "The first link can be followed", "srsReference": "N/A"},
+]
+BATCH_KEYS = re.compile(r"Output ONE JSON object with exactly the keys ([^.]+?)\. ")
+STREAM_CHUNK_CHARS = 80
+
+
+def response_text(prompt: str) -> str:
+    keys = BATCH_KEYS.search(" ".join(prompt.split()))
+    if keys:
+        return json.dumps({k: TESTCASES for k in re.findall(r'"([^"]+)"', keys.group(1))})
+    return json.dumps(TESTCASES)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    requests_seen = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.lock:
+            StubHandler.requests_seen += 1
+            seen = StubHandler.requests_seen
+        time.sleep(self.server.options.delay)
+        if seen <= self.server.options.fail_first:
+            self.send_json(self.server.options.fail_status, {"error": {"message": f"stub failure {seen}"}},
+                           {"Retry-After": "0"} if self.server.options.fail_status == 429 else {})
+            return
+
+        prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+        text = response_text(prompt)
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+        if ":streamGenerateContent" in self.path:
+            self.send_stream(text, usage)
+        elif ":generateContent" in self.path:
+            self.send_json(200, {"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": usage})
+        else:
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, text, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for k in range(0, len(text), STREAM_CHUNK_CHARS):
+            chunk = {"candidates": [{"content": {"parts": [{"text": text[k:k + STREAM_CHUNK_CHARS]}]}}]}
+            if k + STREAM_CHUNK_CHARS >= len(text):
+                chunk["usageMetadata"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.options.chunk_delay)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        print(f"stub: {self.command} {self.path.split('?')[0]} -> {args[1] if len(args) > 1 else ''}",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini API stub")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="seconds between streamed chunks")
+    options = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), StubHandler)
+    server.options = options
+    print(f"Gemini stub listening on http://127.0.0.1:{options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,60 +2,232 @@ import sys
 import os
 import json
 import asyncio
-import re
-from contextlib import redirect_stdout
+import math
+import time
+from contextlib import redirect_stdout, nullcontext
 from io import StringIO
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
-from bs4 import BeautifulSoup
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from utils.gemini_client import generate_testcases, extract_text_from_pdf
+from utils.gemini_client import (generate_testcases_async, generate_testcases_stream, extract_text_from_pdf,
+                                 GEMINI_MODEL, GENERATION_STREAMING, prompt_fingerprint)
+from utils.browser_pool import get_browser_pool, close_browser_pool
+from utils.cancellation import run_cancellable
+from utils.result_channel import open_channel
+from utils.dom_index import DomIndex, INDEXED_TAGS, INDEX_PAGE_JS
+from utils.dom_snapshot import DomSnapshot, capture_snapshot, capture_snapshot_payload, snapshot_checks
+from utils.plan_validation import validate_plan
+from utils.selector_repair import SelectorRepairIndex
+from utils.artifacts import (run_artifact_path, write_json_gz, read_json_gz, write_json, read_json,
+                             DOM_SNAPSHOT_FILE, DOM_SNAPSHOT_META_FILE)
 
-# Escape special chars
-def css_escape(s):
-    return re.sub(r'([!"#$%&\'()*+,./:;<=>?@[\\]^`{|}~])', r'\\\1', s)
+# Build the DOM map from the page that executes the tests instead of a separate scrape
+SINGLE_SESSION = os.getenv("SINGLE_SESSION", "1") == "1"
+
+# Isolated contexts for read-only testcases; below MIN_TESTS_PER_SHARD per shard they share the main page
+TEST_SHARDS = int(os.getenv("TEST_SHARDS", "4"))
+MIN_TESTS_PER_SHARD = int(os.getenv("MIN_TESTS_PER_SHARD", "3"))
+
+# Actions that never change page state and may run concurrently
+READ_ONLY_ACTIONS = {"assert"}
+
+# "snapshot" captures the DOM with one CDP DOMSnapshot call on chromium; "evaluate" indexes it in the page
+DOM_CAPTURE = os.getenv("DOM_CAPTURE", "snapshot")
+# Types that also get the checks a DOM snapshot answers on its own
+SNAPSHOT_CHECK_TYPES = {"uiux", "accessibility", "performance"}
+# Types that capture their own snapshot instead of reading the run's shared one
+FRESH_SNAPSHOT_TYPES = {t.strip() for t in os.getenv("FRESH_SNAPSHOT_TYPES", "").split(",") if t.strip()}
+
+# Engines the compatibility type runs the same plan on, concurrently
+COMPATIBILITY_BROWSERS = [b.strip() for b in os.getenv("COMPATIBILITY_BROWSERS", "chromium,firefox,webkit").split(",")
+                          if b.strip()]
+
+# Time budget for one test type; the run-wide deadline comes from run_all_tests
+TYPE_TIME_BUDGET_SECONDS = float(os.getenv("TYPE_TIME_BUDGET_SECONDS", "300"))
+NAVIGATION_TIMEOUT_MS = 60000
+DEFAULT_ACTION_TIMEOUT_MS = 5000
+MIN_ACTION_TIMEOUT_MS = int(os.getenv("MIN_ACTION_TIMEOUT_MS", "750"))
+MAX_ACTION_TIMEOUT_MS = int(os.getenv("MAX_ACTION_TIMEOUT_MS", "15000"))
+
+class ActionClock:
+    """
+    Time budget for one test type plus adaptive Playwright timeouts. Action
+    timeouts scale with the page's measured load time and the slowest recent
+    successful actions, so slow sites get more slack and fast sites stop
+    waiting 5 s on every missing selector.
+    """
+
+    def __init__(self, budget_seconds=TYPE_TIME_BUDGET_SECONDS, deadline=None):
+        self.deadline = time.time() + budget_seconds
+        if deadline:
+            self.deadline = min(self.deadline, deadline)
+        self.load_ms = None
+        self.action_ms = []
+
+    def remaining_ms(self):
+        return max(0, int((self.deadline - time.time()) * 1000))
+
+    def expired(self):
+        return self.remaining_ms() <= 0
+
+    def navigation_timeout(self):
+        return max(1, min(NAVIGATION_TIMEOUT_MS, self.remaining_ms()))
+
+    def record_load(self, ms):
+        self.load_ms = ms
+
+    def record_action(self, ms):
+        self.action_ms = (self.action_ms + [ms])[-20:]
+
+    def action_timeout(self):
+        if self.load_ms is None and not self.action_ms:
+            timeout = DEFAULT_ACTION_TIMEOUT_MS
+        else:
+            recent = sorted(self.action_ms)
+            p90 = recent[math.ceil(len(recent) * 0.9) - 1] if recent else 0
+            timeout = max(2 * (self.load_ms or 0), 3 * p90)
+        timeout = min(max(timeout, MIN_ACTION_TIMEOUT_MS), MAX_ACTION_TIMEOUT_MS)
+        return max(1, min(timeout, self.remaining_ms()))
+
+# Build the DOM index from page HTML
+def build_dom_map(html):
+    return DomIndex.from_html(html)
+
+# Build the DOM index inside the page, skipping HTML serialization and parsing
+async def index_page(page):
+    collected = await page.evaluate(INDEX_PAGE_JS, sorted(INDEXED_TAGS))
+    return DomIndex.from_browser(collected)
+
+# DOM index, plus the CDP snapshot it was built from where the engine supports one
+async def capture_dom(page, browser_type="chromium"):
+    if DOM_CAPTURE == "snapshot" and browser_type == "chromium":
+        try:
+            snapshot = await capture_snapshot(page)
+            return snapshot.to_index(), snapshot
+        except Exception as e:
+            print(f"[DEBUG] DOM snapshot failed, indexing in the page: {e}", file=sys.stderr)
+    return await index_page(page), None
 
 # Scrape DOM
 async def scrape_dom(url, browser_type="chromium"):
-    async with async_playwright() as p:
-        browser = await getattr(p, browser_type).launch(headless=True)
-        page = await browser.new_page()
-        await page.goto(url, timeout=60000)
-        html = await page.content()
-        await browser.close()
-
-    soup = BeautifulSoup(html, "html.parser")
-    elements = {}
-    for tag in soup.find_all(["input", "button", "a", "form", "div", "img", "meta", "label", "textarea", "select"]):
-        if tag.get("id"):
-            elements[f"#{tag['id']}"] = tag
-        elif tag.get("class"):
-            classes = tag.get("class")
-            if isinstance(classes, list):
-                escaped = [css_escape(c) for c in classes]
-                elements["." + ".".join(escaped)] = tag
-            else:
-                elements[f".{css_escape(classes)}"] = tag
-        elif tag.get("name"):
-            elements[f"[name='{tag['name']}']"] = tag
-    
-    return elements
+    async with get_browser_pool().context(browser_type) as context:
+        page = await context.new_page()
+        await page.goto(url, timeout=NAVIGATION_TIMEOUT_MS)
+        dom_map, _ = await capture_dom(page, browser_type)
+        return dom_map
+
+# Snapshot the target once for the whole run and store it as a run artifact every test type reads
+async def capture_run_snapshot(url, test_run_id):
+    """
+    Returns the artifact's metadata: its path (None when DOM_CAPTURE is not
+    "snapshot"), the DOM hash and what generated the testcases, which
+    together key the result cache. The metadata is also written next to
+    the artifact for callers in another process.
+    """
+    async with get_browser_pool().context("chromium") as context:
+        page = await context.new_page()
+        await page.goto(url, timeout=NAVIGATION_TIMEOUT_MS)
+        if DOM_CAPTURE == "snapshot":
+            payload = await capture_snapshot_payload(page)
+            dom_map = DomSnapshot(payload).to_index()
+        else:
+            payload = None
+            dom_map = await index_page(page)
+
+    path = None
+    if payload is not None:
+        path = run_artifact_path(test_run_id, DOM_SNAPSHOT_FILE)
+        write_json_gz(path, payload)
+    meta = {"path": path, "dom_hash": dom_map.fingerprint(), "model": GEMINI_MODEL,
+            "prompt_version": prompt_fingerprint()}
+    write_json(run_artifact_path(test_run_id, DOM_SNAPSHOT_META_FILE), meta)
+    return meta
+
+# Load the run's shared snapshot artifact, or None if there is none to share
+def load_run_snapshot(snapshot_path):
+    if not snapshot_path or not os.path.exists(snapshot_path):
+        return None
+    try:
+        return DomSnapshot(read_json_gz(snapshot_path))
+    except Exception as e:
+        print(f"[DEBUG] Could not load shared DOM snapshot {snapshot_path}: {e}", file=sys.stderr)
+        return None
+
+# The plan generated for this test type by the run's batched generation, or None to generate it here
+def load_run_plan(plans_path, test_type):
+    if not plans_path or not os.path.exists(plans_path):
+        return None
+    try:
+        return read_json(plans_path).get(test_type)
+    except Exception as e:
+        print(f"[DEBUG] Could not load generated plans {plans_path}: {e}", file=sys.stderr)
+        return None
+
+# Whether a testcase must start from a freshly loaded target page
+def needs_fresh_state(page, testcase):
+    return page.is_closed() or bool(testcase.get("freshState"))
 
-# Normalize selectors
+# Normalize selectors: trim every part of a selector list
 def normalize_selector(selector, dom_map):
     if not selector:
         return selector
-    selectors = [s.strip() for s in selector.split(",")]
-    mapped = []
-    for sel in selectors:
-        if sel in dom_map:
-            mapped.append(sel)
-        else:
-            mapped.append(sel)
-    return ", ".join(mapped)
+    return ", ".join(s.strip() for s in selector.split(","))
+
+# Actions whose selector the pre-pass can resolve ahead of time
+RESOLVABLE_ACTIONS = {"click", "type", "assert"}
+
+# Grace period for elements rendered just after load before a selector counts as missing
+SELECTOR_SETTLE_MS = int(os.getenv("SELECTOR_SETTLE_MS", "500"))
+
+# Existence, visibility, match count and bounding box for many selectors in one round trip.
+# Selectors the browser cannot parse as CSS (Playwright's text=, >> chains) come back as null.
+RESOLVE_SELECTORS_JS = """
+(selectors) => selectors.map((selector) => {
+    let nodes;
+    try {
+        nodes = document.querySelectorAll(selector);
+    } catch (e) {
+        return null;
+    }
+    const first = nodes[0];
+    if (!first) {
+        return {exists: false, visible: false, count: 0, bbox: null};
+    }
+    const rect = first.getBoundingClientRect();
+    const style = window.getComputedStyle(first);
+    const visible = rect.width > 0 && rect.height > 0 && style.visibility !== "hidden";
+    return {
+        exists: true,
+        visible: visible,
+        count: nodes.length,
+        bbox: {x: rect.x, y: rect.y, width: rect.width, height: rect.height}
+    };
+})
+"""
+
+# Resolve selectors against the page's current DOM; {} if the page cannot be queried
+async def resolve_selectors(page, selectors, timeout=DEFAULT_ACTION_TIMEOUT_MS):
+    selectors = sorted({s for s in selectors if s})
+    if not selectors:
+        return {}
+    try:
+        infos = await asyncio.wait_for(page.evaluate(RESOLVE_SELECTORS_JS, selectors), timeout / 1000)
+        resolution = dict(zip(selectors, infos))
+        missing = [s for s, info in resolution.items() if info and not info["exists"]]
+        if missing and SELECTOR_SETTLE_MS:
+            await asyncio.sleep(SELECTOR_SETTLE_MS / 1000)
+            infos = await asyncio.wait_for(page.evaluate(RESOLVE_SELECTORS_JS, missing), timeout / 1000)
+            resolution.update(zip(missing, infos))
+    except Exception as e:
+        print(f"[DEBUG] Selector pre-pass failed, using per-test waits: {e}", file=sys.stderr)
+        return {}
+    print(f"[DEBUG] Selector pre-pass: {len(selectors)} selectors, "
+          f"{sum(1 for i in resolution.values() if i and not i['exists'])} missing", file=sys.stderr)
+    return resolution
 
 # Execute testcase
-async def execute_test(page, testcase, dom_map, test_type):
+async def execute_test(page, testcase, dom_map, test_type, timeout=DEFAULT_ACTION_TIMEOUT_MS,
+                       navigation_timeout=NAVIGATION_TIMEOUT_MS, resolution=None):
     result = {
         "id": testcase.get("id", "unknown"),
         "name": testcase.get("name", "Unnamed Test"),
@@ -70,28 +242,42 @@ async def execute_test(page, testcase, dom_map, test_type):
     action = testcase.get("action")
     expected = testcase.get("expected")
 
+    # A selector the pre-pass found nothing for fails now instead of after a full timeout,
+    # and one it found visible needs no wait_for_selector round trip
+    info = (resolution or {}).get(selector) if action in RESOLVABLE_ACTIONS else None
+    if info and not info["exists"]:
+        if action == "assert":
+            result["details"] = f"Assertion failed: element {selector} not found"
+        else:
+            result["details"] = f"Error: element {selector} not found on the page"
+        return result
+    ready = bool(info and info["visible"])
+
     try:
         if action == "goto":
-            await page.goto(selector if selector.startswith("http") else page.url)
+            await page.goto(selector if selector.startswith("http") else page.url, timeout=navigation_timeout)
             result["status"] = "pass"
             result["details"] = "Navigation success"
 
         elif action == "click":
-            await page.wait_for_selector(selector, timeout=5000)
-            await page.click(selector)
+            if not ready:
+                await page.wait_for_selector(selector, timeout=timeout)
+            await page.click(selector, timeout=timeout)
             result["status"] = "pass"
             result["details"] = "Click success"
 
         elif action == "type":
-            await page.wait_for_selector(selector, timeout=5000)
-            await page.fill(selector, expected or "Sample Input")
+            if not ready:
+                await page.wait_for_selector(selector, timeout=timeout)
+            await page.fill(selector, expected or "Sample Input", timeout=timeout)
             result["status"] = "pass"
             result["details"] = "Typing success"
 
         elif action == "assert":
             try:
-                await page.wait_for_selector(selector, timeout=5000)
-                text = await page.inner_text(selector)
+                if not ready:
+                    await page.wait_for_selector(selector, timeout=timeout)
+                text = await page.inner_text(selector, timeout=timeout)
                 if expected in text or expected == "true":
                     result["status"] = "pass"
                     result["details"] = "Assertion success"
@@ -103,8 +289,8 @@ async def execute_test(page, testcase, dom_map, test_type):
         elif action == "login":
             fields = selector.split(",")
             if len(fields) >= 2:
-                await page.fill(fields[0].strip(), "dummyuser")
-                await page.fill(fields[1].strip(), "dummypass")
+                await page.fill(fields[0].strip(), "dummyuser", timeout=timeout)
+                await page.fill(fields[1].strip(), "dummypass", timeout=timeout)
                 await page.keyboard.press("Enter")
                 result["status"] = "pass"
                 result["details"] = "Login simulated"
@@ -114,46 +300,497 @@ async def execute_test(page, testcase, dom_map, test_type):
     except Exception as e:
         result["details"] = f"Error: {e}"
 
+    if testcase.get("repairedFrom"):
+        result["details"] += f" (selector {testcase['repairedFrom']} matched nothing; repaired to {selector})"
+        result["repairedSelector"] = {"from": testcase["repairedFrom"], "to": selector,
+                                      "score": testcase.get("repairScore")}
     return result
 
+# Error result for a testcase that raised during execution
+def execution_error_result(tc, i, test_type, e):
+    return {
+        "id": tc.get("id", f"test_{i+1}"),
+        "name": tc.get("name", f"Test {i+1}"),
+        "status": "error",
+        "type": test_type,
+        "description": tc.get("description", "Test execution failed"),
+        "details": f"Test execution error: {str(e)}",
+        "srsReference": tc.get("srsReference", "N/A")
+    }
+
+# Result for a testcase that never ran because the time budget ran out
+def skipped_result(tc, i, test_type, reason="Time budget exhausted before this test could run"):
+    return {
+        "id": tc.get("id", f"test_{i+1}"),
+        "name": tc.get("name", f"Test {i+1}"),
+        "status": "skipped",
+        "type": test_type,
+        "description": tc.get("description", ""),
+        "details": reason,
+        "srsReference": tc.get("srsReference", "N/A")
+    }
+
+# Result for a testcase validation showed cannot run, reported without touching the browser
+def invalid_result(tc, i, test_type, reason):
+    return {
+        "id": tc.get("id", f"test_{i+1}"),
+        "name": tc.get("name", f"Test {i+1}"),
+        "status": "invalid",
+        "type": test_type,
+        "description": tc.get("description", ""),
+        "details": f"Not executed: {reason}",
+        "srsReference": tc.get("srsReference", "N/A")
+    }
+
+# Validate the plan against the loaded page, repairing selectors that match nothing where possible
+async def validate_testcases(page, testcases, dom_map, clock, mutated=False):
+    """
+    Returns (testcases, invalid, repaired): the plan with repaired
+    selectors swapped in, the reason for each testcase that cannot run,
+    and the indices whose selector was repaired.
+
+    Actions and selectors are checked against the DOM index first. A
+    selector the index has no match for gets the closest real element
+    from the repair index, and both are checked on the live page in one
+    batched call, so elements rendered after the index was built are not
+    mistaken for missing ones.
+    """
+    invalid = validate_plan(testcases, dom_map, mutated)
+    unconfirmed = {i: normalize_selector(testcases[i].get("selector"), dom_map)
+                   for i, (_, from_dom) in invalid.items() if from_dom}
+    repaired = []
+    if unconfirmed:
+        started = time.perf_counter()
+        repair_index = SelectorRepairIndex.of(dom_map)
+        candidates = {}
+        for i, selector in unconfirmed.items():
+            candidate = repair_index.repair(selector, testcases[i].get("action"))
+            if candidate:
+                candidates[i] = candidate
+        print(f"[DEBUG] Selector repair: {len(repair_index)} elements indexed, {len(unconfirmed)} queries in "
+              f"{(time.perf_counter() - started) * 1e6:.0f}us", file=sys.stderr)
+
+        resolution = await resolve_selectors(
+            page, [*unconfirmed.values(), *(selector for selector, _ in candidates.values())], clock.action_timeout()
+        )
+        testcases = list(testcases)
+        for i, selector in unconfirmed.items():
+            info = resolution.get(selector)
+            if not info or info["exists"]:
+                del invalid[i]
+                continue
+            if i not in candidates:
+                continue
+            candidate, score = candidates[i]
+            info = resolution.get(candidate)
+            if info and info["exists"]:
+                del invalid[i]
+                testcases[i] = {**testcases[i], "selector": candidate, "repairedFrom": selector, "repairScore": score}
+                repaired.append(i)
+    return testcases, {i: reason for i, (reason, _) in invalid.items()}, repaired
+
+# Split a plan into pristine read-only tests and the ordered steps for the primary page
+def plan_execution(testcases):
+    """
+    Returns (pristine, steps). `pristine` holds indices of read-only testcases
+    that only need the freshly loaded page: the leading asserts and any assert
+    marked freshState. `steps` is the ordered remainder, where state-mutating
+    testcases run one at a time and consecutive asserts form a parallel batch.
+    """
+    pristine, steps = [], []
+    mutated = False
+    for i, tc in enumerate(testcases):
+        read_only = tc.get("action") in READ_ONLY_ACTIONS
+        if read_only and (not mutated or tc.get("freshState")):
+            pristine.append(i)
+        elif read_only:
+            if steps and steps[-1][0] == "parallel":
+                steps[-1][1].append(i)
+            else:
+                steps.append(("parallel", [i]))
+        else:
+            steps.append(("serial", [i]))
+            mutated = True
+    return pristine, steps
+
+# Execute a plan: pristine asserts sharded across isolated contexts, the rest on `page`
+async def execute_plan(url, page, testcases, dom_map, test_type, browser_type="chromium", shards=TEST_SHARDS,
+                       results=None, clock=None, on_result=None):
+    # Filled in place so a cancelled run still has the results collected so far
+    results = [] if results is None else results
+    results[:] = [None] * len(testcases)
+    clock = clock or ActionClock()
+    pristine, steps = plan_execution(testcases)
+
+    selectors = [normalize_selector(tc.get("selector"), dom_map) if tc.get("action") in RESOLVABLE_ACTIONS else None
+                 for tc in testcases]
+
+    def finish(i, result):
+        results[i] = result
+        if on_result:
+            on_result(i, result)
+
+    async def resolve(target_page, indices):
+        return await resolve_selectors(target_page, (selectors[i] for i in indices), clock.action_timeout())
+
+    async def run_one(target_page, i, resolution=None):
+        tc = testcases[i]
+        if clock.expired():
+            finish(i, skipped_result(tc, i, test_type))
+            return
+        started = time.monotonic()
+        try:
+            result = await execute_test(target_page, tc, dom_map, test_type,
+                                        clock.action_timeout(), clock.navigation_timeout(), resolution)
+        except Exception as e:
+            result = execution_error_result(tc, i, test_type, e)
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        result["durationMs"] = elapsed_ms
+        if result["status"] == "pass":
+            clock.record_action(elapsed_ms)
+        finish(i, result)
+
+    async def run_shard(indices):
+        async with get_browser_pool().context(browser_type) as context:
+            shard_page = await context.new_page()
+            if clock.expired():
+                for i in indices:
+                    finish(i, skipped_result(testcases[i], i, test_type))
+                return
+            await shard_page.goto(url, timeout=clock.navigation_timeout())
+            resolution = await resolve(shard_page, indices)
+            for i in indices:
+                await run_one(shard_page, i, resolution)
+
+    # Every selector in the plan, resolved once against the freshly loaded primary page
+    initial = await resolve(page, range(len(testcases)))
+
+    async def run_primary():
+        nonlocal page
+        dirty = False
+        for kind, indices in steps:
+            if kind == "parallel":
+                # The page has changed since the last resolution: re-resolve this batch in one call
+                resolution = await resolve(page, indices) if dirty else initial
+                await asyncio.gather(*(run_one(page, i, resolution) for i in indices))
+                continue
+            i = indices[0]
+            if needs_fresh_state(page, testcases[i]) and (dirty or page.is_closed()) and not clock.expired():
+                if page.is_closed():
+                    page = await page.context.new_page()
+                await page.goto(url, timeout=clock.navigation_timeout())
+            await run_one(page, i, None if dirty else initial)
+            dirty = True
+
+    shard_count = min(shards, len(pristine) // MIN_TESTS_PER_SHARD)
+    if shard_count > 1:
+        groups = [pristine[n::shard_count] for n in range(shard_count)]
+
+        async def run_sharded():
+            shard_results = await asyncio.gather(*(run_shard(g) for g in groups), return_exceptions=True)
+            for group, outcome in zip(groups, shard_results):
+                if isinstance(outcome, Exception):
+                    for i in group:
+                        if results[i] is None:
+                            finish(i, execution_error_result(testcases[i], i, test_type, outcome))
+
+        await asyncio.gather(run_sharded(), run_primary())
+    else:
+        # Too few pristine asserts to pay for extra navigations: batch them on the primary page
+        await asyncio.gather(*(run_one(page, i, initial) for i in pristine))
+        await run_primary()
+
+    return results
+
+# Execute testcases one by one as the generator streams them, all on `page`
+async def execute_stream(url, page, stream, dom_map, test_type, results, clock, on_result=None):
+    """
+    Returns (pruned, repaired) counts. Nothing is known about the steps
+    still to come, so there is no sharding or batching: each testcase is
+    validated (and its selector repaired) on arrival, then run in order.
+    """
+    pruned, repaired = 0, 0
+    dirty = False
+    async for tc in stream:
+        i = len(results)
+        results.append(None)
+        if clock.expired():
+            result = skipped_result(tc, i, test_type)
+        else:
+            checked, invalid, fixed = await validate_testcases(page, [tc], dom_map, clock, mutated=dirty)
+            tc = checked[0]
+            repaired += len(fixed)
+            if invalid:
+                pruned += 1
+                result = invalid_result(tc, i, test_type, invalid[0])
+            else:
+                if needs_fresh_state(page, tc) and (dirty or page.is_closed()):
+                    if page.is_closed():
+                        page = await page.context.new_page()
+                    await page.goto(url, timeout=clock.navigation_timeout())
+                    dirty = False
+                started = time.monotonic()
+                try:
+                    result = await execute_test(page, tc, dom_map, test_type,
+                                                clock.action_timeout(), clock.navigation_timeout())
+                except Exception as e:
+                    result = execution_error_result(tc, i, test_type, e)
+                elapsed_ms = int((time.monotonic() - started) * 1000)
+                result["durationMs"] = elapsed_ms
+                if result["status"] == "pass":
+                    clock.record_action(elapsed_ms)
+                if tc.get("action") not in READ_ONLY_ACTIONS:
+                    dirty = True
+        results[i] = result
+        if on_result:
+            on_result(i, result)
+    return pruned, repaired
+
+# Load the target in one engine and execute the plan there
+async def run_on_browser(url, testcases, test_type, browser_type, results, clock, single_session=SINGLE_SESSION,
+                         on_result=None, on_loaded=None, snapshot=None, on_validated=None, stream=None):
+    """
+    With `stream` (an async iterator of testcases), `testcases` is ignored
+    and each streamed testcase runs as it arrives; the snapshot checks are
+    then reported after the stream ends.
+    """
+    # The run's shared snapshot stands in for scraping the page again
+    dom_map = snapshot.to_index() if snapshot else None
+    if dom_map is None and not single_session:
+        dom_map = await scrape_dom(url, browser_type)
+
+    async with get_browser_pool().context(browser_type) as context:
+        page = await context.new_page()
+        started = time.monotonic()
+        await page.goto(url, timeout=clock.navigation_timeout())
+        clock.record_load(int((time.monotonic() - started) * 1000))
+
+        if dom_map is None or (snapshot is None and test_type in SNAPSHOT_CHECK_TYPES):
+            captured, snapshot = await capture_dom(page, browser_type)
+            dom_map = dom_map or captured
+        if on_loaded:
+            on_loaded(clock.load_ms)
+
+        # Checks the snapshot answers without touching the page again, reported before the plan runs
+        checks = snapshot_checks(snapshot, test_type, (page.viewport_size or {}).get("width")) if snapshot else []
+        if stream is not None:
+            results[:] = []
+            try:
+                pruned, repaired = await execute_stream(url, page, stream, dom_map, test_type, results, clock,
+                                                        on_result)
+                if on_validated:
+                    on_validated(pruned, pruned * clock.action_timeout(), repaired)
+            finally:
+                for check in checks:
+                    if on_result:
+                        on_result(len(results), check)
+                    results.append(check)
+            return results
+
+        for k, check in enumerate(checks):
+            if on_result:
+                on_result(len(testcases) + k, check)
+
+        # Invalid testcases are reported now; only the viable ones go to the browser
+        results[:] = [None] * len(testcases)
+        testcases, invalid, repaired = await validate_testcases(page, testcases, dom_map, clock)
+        for i, reason in invalid.items():
+            results[i] = invalid_result(testcases[i], i, test_type, reason)
+            if on_result:
+                on_result(i, results[i])
+        viable = [i for i in range(len(testcases)) if i not in invalid]
+        if on_validated:
+            # Each pruned testcase would have waited out at least one action timeout
+            on_validated(len(invalid), len(invalid) * clock.action_timeout(), len(repaired))
+
+        def on_viable_result(k, result):
+            if on_result:
+                on_result(viable[k], result)
+
+        viable_results = []
+        try:
+            await execute_plan(url, page, [testcases[i] for i in viable], dom_map, test_type, browser_type,
+                               results=viable_results, clock=clock, on_result=on_viable_result)
+        finally:
+            for k, result in enumerate(viable_results):
+                results[viable[k]] = result
+            results.extend(checks)
+        return results
+
+# Report a result under the engine that produced it
+def tag_browser(result, browser_type):
+    result["browser"] = browser_type
+    result["id"] = f"{result.get('id')}-{browser_type}"
+    result["name"] = f"{result.get('name', 'Unnamed Test')} [{browser_type}]"
+    return result
+
+# Whether a result came from the DOM snapshot checks rather than a generated testcase
+def is_snapshot_check(result, test_type):
+    return str(result.get("id", "")).startswith(f"{test_type}-snapshot-")
+
+# Generate on the event loop, yielding each testcase as soon as the response contains all of it
+async def stream_testcases(test_type, srs_content, clock, outcome):
+    """
+    Async iterator over a streamed generation. When it ends, `outcome`
+    holds the generator's (testcases, stats) under "testcases" and
+    "generation", or "timed_out" if the time budget ran out first, in
+    which case the request is cancelled.
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def generate():
+        try:
+            return await generate_testcases_stream(test_type, srs_content, queue.put_nowait)
+        finally:
+            queue.put_nowait(done)
+
+    producer = asyncio.ensure_future(generate())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=clock.remaining_ms() / 1000)
+            except asyncio.TimeoutError:
+                outcome["timed_out"] = True
+                return
+            if item is done:
+                break
+            yield item
+        outcome["testcases"], outcome["generation"] = await producer
+    finally:
+        producer.cancel()
+
 # Runner
-async def run_tests(url, test_run_id, srs_pdf_path, test_type):
+async def run_tests(url, test_run_id, srs_pdf_path, test_type, single_session=SINGLE_SESSION, deadline=None,
+                    channel_address=None, snapshot_path=None, plans_path=None):
+    """
+    Generate and execute the testcases for one test type. Each finished
+    testcase and each stage change is emitted on the result channel at
+    `channel_address` as it happens; the full list is also returned.
+    `snapshot_path` is the run's shared DOM snapshot, used on chromium
+    unless the type is listed in FRESH_SNAPSHOT_TYPES. `plans_path` holds
+    plans already generated for the run; a type missing from it is
+    generated here.
+    """
+    channel = open_channel(channel_address)
+    channel.emit("stage", test_type=test_type, stage="started")
+    results = []
+    started = time.monotonic()
+    first_test_ms = None
+
+    def emit_result(i, result):
+        nonlocal first_test_ms
+        if first_test_ms is None and not is_snapshot_check(result, test_type):
+            first_test_ms = int((time.monotonic() - started) * 1000)
+            channel.emit("stage", test_type=test_type, stage="first_result", time_to_first_test_ms=first_test_ms)
+        channel.emit("result", test_type=test_type, index=i, result=result)
+
     try:
         print(f"[DEBUG] Starting {test_type} tests for URL: {url}", file=sys.stderr)
-        srs_content = extract_text_from_pdf(srs_pdf_path)
+        planned = load_run_plan(plans_path, test_type)
+        srs_content = extract_text_from_pdf(srs_pdf_path) if planned is None else None
+        clock = ActionClock(deadline=deadline)
+        shared_snapshot = None if test_type in FRESH_SNAPSHOT_TYPES else load_run_snapshot(snapshot_path)
 
-        captured_output = StringIO()
-        with redirect_stdout(captured_output):
-            testcases = generate_testcases(test_type, srs_content, is_pdf=False)
-            print("[DEBUG] Generated testcases:", json.dumps(testcases, indent=2)[:800], file=sys.stderr)
+        async def pipeline():
+            # The plan is generated once; compatibility runs it on every engine at the same time
+            browsers = COMPATIBILITY_BROWSERS if test_type == "compatibility" else ["chromium"]
+            per_engine = len(browsers) > 1
+            stream, outcome = None, {}
 
+            def budget_exhausted():
+                results.append(skipped_result(
+                    {"id": f"{test_type}-budget", "name": f"{test_type.capitalize()} Tests"}, 0, test_type,
+                    "Time budget exhausted while generating testcases"
+                ))
+                emit_result(len(browser_results.get("chromium", [])) + len(results) - 1, results[-1])
 
-        dom_map = await scrape_dom(url)
-        results = []
+            def generated(testcases, generation):
+                """Report the finished plan; True when generation failed and its errors are the results."""
+                print("[DEBUG] Generated testcases:", json.dumps(testcases, indent=2)[:800], file=sys.stderr)
+                channel.emit("stage", test_type=test_type, stage="generated", count=len(testcases),
+                             generation=generation)
+                if testcases and all(isinstance(tc, dict) and tc.get("status") == "error" for tc in testcases):
+                    for tc in testcases:
+                        results.append(tc)
+                        emit_result(len(browser_results.get("chromium", [])) + len(results) - 1, tc)
+                    return True
+                return False
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            await page.goto(url, timeout=60000)
+            captured_output = StringIO()
+            if planned is not None:
+                testcases, generation = planned, {"mode": "batch"}
+            elif GENERATION_STREAMING and not per_engine:
+                # Testcases run as the response streams in; the plan is only known in full at the end
+                testcases, generation = [], None
+                stream = stream_testcases(test_type, srs_content, clock, outcome)
+            else:
+                with redirect_stdout(captured_output):
+                    # Awaited, so a cancel request or the time budget also cancels the Gemini request
+                    try:
+                        testcases, generation = await asyncio.wait_for(
+                            generate_testcases_async(test_type, srs_content), timeout=clock.remaining_ms() / 1000
+                        )
+                    except asyncio.TimeoutError:
+                        budget_exhausted()
+                        return
+            if stream is None and generated(testcases, generation):
+                return
+
+            async def run_engine(position, browser_type):
+                engine_results = browser_results.setdefault(browser_type, [])
+                engine_clock = ActionClock(deadline=clock.deadline) if per_engine else clock
+                offset = position * len(testcases)
+
+                def on_result(i, result):
+                    if per_engine:
+                        tag_browser(result, browser_type)
+                    emit_result(offset + i, result)
+
+                def on_loaded(load_ms):
+                    channel.emit("stage", test_type=test_type, stage="executing", browser=browser_type,
+                                 load_ms=load_ms)
+
+                def on_validated(pruned, saved_ms, repaired):
+                    channel.emit("stage", test_type=test_type, stage="validated", browser=browser_type,
+                                 pruned=pruned, estimated_ms_saved=saved_ms, repaired=repaired)
 
-            for i, tc in enumerate(testcases):
                 try:
-                    res = await execute_test(page, tc, dom_map, test_type)
-                    results.append(res)
+                    # Gemini's prints from the generating task stay out of the JSON written to stdout
+                    with redirect_stdout(captured_output) if stream is not None else nullcontext():
+                        await run_on_browser(url, testcases, test_type, browser_type, engine_results, engine_clock,
+                                             single_session, on_result, on_loaded,
+                                             shared_snapshot if browser_type == "chromium" else None, on_validated,
+                                             stream)
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    error_result = {
-                        "id": tc.get("id", f"test_{i+1}"),
-                        "name": tc.get("name", f"Test {i+1}"),
-                        "status": "error",
-                        "type": test_type,
-                        "description": tc.get("description", "Test execution failed"),
-                        "details": f"Test execution error: {str(e)}",
-                        "srsReference": tc.get("srsReference", "N/A")
-                    }
-                    results.append(error_result)
-
-            await browser.close()
+                    if not per_engine:
+                        raise
+                    # One engine failing to launch or load does not discard the others
+                    print(f"[DEBUG] {browser_type} failed: {e}", file=sys.stderr)
+                    engine_results[:] = [r for r in engine_results if r is not None]
+                    error = tag_browser(execution_error_result(
+                        {"id": f"{test_type}-engine", "name": f"{test_type.capitalize()} Tests"}, 0, test_type, e
+                    ), browser_type)
+                    engine_results.append(error)
+                    # Past every engine's plan slots, so it never replaces a testcase's result
+                    emit_result(len(browsers) * len(testcases) + position, error)
+
+            await asyncio.gather(*(run_engine(position, b) for position, b in enumerate(browsers)))
+            if outcome.get("timed_out"):
+                budget_exhausted()
+            elif stream is not None and "testcases" in outcome:
+                generated(outcome["testcases"], outcome["generation"])
 
+        browser_results = {}
+        _, cancelled = await run_cancellable(pipeline(), test_run_id)
+        results = results + [r for engine_results in browser_results.values() for r in engine_results if r is not None]
+        if cancelled:
+            print(f"[DEBUG] {test_type} run cancelled after {len(results)} tests", file=sys.stderr)
+
+        print("[DEBUG] Browser pool:", json.dumps(get_browser_pool().metrics()), file=sys.stderr)
+        channel.emit("stage", test_type=test_type, stage="cancelled" if cancelled else "finished", count=len(results))
         print(json.dumps(results, indent=2))
         return results
 
@@ -167,5 +804,26 @@ async def run_tests(url, test_run_id, srs_pdf_path, test_type):
             "details": str(e),
             "srsReference": "N/A"
         }]
+        emit_result(0, error_result[0])
+        channel.emit("stage", test_type=test_type, stage="failed", error=str(e))
         print(json.dumps(error_result, indent=2))
         return error_result
+
+    finally:
+        channel.close()
+
+# Standalone entry point for the per-type scripts: one run, then release the browsers
+async def run_tests_standalone(url, test_run_id, srs_pdf_path, test_type):
+    deadline = float(os.getenv("TEST_RUN_DEADLINE", "0")) or None
+    try:
+        return await run_tests(url, test_run_id, srs_pdf_path, test_type, deadline=deadline,
+                               channel_address=os.getenv("RESULT_CHANNEL"), snapshot_path=os.getenv("RUN_SNAPSHOT"),
+                               plans_path=os.getenv("RUN_PLANS"))
+    finally:
+        await close_browser_pool()
+
+async def capture_run_snapshot_standalone(url, test_run_id):
+    try:
+        return await capture_run_snapshot(url, test_run_id)
+    finally:
+        await close_browser_pool()
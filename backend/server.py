@@ -3,14 +3,28 @@ import uuid
 import asyncio
 import subprocess
 import shutil
-import json
 import time
+import signal
 import threading
 from datetime import datetime, timezone
-from flask import Flask, request, jsonify # type: ignore
+from flask import Flask, request, jsonify, Response, stream_with_context # type: ignore
 from flask_cors import CORS# type: ignore
 from utils.supabase_client import supabase
 from utils.llm_client import generate_code_with_llm # Import the new LLM client
+from utils.execution_engine import get_engine, max_concurrent_test_types, total_pool_metrics
+from utils.job_queue import get_job_queue
+from utils.admission import get_admission_controller
+from utils.cancellation import request_cancel, is_cancel_requested, clear_cancel, run_until, run_cancellable
+from utils.result_channel import ResultChannelServer
+from utils.execution_log import ExecutionLogBuffer, summarize_results
+from utils.result_cache import get_result_cache, result_cache_key, file_sha256, cacheable
+from utils.artifacts import (run_artifact_path, read_json, write_json, remove_run_artifacts, DOM_SNAPSHOT_META_FILE,
+                             TESTCASE_PLANS_FILE)
+from utils.gemini_client import GENERATION_MODE, extract_text_from_pdf, generate_testcases_batch
+from utils.llm_cache import llm_cache_metrics
+from utils.llm_http import llm_http_metrics
+from utils.run_events import (EVENTS_TOKEN_TTL_SECONDS, sse_event, issue_stream_token, read_stream_token,
+                              subscribe as subscribe_run_events, unsubscribe as unsubscribe_run_events)
 from github import Github # Import PyGithub # type: ignore
 import requests # For Vercel API
 from dotenv import load_dotenv
@@ -24,6 +38,26 @@ CORS(app)
 # Vercel API Base URL
 VERCEL_API_BASE_URL = "https://api.vercel.com"
 
+# "pool" runs test types in pre-imported engine workers, "subprocess" spawns one script per type
+TEST_EXECUTION_ENGINE = os.getenv("TEST_EXECUTION_ENGINE", "pool")
+
+# "queue" hands runs to worker.py processes through the job queue, "thread" runs them in this process
+TEST_DISPATCH = os.getenv("TEST_DISPATCH", "queue")
+
+# Seconds a cancelled per-type script gets to stop on its own before its process group is killed
+CANCEL_GRACE_SECONDS = float(os.getenv("CANCEL_GRACE_SECONDS", "1.5"))
+
+# Wall-clock budget for a whole run; each test type also has its own TYPE_TIME_BUDGET_SECONDS
+RUN_TIME_BUDGET_SECONDS = float(os.getenv("RUN_TIME_BUDGET_SECONDS", "900"))
+
+# Live progress stream: how long one connection lives before the browser's EventSource reconnects
+# (resuming from the Last-Event-ID it saw); utils/run_events.py tails the log for every connection
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "240"))
+
+# Workers that have not reported for this long are left out of /health
+WORKER_STATUS_MAX_AGE_SECONDS = float(os.getenv("WORKER_STATUS_MAX_AGE_SECONDS", "60"))
+
 def verify_user_token(auth_header):
     """Verify JWT token and return user info"""
     if not auth_header or not auth_header.startswith('Bearer '):
@@ -149,13 +183,209 @@ def deploy_to_vercel(repo_url: str, vercel_token: str, github_token: str) -> str
 
 # --- Test Execution Logic ---
 
-async def run_all_tests(url: str, test_run_id: str, selected_test_types: list, temp_srs_path: str = None):
+async def capture_run_snapshot(url: str, test_run_id: str):
+    """Capture the run's shared DOM snapshot; returns its metadata, or None if the capture failed."""
+    try:
+        if TEST_EXECUTION_ENGINE != "subprocess":
+            return await get_engine().capture_run_snapshot(url, test_run_id)
+
+        script_path = os.path.join(os.path.dirname(__file__), "scripts", "capture_snapshot.py")
+        process = await asyncio.create_subprocess_exec(
+            "python", script_path, url, test_run_id,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(__file__)
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        meta_path = run_artifact_path(test_run_id, DOM_SNAPSHOT_META_FILE)
+        if process.returncode != 0 or not os.path.exists(meta_path):
+            raise RuntimeError(stderr.decode('utf-8', errors='replace').strip()[-500:] or "no snapshot written")
+        return read_json(meta_path)
+    except Exception as e:
+        print(f" Could not snapshot {url}, each test type will capture its own: {e}")
+        return None
+
+async def generate_run_plans(test_run_id: str, srs_local_path: str, test_types: list):
+    """
+    Generate the plans for all `test_types` in one batched request and store
+    them as a run artifact. Returns (path, stats); path is None when nothing
+    was generated, and every type then generates its own plan.
+    """
+    try:
+        srs_content = extract_text_from_pdf(srs_local_path)
+        plans, stats = await generate_testcases_batch(test_types, srs_content)
+    except Exception as e:
+        print(f" Batched generation failed, each test type will generate its own plan: {e}")
+        return None, {'mode': 'batch', 'error': str(e)[:200]}
+    print(f" Generated plans for {stats['types']} in {stats['requests']} request(s), {stats['latency_ms']}ms")
+    if stats['missing']:
+        print(f" Batch did not cover {stats['missing']}, generating those per type")
+    if not plans:
+        return None, stats
+    path = run_artifact_path(test_run_id, TESTCASE_PLANS_FILE)
+    write_json(path, plans)
+    return path, stats
+
+def generation_summary(generation: dict) -> dict:
+    """Totals for the run's Gemini requests: the batch, plus any types generated on their own."""
+    requests_stats = [generation['batch']] if generation['batch'] else []
+    requests_stats += [g for g in generation['types'].values() if g.get('mode') == 'per_type']
+    totals = {field: sum(r.get(field) or 0 for r in requests_stats)
+              for field in ('requests', 'prompt_chars', 'prompt_tokens', 'output_tokens', 'latency_ms',
+                            'latency_saved_ms', 'retries')}
+    totals['cached_requests'] = sum(1 for r in requests_stats if r.get('cached')) + \
+        (generation['batch'] or {}).get('cached_requests', 0)
+    # SRS characters actually prompted, after retrieval picked each type's sections
+    totals['srs_context_chars'] = sum(r.get('context_chars') or (r.get('srs') or {}).get('context_chars') or 0
+                                      for r in requests_stats)
+    return {**generation, 'totals': totals}
+
+def log_type_results(test_type: str, test_results: list):
+    passed = len([t for t in test_results if t['status'] == 'pass'])
+    failed = len([t for t in test_results if t['status'] == 'fail'])
+    errors = len([t for t in test_results if t['status'] == 'error'])
+    print(f" {test_type} tests completed: {len(test_results)} tests")
+    print(f" {test_type} results: {passed} passed, {failed} failed, {errors} errors")
+
+async def run_test_type_pooled(test_type: str, url: str, test_run_id: str, srs_local_path: str, deadline: float,
+                               channel: ResultChannelServer, snapshot_path: str = None, plans_path: str = None):
+    """Run one test type inside a pre-imported engine worker."""
+    returned = await get_engine().run(url, test_run_id, os.path.abspath(srs_local_path), test_type, deadline,
+                                      channel.address, snapshot_path, plans_path)
+    # Prefer what was streamed; the return value covers a channel that failed to connect
+    test_results = await channel.collect(test_type) or returned
+    log_type_results(test_type, test_results)
+    return test_results
+
+async def run_test_type_subprocess(test_type: str, script_name: str, url: str, test_run_id: str, srs_local_path: str,
+                                   deadline: float, channel: ResultChannelServer, snapshot_path: str = None,
+                                   plans_path: str = None):
+    """Legacy path: run one test type in a fresh `python scripts/<type>_testing.py` process."""
+    script_path = os.path.join(os.path.dirname(__file__), "scripts", script_name)
+    print(f" Script: {script_path}")
+
+    # Results come back over the result channel; stdout is only drained so the pipe never fills
+    process = await asyncio.create_subprocess_exec(
+        "python", script_path, url, test_run_id, os.path.abspath(srs_local_path),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=os.path.dirname(__file__),  # Set working directory
+        env={**os.environ, "TEST_RUN_DEADLINE": str(deadline), "RESULT_CHANNEL": channel.address,
+             "RUN_SNAPSHOT": snapshot_path or "", "RUN_PLANS": plans_path or ""},
+        start_new_session=True  # Own process group, so Chromium children can be killed with it
+    )
+
+    # The script stops itself on a cancel request; kill its process group if it does not
+    communicate = asyncio.ensure_future(process.communicate())
+    cancel_seen_at = None
+    try:
+        while not communicate.done():
+            await asyncio.wait({communicate}, timeout=0.5)
+            if communicate.done() or not is_cancel_requested(test_run_id):
+                continue
+            cancel_seen_at = cancel_seen_at or time.monotonic()
+            if time.monotonic() - cancel_seen_at > CANCEL_GRACE_SECONDS:
+                print(f" Killing {test_type} process group after cancel")
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                cancel_seen_at = float("inf")
+    except asyncio.CancelledError:
+        # The run itself was stopped (its lease was lost); the script must not outlive it
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        communicate.cancel()
+        raise
+    _, stderr = communicate.result()
+
+    stderr_text = stderr.decode('utf-8', errors='replace').strip()
+
+    print(f" {test_type} process return code: {process.returncode}")
+    if stderr_text:
+        print(f" {test_type} stderr: {stderr_text[:500]}...")
+
+    test_results = await channel.collect(test_type)
+    if not test_results:
+        error_details = stderr_text if stderr_text else "No output received"
+        print(f" {test_type} tests failed - no results received")
+        return [{
+            "id": f"{test_type}-no-output",
+            "name": f"{test_type.title()} No Output",
+            "status": "error",
+            "type": test_type,
+            "description": f"Test process reported no results (return code: {process.returncode})",
+            "details": error_details[-500:],
+            "srsReference": "N/A"
+        }]
+
+    log_type_results(test_type, test_results)
+    return test_results
+
+def update_report(test_run_id, fields, lease_owner=None):
+    """
+    Update query for the run's test_reports row. A worker passes the lease it
+    holds, so its writes stop landing once another worker has taken the run over.
+    """
+    query = supabase.table('test_reports').update(fields).eq('id', test_run_id)
+    return query.eq('lease_owner', lease_owner) if lease_owner else query
+
+def finish_test_run(test_run_id, report_data, summary, lease_owner=None) -> str:
+    """Store the report and the run's final status, which a cancel request always wins."""
+    final_status = 'cancelled' if is_cancel_requested(test_run_id) else 'completed'
+    report = {
+        'completed_at': datetime.now(timezone.utc).isoformat(),
+        'report_data': report_data,
+        'summary': summary
+    }
+    # A cancel that lands after the flag check above must not be overwritten with 'completed'
+    finished = update_report(test_run_id, {'status': final_status, **report}, lease_owner) \
+        .neq('status', 'cancelled').execute()
+    if not finished.data:
+        final_status = 'cancelled'
+        if not update_report(test_run_id, report, lease_owner).execute().data:
+            print(f" Lease on {test_run_id} was lost, its report is left to the worker that holds it")
+            final_status = 'lease_lost'
+    return final_status
+
+def cleanup_run_files(test_run_id, srs_local_path, temp_srs_path):
+    remove_run_artifacts(test_run_id)
+
+    #  Cleanup only Supabase-downloaded PDFs, not uploaded ones
+    try:
+        if srs_local_path != temp_srs_path and os.path.exists(srs_local_path):
+            os.remove(srs_local_path)
+            print(f" Cleaned up downloaded temp SRS file: {srs_local_path}")
+        else:
+            print(f" Keeping uploaded temp SRS file: {temp_srs_path}")
+    except Exception as e:
+        print(f" Warning: Could not clean up temp file: {e}")
+
+def finish_cancelled_setup(test_run_id, srs_local_path, temp_srs_path, lease_owner=None):
+    """Close out a run cancelled while its snapshot or plans were still being prepared."""
+    print(f" Test run {test_run_id} was cancelled before its tests started")
+    report_data = {'all': []}
+    finish_test_run(test_run_id, report_data, summarize_results([]), lease_owner)
+    cleanup_run_files(test_run_id, srs_local_path, temp_srs_path)
+    return report_data
+
+async def run_all_tests(url: str, test_run_id: str, selected_test_types: list, temp_srs_path: str = None,
+                        force: bool = False, lease_owner: str = None):
     print(f"Starting comprehensive testing for URL: {url} with types: {selected_test_types}")
     
-    supabase.table('test_reports').update({
+    started = update_report(test_run_id, {
         'status': 'running',
         'started_at': datetime.now(timezone.utc).isoformat()
-    }).eq('id', test_run_id).execute()
+    }, lease_owner).neq('status', 'cancelled').execute()
+    if not started.data:
+        print(f" Test run {test_run_id} was cancelled before it started")
+        return {'all': []}
 
     all_results = {}
     test_scripts = {
@@ -170,12 +400,12 @@ async def run_all_tests(url: str, test_run_id: str, selected_test_types: list, t
 
     if not scripts_to_run:
         print("No test types selected. Skipping test execution.")
-        supabase.table('test_reports').update({
+        update_report(test_run_id, {
             'status': 'completed',
             'completed_at': datetime.now(timezone.utc).isoformat(),
             'report_data': {'all': []},
-            'summary': {'total': 0, 'passed': 0, 'failed': 0, 'warnings': 0, 'errors': 0, 'success_rate': 100}
-        }).eq('id', test_run_id).execute()
+            'summary': {'total': 0, 'passed': 0, 'failed': 0, 'warnings': 0, 'errors': 0, 'skipped': 0, 'invalid': 0, 'success_rate': 100}
+        }, lease_owner).execute()
         return
 
     if temp_srs_path and os.path.exists(temp_srs_path):
@@ -219,94 +449,145 @@ async def run_all_tests(url: str, test_run_id: str, selected_test_types: list, t
             with open(srs_local_path, "wb") as f:
                 f.write(b"")
 
-    # Run each test type
-    for test_type, script_name in scripts_to_run.items():
-        script_path = os.path.join(os.path.dirname(__file__), "scripts", script_name)
-        try:
-            print(f" Running {test_type} tests...")
-            print(f" Script: {script_path}")
-            print(f" Arguments: URL={url}, test_run_id={test_run_id}, SRS_PDF={srs_local_path}")
-
-            process = await asyncio.create_subprocess_exec(
-                "python", script_path, url, test_run_id, os.path.abspath(srs_local_path),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=os.path.dirname(__file__)  # Set working directory
-            )
-            stdout, stderr = await process.communicate()
+    # The target is snapshotted once and every test type reads that artifact instead of scraping again
+    snapshot, cancelled = await run_cancellable(capture_run_snapshot(url, test_run_id), test_run_id)
+    if cancelled:
+        return finish_cancelled_setup(test_run_id, srs_local_path, temp_srs_path, lease_owner)
+    snapshot_path = snapshot.get('path') if snapshot else None
 
-            stdout_text = stdout.decode('utf-8', errors='replace').strip()
-            stderr_text = stderr.decode('utf-8', errors='replace').strip()
-            
-            print(f" {test_type} process return code: {process.returncode}")
-            if stderr_text:
-                print(f" {test_type} stderr: {stderr_text[:500]}...")
-            
-            if stdout_text:
-                print(f" {test_type} script output length: {len(stdout_text)} chars")
-                
-                json_start = stdout_text.find('[')
-                json_end = stdout_text.rfind(']') + 1
-                
-                if json_start >= 0 and json_end > json_start:
-                    json_content = stdout_text[json_start:json_end]
-                    try:
-                        test_results = json.loads(json_content)
-                        all_results[test_type] = test_results
-                        print(f" {test_type} tests completed: {len(test_results)} tests")
-                        
-                        passed = len([t for t in test_results if t['status'] == 'pass'])
-                        failed = len([t for t in test_results if t['status'] == 'fail'])
-                        errors = len([t for t in test_results if t['status'] == 'error'])
-                        print(f" {test_type} results: {passed} passed, {failed} failed, {errors} errors")
-                        
-                    except json.JSONDecodeError as e:
-                        print(f" JSON decode error for {test_type}: {e}")
-                        print(f" Extracted JSON content: {json_content[:500]}...")
-                        all_results[test_type] = [{
-                            "id": f"{test_type}-json-error",
-                            "name": f"{test_type.title()} JSON Parse Error",
-                            "status": "error",
-                            "type": test_type,
-                            "description": "Failed to parse test results as JSON",
-                            "details": f"JSON decode error: {str(e)[:200]}. Content: {json_content[:300]}",
-                            "srsReference": "N/A"
-                        }]
+    # Identical SRS + URL + rendered DOM + prompt/model replays stored results unless forced
+    result_cache = None if force else get_result_cache()
+    cache_keys = {}
+    cache_hits = []
+    if result_cache is not None:
+        if snapshot is None:
+            print(f" No DOM snapshot of {url}, skipping the result cache")
+            result_cache = None
+        else:
+            srs_hash = file_sha256(srs_local_path)
+            cache_keys = {t: result_cache_key(srs_hash, url, snapshot, t) for t in scripts_to_run}
+    cached = {}
+    for test_type, key in cache_keys.items():
+        results = result_cache.get(key)
+        if results is not None:
+            cached[test_type] = results
+
+    # Run the selected test types concurrently, bounded per worker
+    concurrency_limit = max_concurrent_test_types()
+    semaphore = asyncio.Semaphore(concurrency_limit)
+    run_started = time.perf_counter()
+    deadline = time.time() + RUN_TIME_BUDGET_SECONDS
+    timings = {}
+
+    # One request generates the plans of every type that is not served from cache
+    to_generate = [t for t in scripts_to_run if t not in cached]
+    plans_path = None
+    generation = {'mode': GENERATION_MODE, 'batch': None, 'types': {}, 'time_to_first_test_ms': {}}
+    if GENERATION_MODE == "batch" and len(to_generate) > 1:
+        generated, cancelled = await run_cancellable(generate_run_plans(test_run_id, srs_local_path, to_generate),
+                                                     test_run_id)
+        if cancelled:
+            return finish_cancelled_setup(test_run_id, srs_local_path, temp_srs_path, lease_owner)
+        plans_path, generation['batch'] = generated
+
+    # Results and stage events are persisted as they stream in, not only at the end
+    log_buffer = ExecutionLogBuffer(test_run_id, supabase).start()
+    streamed = {}
+    validation = {'pruned': 0, 'repaired': 0, 'estimated_seconds_saved': 0.0, 'types': {}}
+
+    def on_record(record):
+        log_buffer.add_record(record)
+        if record["type"] == "result":
+            streamed[record["test_type"]] = streamed.get(record["test_type"], 0) + 1
+        elif record["type"] == "stage":
+            print(f" {record['test_type']}: {record['stage']}" + (f" ({record['count']} tests)" if "count" in record else ""))
+            if record["stage"] == "generated" and record.get("generation"):
+                generation['types'][record['test_type']] = record['generation']
+            if record["stage"] == "first_result":
+                generation['time_to_first_test_ms'][record['test_type']] = record['time_to_first_test_ms']
+            if record["stage"] == "validated":
+                validation['pruned'] += record['pruned']
+                validation['repaired'] += record.get('repaired', 0)
+                validation['estimated_seconds_saved'] += record['estimated_ms_saved'] / 1000
+                validation['types'][record['test_type']] = validation['types'].get(record['test_type'], 0) + record['pruned']
+
+    channel = await ResultChannelServer(on_record=on_record).start()
+
+    async def run_test_type(test_type, script_name):
+        async with semaphore:
+            started = time.perf_counter()
+            produced_here = False
+            try:
+                print(f" Running {test_type} tests...")
+                print(f" Arguments: URL={url}, test_run_id={test_run_id}, SRS_PDF={srs_local_path}")
+
+                key = cache_keys.get(test_type)
+                results = cached.get(test_type)
+                if results is not None:
+                    cache_hits.append(test_type)
+                    print(f" {test_type} results served from cache ({len(results)} tests)")
                 else:
-                    print(f" No valid JSON found in {test_type} output")
-                    all_results[test_type] = [{
-                        "id": f"{test_type}-no-json",
-                        "name": f"{test_type.title()} No JSON Output",
-                        "status": "error",
-                        "type": test_type,
-                        "description": "No valid JSON output found",
-                        "details": f"Raw output: {stdout_text[:500]}",
-                        "srsReference": "N/A"
-                    }]
-            else:
-                error_details = stderr_text if stderr_text else "No output received"
-                print(f" {test_type} tests failed - no stdout output")
-                all_results[test_type] = [{
-                    "id": f"{test_type}-no-output",
-                    "name": f"{test_type.title()} No Output",
+                    if TEST_EXECUTION_ENGINE == "subprocess":
+                        results = await run_test_type_subprocess(test_type, script_name, url, test_run_id,
+                                                                 srs_local_path, deadline, channel, snapshot_path,
+                                                                 plans_path)
+                    else:
+                        results = await run_test_type_pooled(test_type, url, test_run_id, srs_local_path, deadline,
+                                                             channel, snapshot_path, plans_path)
+                    if key and cacheable(results) and not is_cancel_requested(test_run_id):
+                        result_cache.set(key, results)
+
+            except Exception as e:
+                print(f" Exception in {test_type} tests: {str(e)}")
+                results = [{
+                    "id": f"{test_type}-exception",
+                    "name": f"{test_type.title()} Test Exception",
                     "status": "error",
                     "type": test_type,
-                    "description": f"Test process produced no output (return code: {process.returncode})",
-                    "details": error_details[:500],
+                    "description": "Test execution exception",
+                    "details": str(e)[:500],
                     "srsReference": "N/A"
                 }]
-                
-        except Exception as e:
-            print(f" Exception in {test_type} tests: {str(e)}")
-            all_results[test_type] = [{
-                "id": f"{test_type}-exception",
-                "name": f"{test_type.title()} Test Exception",
-                "status": "error",
-                "type": test_type,
-                "description": "Test execution exception",
-                "details": str(e)[:500],
-                "srsReference": "N/A"
-            }]
+                produced_here = True
+
+            # Results produced on this side (runner crashed, no output) were never streamed;
+            # whatever the type did stream is superseded by them
+            if produced_here and streamed.get(test_type):
+                log_buffer.supersede(test_type, "exception")
+            if produced_here or not streamed.get(test_type):
+                for result in results:
+                    log_buffer.add_result(test_type, result)
+
+            finished = time.perf_counter()
+            timings[test_type] = {
+                "started_at": round(started - run_started, 3),
+                "finished_at": round(finished - run_started, 3),
+                "wall_seconds": round(finished - started, 3)
+            }
+            print(f" {test_type} finished in {finished - started:.2f}s")
+            return test_type, results
+
+    try:
+        outcomes = await asyncio.gather(*(
+            run_test_type(test_type, script_name) for test_type, script_name in scripts_to_run.items()
+        ))
+    finally:
+        await channel.close()
+        log_buffer.close()
+    for test_type, results in outcomes:
+        all_results[test_type] = results
+
+    total_seconds = time.perf_counter() - run_started
+    type_seconds = sum(t["wall_seconds"] for t in timings.values())
+    timing = {
+        "concurrency_limit": concurrency_limit,
+        "total_seconds": round(total_seconds, 3),
+        "sum_type_seconds": round(type_seconds, 3),
+        # 1.0 means fully sequential; N means N types were in flight on average
+        "overlap": round(type_seconds / total_seconds, 2) if total_seconds > 0 else 0,
+        "types": timings
+    }
+    print(f" Test types took {total_seconds:.2f}s wall vs {type_seconds:.2f}s summed (limit {concurrency_limit})")
 
     all_tests = []
     for test_type, results in all_results.items():
@@ -314,58 +595,102 @@ async def run_all_tests(url: str, test_run_id: str, selected_test_types: list, t
     
     all_results['all'] = all_tests
 
-    total_tests = len(all_tests)
-    passed_tests = len([t for t in all_tests if t['status'] == 'pass'])
-    failed_tests = len([t for t in all_tests if t['status'] == 'fail'])
-    warning_tests = len([t for t in all_tests if t['status'] == 'warning'])
-    error_tests = len([t for t in all_tests if t['status'] == 'error'])
-
-    summary = {
-        'total': total_tests,
-        'passed': passed_tests,
-        'failed': failed_tests,
-        'warnings': warning_tests,
-        'errors': error_tests,
-        'success_rate': round((passed_tests / total_tests * 100) if total_tests > 0 else 0, 2)
-    }
-
-    final_status = 'completed'
+    # Counted from the persisted result rows; the in-memory results only stand in when
+    # the log could not be written in full
+    summary = log_buffer.summary()
+    if summary is None:
+        summary = {**summarize_results(all_tests), 'source': 'report_data'}
+    else:
+        summary['source'] = 'execution_log'
+    total_tests = summary['total']
+    summary['timing'] = timing
+    summary['execution_log'] = log_buffer.stats
+    summary['cache'] = {'enabled': result_cache is not None, 'forced': force, 'hits': cache_hits}
+    validation['estimated_seconds_saved'] = round(validation['estimated_seconds_saved'], 1)
+    summary['validation'] = validation
+    summary['generation'] = generation_summary(generation)
 
-    supabase.table('test_reports').update({
-        'status': final_status,
-        'completed_at': datetime.now(timezone.utc).isoformat(),
-        'report_data': all_results,
-        'summary': summary
-    }).eq('id', test_run_id).execute()
+    final_status = finish_test_run(test_run_id, all_results, summary, lease_owner)
 
-    #  Cleanup only Supabase-downloaded PDFs, not uploaded ones
-    try:
-        if not temp_srs_path and os.path.exists(srs_local_path):
-            os.remove(srs_local_path)
-            print(f" Cleaned up downloaded temp SRS file: {srs_local_path}")
-        else:
-            print(f" Keeping uploaded temp SRS file: {temp_srs_path}")
-    except Exception as e:
-        print(f" Warning: Could not clean up temp file: {e}")
+    cleanup_run_files(test_run_id, srs_local_path, temp_srs_path)
 
     print(f" Testing completed! Status: {final_status}")
-    print(f" Summary: {passed_tests}/{total_tests} passed, {failed_tests} failed, {warning_tests} warnings, {error_tests} errors")
+    print(f" Summary: {summary['passed']}/{total_tests} passed, {summary['failed']} failed, {summary['warnings']} warnings, {summary['errors']} errors, {summary['skipped']} skipped, {summary.get('invalid', 0)} invalid")
+    if validation['pruned'] or validation['repaired']:
+        print(f" Validation pruned {validation['pruned']} testcases, saving about {validation['estimated_seconds_saved']}s, "
+              f"and repaired {validation['repaired']} selectors")
     
     return all_results
 
 # Wrapper
-def start_test_task(url, test_run_id, selected_test_types, temp_srs_path=None):
+def start_test_task(url, test_run_id, selected_test_types, temp_srs_path=None, force=False, lease_owner=None,
+                    lease_lost=None):
+    """
+    Run a test run to completion on this thread. worker.py passes the lease it
+    holds and an event it sets when that lease is lost; the run is then
+    stopped, since another worker may already be running it.
+    """
     try:
         print(f" Starting test task thread for URL: {url}")
-        asyncio.run(run_all_tests(url, test_run_id, selected_test_types, temp_srs_path))
+        run = run_all_tests(url, test_run_id, selected_test_types, temp_srs_path, force, lease_owner)
+        if lease_lost is None:
+            asyncio.run(run)
+        else:
+            _, stopped = asyncio.run(run_until(run, lease_lost.is_set))
+            if stopped:
+                print(f" Test run {test_run_id} stopped: its lease was lost")
     except Exception as e:
         print(f" Error running test task in thread: {e}")
         #  Don't delete uploaded temp files on crash
-        supabase.table('test_reports').update({
+        update_report(test_run_id, {
             'status': 'failed',
             'completed_at': datetime.now(timezone.utc).isoformat(),
             'error_message': f"Test thread crashed: {str(e)}"
-        }).eq('id', test_run_id).execute()
+        }, lease_owner).neq('status', 'cancelled').execute()
+    finally:
+        # The run is over either way; a cancel flag left behind would only leak
+        clear_cancel(test_run_id)
+
+def dispatch_test_run(url, test_run_id, selected_test_types, temp_srs_path, user_id, force=False):
+    """Queue a run for the workers, or start it in a local thread when TEST_DISPATCH=thread."""
+    if TEST_DISPATCH == "thread":
+        thread = threading.Thread(target=start_test_task,
+                                  args=(url, test_run_id, selected_test_types, temp_srs_path, force))
+        thread.start()
+        return
+
+    get_job_queue().enqueue(test_run_id, {
+        "url": url,
+        "test_types": selected_test_types,
+        "temp_srs_path": temp_srs_path,
+        "user_id": user_id,
+        "force": force
+    })
+    print(f" Test run {test_run_id} queued for workers")
+
+def admit_test_run(user_id):
+    """
+    Admission control for queued runs. Returns (decision, None) when the run
+    may be queued, or (None, response) with a 429 and Retry-After otherwise.
+    """
+    if TEST_DISPATCH != "queue":
+        return {}, None
+    try:
+        decision = get_admission_controller().check(user_id)
+    except Exception as e:
+        print(f" Admission check failed, admitting run: {e}")
+        return {}, None
+
+    if decision["admitted"]:
+        return decision, None
+
+    response = jsonify({
+        "success": False,
+        "message": f"{decision['reason']}. Please retry later.",
+        "retry_after": decision["retry_after"]
+    })
+    response.headers["Retry-After"] = str(decision["retry_after"])
+    return None, (response, 429)
 
 @app.route('/api/test', methods=['POST'])
 def handle_test_request():
@@ -379,6 +704,7 @@ def handle_test_request():
         srs_file = request.files.get('srs_document')
         target_url = request.form.get('target_url')
         selected_test_types = request.form.getlist('test_types[]')
+        force = request.form.get('force', 'false').lower() in ('true', '1')  # Bypass the result cache
         
         if not srs_file or not target_url or not selected_test_types:
             return jsonify({"success": False, "message": "Missing SRS document, target URL, or test types"}), 400
@@ -386,6 +712,10 @@ def handle_test_request():
         user_id = user.id
         print(f" Processing test request for user: {user_id}")
 
+        admission, rejection = admit_test_run(user_id)
+        if rejection:
+            return rejection
+
         temp_filename = f"temp_{uuid.uuid4().hex}_{srs_file.filename}"
         temp_path = os.path.join("temp", temp_filename)
         os.makedirs("temp", exist_ok=True)
@@ -442,15 +772,16 @@ def handle_test_request():
         
         test_run_id = report_response.data[0]['id']
 
-        thread = threading.Thread(target=start_test_task, args=(target_url, test_run_id, selected_test_types, temp_path))
-        thread.start()
+        dispatch_test_run(target_url, test_run_id, selected_test_types, temp_path, user_id, force)
 
         return jsonify({
             "success": True,
             "message": "Test initiated successfully",
             "test_run_id": test_run_id,
             "request_id": request_id,
-            "url": target_url
+            "url": target_url,
+            "queue_position": admission.get("queue_position"),
+            "eta_seconds": admission.get("eta_seconds")
         }), 200
 
     except Exception as e:
@@ -473,12 +804,17 @@ def handle_generate_and_test():
       github_token = request.form.get('github_token')
       vercel_token = request.form.get('vercel_token')
       selected_test_types = request.form.getlist('test_types[]')
+      force = request.form.get('force', 'false').lower() in ('true', '1')  # Bypass the result cache
       
       if not all([srs_file, user_arguments, github_token, vercel_token, selected_test_types]):
           return jsonify({"success": False, "message": "Missing required fields"}), 400
 
       user_id = user.id
 
+      admission, rejection = admit_test_run(user_id)
+      if rejection:
+          return rejection
+
       temp_filename = f"temp_{uuid.uuid4().hex}_{srs_file.filename}"
       temp_path = os.path.join("temp", temp_filename)
       os.makedirs("temp", exist_ok=True)
@@ -550,8 +886,7 @@ def handle_generate_and_test():
       
       test_run_id = report_response.data[0]['id']
 
-      thread = threading.Thread(target=start_test_task, args=(vercel_deployment_url, test_run_id, selected_test_types, temp_path))
-      thread.start()
+      dispatch_test_run(vercel_deployment_url, test_run_id, selected_test_types, temp_path, user_id, force)
 
       return jsonify({
           "success": True,
@@ -559,7 +894,9 @@ def handle_generate_and_test():
           "test_run_id": test_run_id,
           "request_id": request_id,
           "deployed_url": vercel_deployment_url,
-          "github_repo_url": github_repo_url
+          "github_repo_url": github_repo_url,
+          "queue_position": admission.get("queue_position"),
+          "eta_seconds": admission.get("eta_seconds")
       }), 200
 
   except Exception as e:
@@ -597,6 +934,136 @@ def get_test_results(test_run_id):
             "message": f"Server error: {str(e)}"
         }), 500
 
+def find_user_run(test_run_id, user_id):
+    """The run's id and status if it belongs to `user_id`, else None."""
+    response = supabase.table('test_reports') \
+        .select('id, status, test_requests!inner(user_id)') \
+        .eq('id', test_run_id) \
+        .eq('test_requests.user_id', user_id) \
+        .execute()
+    return response.data[0] if response.data else None
+
+@app.route('/api/test-runs/<test_run_id>/events/token', methods=['POST'])
+def issue_test_run_events_token(test_run_id):
+    """Short-lived token that opens this run's event stream, for EventSource, which cannot send headers."""
+    try:
+        auth_header = request.headers.get('Authorization')
+        user = verify_user_token(auth_header)
+
+        if not user:
+            return jsonify({"success": False, "message": "Authentication required"}), 401
+        if not find_user_run(test_run_id, user.id):
+            return jsonify({"success": False, "message": "Test run not found"}), 404
+
+        return jsonify({
+            "success": True,
+            "token": issue_stream_token(test_run_id, user.id),
+            "expires_in": EVENTS_TOKEN_TTL_SECONDS
+        }), 200
+    except Exception as e:
+        print(f"Error issuing event stream token: {str(e)}")
+        return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
+
+@app.route('/api/test-runs/<test_run_id>/events', methods=['GET'])
+def stream_test_run_events(test_run_id):
+    """
+    Server-Sent Events stream of a run's stage transitions and per-test
+    results. Every stream of a run in this process reads from one shared
+    tail of test_execution_logs. Browsers authenticate with a `token` query
+    parameter from /events/token; an expired one gets an `expired` event,
+    so the client fetches a new token and reopens from the last event id.
+    """
+    try:
+        token = request.args.get('token')
+        if token:
+            user_id, token_error = read_stream_token(token, test_run_id)
+            if token_error == 'expired':
+                return Response(sse_event("expired", {"message": "Stream token expired"}),
+                                mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        else:
+            user = verify_user_token(request.headers.get('Authorization'))
+            user_id = user.id if user else None
+
+        if not user_id:
+            return jsonify({"success": False, "message": "Authentication required"}), 401
+
+        run = find_user_run(test_run_id, user_id)
+        if not run:
+            return jsonify({"success": False, "message": "Test run not found"}), 404
+
+        cursor = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except Exception as e:
+        print(f"Error opening event stream: {str(e)}")
+        return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
+
+    def events():
+        opened_at = time.monotonic()
+        tail = subscribe_run_events(supabase, test_run_id, run['status'])
+        try:
+            status, pending, position, finished = tail.replay(cursor)
+            yield "retry: 2000\n\n"
+            yield sse_event("status", {"status": status})
+            while True:
+                yield from pending
+                # The browser's EventSource reconnects, resuming from the Last-Event-ID it saw
+                if finished or time.monotonic() - opened_at >= EVENTS_MAX_STREAM_SECONDS:
+                    return
+                pending, position, finished = tail.wait(position, EVENTS_KEEPALIVE_SECONDS)
+                if not pending and not finished:
+                    yield ": keepalive\n\n"
+        finally:
+            unsubscribe_run_events(tail)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop proxies from holding events back
+    })
+
+@app.route('/api/test-runs/<test_run_id>/cancel', methods=['POST'])
+def cancel_test_run(test_run_id):
+    """Cancel a pending or running test run"""
+    try:
+        auth_header = request.headers.get('Authorization')
+        user = verify_user_token(auth_header)
+
+        if not user:
+            return jsonify({"success": False, "message": "Authentication required"}), 401
+
+        run = find_user_run(test_run_id, user.id)
+        if not run:
+            return jsonify({"success": False, "message": "Test run not found"}), 404
+
+        status = run['status']
+        if status not in ('pending', 'running'):
+            return jsonify({"success": False, "message": f"Test run is already {status}"}), 409
+
+        supabase.table('test_reports').update({
+            'status': 'cancelled'
+        }).eq('id', test_run_id).in_('status', ['pending', 'running']).execute()
+
+        if TEST_DISPATCH == "queue":
+            # The worker holding the job sees the status change and raises the flag on its own node
+            get_job_queue().cancel(test_run_id)
+        else:
+            # The run's thread is in this process; it clears the flag when it exits
+            request_cancel(test_run_id)
+        if status == 'pending':
+            supabase.table('test_reports').update({
+                'completed_at': datetime.now(timezone.utc).isoformat(),
+                'report_data': {'all': []}
+            }).eq('id', test_run_id).execute()
+
+        return jsonify({
+            "success": True,
+            "message": "Test run cancelled",
+            "test_run_id": test_run_id,
+            "previous_status": status
+        }), 200
+
+    except Exception as e:
+        print(f"Error cancelling test run: {str(e)}")
+        return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
+
 @app.route('/api/user/test-requests', methods=['GET'])
 def get_user_test_requests():
     """Get all test requests for a user"""
@@ -625,13 +1092,30 @@ def get_user_test_requests():
             "message": f"Server error: {str(e)}"
         }), 500
 
+def browser_pool_health():
+    """Browser pool counters of whichever processes run the tests: this one, or the workers' reports."""
+    if TEST_EXECUTION_ENGINE == "subprocess":
+        return None
+    if TEST_DISPATCH == "thread":
+        return get_engine().browser_pool_metrics()
+    try:
+        workers = get_job_queue().worker_statuses(WORKER_STATUS_MAX_AGE_SECONDS)
+    except Exception as e:
+        print(f"Could not read worker status: {e}")
+        return {"error": str(e)[:200]}
+    pools = {w["worker_id"]: w["browser_pool"] for w in workers if w.get("browser_pool")}
+    return {"total": total_pool_metrics(p["total"] for p in pools.values()), "workers": pools}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for deployment monitoring"""
     return jsonify({
         "status": "healthy",
         "service": "figmaguard-backend",
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "browser_pool": browser_pool_health(),
+        "llm_cache": llm_cache_metrics(),
+        "llm_http": llm_http_metrics()
     }), 200
 
 def ping_self():
@@ -655,6 +1139,9 @@ if __name__ == '__main__':
         print(f" Error installing Playwright browsers: {e}")
         print("Please run: pip install playwright && playwright install")
 
+    if TEST_DISPATCH == "thread" and TEST_EXECUTION_ENGINE != "subprocess":
+        threading.Thread(target=lambda: get_engine().warm(), daemon=True).start()
+
     print("  Starting FigmaGuard backend server...")
     print(" Server handles: OAuth authentication + Script execution")
     port = int(os.environ.get('PORT', 5000))
@@ -76,6 +76,14 @@ CREATE TABLE public.test_reports (
     error_message TEXT,
     error_details JSONB,
     
+    -- Job queue (pending reports are leased by worker processes)
+    job_payload JSONB,
+    lease_owner TEXT,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    attempts INTEGER DEFAULT 0,
+    resource_usage JSONB, -- Measured cost of the run (peak RSS, duration), feeds admission control
+    
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -88,15 +96,31 @@ CREATE TABLE public.test_execution_logs (
     log_level TEXT DEFAULT 'info', -- info, warning, error
     message TEXT NOT NULL,
     details JSONB DEFAULT '{}',
+    event_type TEXT DEFAULT 'log', -- log, stage, result
+    seq BIGINT, -- Write order within the report, for streaming to the dashboard
+    attempt TEXT, -- Which attempt at the run wrote the row; a requeued run starts a new one
+    status TEXT, -- Testcase status on result rows (pass, fail, warning, error, skipped, invalid)
     timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- What each worker.py process last reported in its heartbeat (browser pool, load), for /health
+CREATE TABLE public.worker_status (
+    worker_id TEXT PRIMARY KEY,
+    node TEXT,
+    active_jobs INTEGER DEFAULT 0,
+    browser_pool JSONB,
+    heartbeat_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Indexes for better performance
 CREATE INDEX idx_test_requests_user_id ON public.test_requests(user_id);
 CREATE INDEX idx_test_requests_created_at ON public.test_requests(created_at DESC);
 CREATE INDEX idx_test_reports_request_id ON public.test_reports(request_id);
 CREATE INDEX idx_test_reports_status ON public.test_reports(status);
+CREATE INDEX idx_test_reports_pending_jobs ON public.test_reports(created_at) WHERE status = 'pending' AND job_payload IS NOT NULL;
+CREATE INDEX idx_test_reports_running_leases ON public.test_reports(lease_expires_at) WHERE status = 'running';
 CREATE INDEX idx_test_execution_logs_report_id ON public.test_execution_logs(report_id);
+CREATE INDEX idx_test_execution_logs_report_seq ON public.test_execution_logs(report_id, seq);
 CREATE INDEX idx_user_integrations_user_id ON public.user_integrations(user_id);
 
 -- Row Level Security (RLS) Policies
@@ -105,6 +129,7 @@ ALTER TABLE public.user_integrations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.test_requests ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.test_reports ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.test_execution_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.worker_status ENABLE ROW LEVEL SECURITY; -- Service role only
 
 -- User profiles policies
 CREATE POLICY "Users can view own profile" ON public.user_profiles
@@ -176,6 +201,150 @@ CREATE TRIGGER update_test_requests_updated_at BEFORE UPDATE ON public.test_requ
 CREATE TRIGGER update_test_reports_updated_at BEFORE UPDATE ON public.test_reports
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Job queue functions (called by worker.py through the service role)
+-- Leases the oldest pending run, skipping users already at p_user_running_limit
+-- and claiming nothing once p_global_running_limit runs are in flight
+CREATE OR REPLACE FUNCTION public.claim_test_job(
+    p_worker_id TEXT,
+    p_lease_seconds INTEGER DEFAULT 60,
+    p_global_running_limit INTEGER DEFAULT NULL,
+    p_user_running_limit INTEGER DEFAULT NULL
+)
+RETURNS SETOF public.test_reports AS $$
+DECLARE
+    candidate public.test_reports%ROWTYPE;
+BEGIN
+    -- A soft cap: workers claiming at the same moment may each see one slot left,
+    -- so it can be passed by at most the number of simultaneous claims
+    IF p_global_running_limit IS NOT NULL AND (
+        SELECT COUNT(*) FROM public.test_reports WHERE status = 'running' AND job_payload IS NOT NULL
+    ) >= p_global_running_limit THEN
+        RETURN;
+    END IF;
+
+    SELECT * INTO candidate FROM public.test_reports c
+    WHERE c.status = 'pending' AND c.job_payload IS NOT NULL
+      AND (p_user_running_limit IS NULL OR (
+          SELECT COUNT(*) FROM public.test_reports active
+          WHERE active.status = 'running'
+            AND active.job_payload->>'user_id' = c.job_payload->>'user_id'
+      ) < p_user_running_limit)
+    ORDER BY c.created_at
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    -- Only claims for the same user are serialized, so two of them cannot both read the
+    -- user's running count below the limit; claims for other users go on in parallel
+    IF p_user_running_limit IS NOT NULL THEN
+        PERFORM pg_advisory_xact_lock(hashtext('claim_test_job:' || COALESCE(candidate.job_payload->>'user_id', '')));
+        IF (
+            SELECT COUNT(*) FROM public.test_reports active
+            WHERE active.status = 'running'
+              AND active.job_payload->>'user_id' = candidate.job_payload->>'user_id'
+        ) >= p_user_running_limit THEN
+            RETURN;
+        END IF;
+    END IF;
+
+    RETURN QUERY
+    UPDATE public.test_reports tr
+    SET status = 'running',
+        lease_owner = p_worker_id,
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        heartbeat_at = NOW(),
+        attempts = tr.attempts + 1
+    WHERE tr.id = candidate.id
+    RETURNING tr.*;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION public.heartbeat_test_job(p_job_id UUID, p_worker_id TEXT, p_lease_seconds INTEGER DEFAULT 60)
+RETURNS BOOLEAN AS $$
+DECLARE
+    renewed BOOLEAN;
+BEGIN
+    UPDATE public.test_reports
+    SET heartbeat_at = NOW(),
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE id = p_job_id AND lease_owner = p_worker_id AND status = 'running'
+    RETURNING TRUE INTO renewed;
+    RETURN COALESCE(renewed, FALSE);
+END;
+$$ language 'plpgsql';
+
+-- Queue depth for admission control, overall and for one user
+CREATE OR REPLACE FUNCTION public.test_queue_stats(p_user_id TEXT DEFAULT NULL)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'running', COUNT(*) FILTER (WHERE status = 'running'),
+        'pending', COUNT(*) FILTER (WHERE status = 'pending'),
+        'user_running', COUNT(*) FILTER (WHERE status = 'running' AND job_payload->>'user_id' = p_user_id),
+        'user_pending', COUNT(*) FILTER (WHERE status = 'pending' AND job_payload->>'user_id' = p_user_id)
+    )
+    FROM public.test_reports
+    WHERE status IN ('pending', 'running') AND job_payload IS NOT NULL;
+$$ language 'sql' STABLE;
+
+-- Put runs whose worker stopped heartbeating back in the queue, or fail them after p_max_attempts
+CREATE OR REPLACE FUNCTION public.requeue_expired_test_jobs(p_max_attempts INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    UPDATE public.test_reports
+    SET status = CASE WHEN attempts >= p_max_attempts THEN 'failed'::test_status ELSE 'pending'::test_status END,
+        error_message = CASE WHEN attempts >= p_max_attempts THEN 'Worker lease expired too many times' ELSE error_message END,
+        completed_at = CASE WHEN attempts >= p_max_attempts THEN NOW() ELSE completed_at END,
+        lease_owner = NULL,
+        lease_expires_at = NULL
+    WHERE id IN (
+        SELECT id FROM public.test_reports
+        WHERE status = 'running' AND lease_expires_at < NOW()
+        FOR UPDATE SKIP LOCKED
+    );
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$ language 'plpgsql';
+
+-- Summary counts for one attempt at a report, computed from its persisted result rows.
+-- A batch retried after a write that did land is counted once per (test_type, seq), and a
+-- type's results logged before its latest 'superseded' stage were replaced and are skipped.
+CREATE OR REPLACE FUNCTION public.test_execution_summary(p_report_id UUID, p_attempt TEXT DEFAULT NULL)
+RETURNS JSONB AS $$
+    WITH logged AS (
+        SELECT DISTINCT ON (test_type, seq) test_type, seq, event_type, message, status
+        FROM public.test_execution_logs
+        WHERE report_id = p_report_id
+          AND event_type IN ('stage', 'result')
+          AND (p_attempt IS NULL OR attempt = p_attempt)
+        ORDER BY test_type, seq
+    ), superseded AS (
+        SELECT test_type, MAX(seq) AS seq
+        FROM logged
+        WHERE event_type = 'stage' AND message = 'superseded'
+        GROUP BY test_type
+    ), results AS (
+        SELECT logged.status
+        FROM logged LEFT JOIN superseded ON superseded.test_type = logged.test_type
+        WHERE logged.event_type = 'result' AND logged.seq > COALESCE(superseded.seq, 0)
+    )
+    SELECT jsonb_build_object(
+        'total', COUNT(*),
+        'passed', COUNT(*) FILTER (WHERE status = 'pass'),
+        'failed', COUNT(*) FILTER (WHERE status = 'fail'),
+        'warnings', COUNT(*) FILTER (WHERE status = 'warning'),
+        'errors', COUNT(*) FILTER (WHERE status = 'error'),
+        'skipped', COUNT(*) FILTER (WHERE status = 'skipped'),
+        'invalid', COUNT(*) FILTER (WHERE status = 'invalid'),
+        'success_rate', COALESCE(ROUND(COUNT(*) FILTER (WHERE status = 'pass') * 100.0 / NULLIF(COUNT(*), 0), 2), 0)
+    )
+    FROM results;
+$$ language 'sql' STABLE;
+
 -- Optimized storage - only one bucket needed for SRS documents
 -- Test reports are stored as JSONB in database, generated sites stored externally
 INSERT INTO storage.buckets (id, name, public) VALUES 
@@ -0,0 +1,289 @@
+import os
+import sys
+import copy
+import contextlib
+import pytest
+
+# Tests import modules the way server.py and worker.py do: from the backend directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# The engine workers import the runner as a top-level module from scripts/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+# server.py and its clients refuse to import without these; no test talks to the real services
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """One supabase-py query builder chain against an in-memory table."""
+
+    def __init__(self, table, action, payload=None):
+        self.table = table
+        self.action = action
+        self.payload = payload
+        self.filters = []
+        self.order_by = None
+        self.row_limit = None
+        self.single_row = False
+
+    def _field(self, row, column):
+        for part in column.split("."):
+            row = (row or {}).get(part)
+        return row
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: self._field(row, column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: self._field(row, column) != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: self._field(row, column) is not None and self._field(row, column) > value)
+        return self
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def is_(self, column, value):
+        negate, self.negate_next = getattr(self, "negate_next", False), False
+        expected = None if value == "null" else value
+        self.filters.append(lambda row: (self._field(row, column) == expected) != negate)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: self._field(row, column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def execute(self):
+        self.table.calls.append((self.action, self.payload))
+        if self.action == "insert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            for row in rows:
+                self.table.rows.append(copy.deepcopy(row))
+            return FakeResponse(copy.deepcopy(rows))
+        if self.action == "upsert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            for row in rows:
+                existing = next((r for r in self.table.rows if r.get(self.on_conflict) == row[self.on_conflict]), None)
+                if existing is None:
+                    self.table.rows.append(copy.deepcopy(row))
+                else:
+                    existing.update(copy.deepcopy(row))
+            return FakeResponse(copy.deepcopy(rows))
+        rows = [row for row in self.table.rows if all(f(row) for f in self.filters)]
+        if self.action == "update":
+            for row in rows:
+                row.update(copy.deepcopy(self.payload))
+        elif self.action == "delete":
+            self.table.rows = [row for row in self.table.rows if row not in rows]
+        if self.order_by:
+            column, desc = self.order_by
+            rows = sorted(rows, key=lambda row: self._field(row, column), reverse=desc)
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        data = copy.deepcopy(rows)
+        if self.single_row:
+            data = data[0] if data else None
+        return FakeResponse(data)
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+
+    def select(self, *columns, **kwargs):
+        return FakeQuery(self, "select")
+
+    def update(self, payload):
+        return FakeQuery(self, "update", payload)
+
+    def insert(self, payload):
+        return FakeQuery(self, "insert", payload)
+
+    def delete(self):
+        return FakeQuery(self, "delete")
+
+    def upsert(self, payload, on_conflict="id"):
+        query = FakeQuery(self, "upsert", payload)
+        query.on_conflict = on_conflict
+        return query
+
+    def get(self, row_id):
+        return next((row for row in self.rows if row.get("id") == row_id), None)
+
+
+class FakeRpc:
+    def __init__(self, function, params):
+        self.function = function
+        self.params = params
+
+    def execute(self):
+        return FakeResponse(self.function(self.params))
+
+
+class FakeSupabase:
+    """The slice of the Supabase client the backend uses, backed by lists of dicts."""
+
+    def __init__(self):
+        self.tables = {}
+        # SQL functions of supabase_schema.sql the backend calls, as Python over the tables
+        self.functions = {"test_execution_summary": self._test_execution_summary}
+
+    def table(self, name):
+        return self.tables.setdefault(name, FakeTable())
+
+    def rpc(self, name, params):
+        return FakeRpc(self.functions[name], params)
+
+    def _test_execution_summary(self, params):
+        logged = {}
+        for row in self.table("test_execution_logs").rows:
+            if row["report_id"] == params["p_report_id"] and row.get("event_type") in ("stage", "result") \
+                    and params.get("p_attempt") in (None, row.get("attempt")):
+                logged.setdefault((row["test_type"], row["seq"]), row)
+        superseded = {}
+        for (test_type, seq), row in logged.items():
+            if row["event_type"] == "stage" and row["message"] == "superseded":
+                superseded[test_type] = max(seq, superseded.get(test_type, 0))
+        statuses = [row["status"] for (test_type, seq), row in logged.items()
+                    if row["event_type"] == "result" and seq > superseded.get(test_type, 0)]
+        total = len(statuses)
+        return {
+            "total": total,
+            "passed": statuses.count("pass"),
+            "failed": statuses.count("fail"),
+            "warnings": statuses.count("warning"),
+            "errors": statuses.count("error"),
+            "skipped": statuses.count("skipped"),
+            "invalid": statuses.count("invalid"),
+            "success_rate": round(statuses.count("pass") * 100 / total, 2) if total else 0
+        }
+
+
+@pytest.fixture
+def fake_supabase():
+    return FakeSupabase()
+
+
+class FakePage:
+    """
+    Playwright page over a fixed set of elements ({selector: text}).
+    Navigations, actions and selector pre-pass calls are recorded on the
+    page and on its browser, which tests inspect.
+    """
+
+    def __init__(self, context, elements):
+        self.context = context
+        self.elements = elements
+        self.url = "about:blank"
+        self.viewport_size = {"width": 1280, "height": 720}
+        self.closed = False
+        self.keyboard = self
+        self.navigations = []
+        self.actions = []
+        self.resolutions = []
+
+    async def goto(self, url, timeout=None):
+        self.url = url
+        self.navigations.append(url)
+        self.context.browser.navigations.append(url)
+
+    def is_closed(self):
+        return self.closed
+
+    async def evaluate(self, script, selectors):
+        self.resolutions.append(list(selectors))
+        return [{"exists": True, "visible": True, "count": 1, "bbox": None} if s in self.elements
+                else {"exists": False, "visible": False, "count": 0, "bbox": None} for s in selectors]
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if selector not in self.elements:
+            raise TimeoutError(f"waiting for {selector}")
+
+    async def click(self, selector, timeout=None):
+        await self.wait_for_selector(selector)
+        self.actions.append(("click", selector))
+
+    async def fill(self, selector, value, timeout=None):
+        await self.wait_for_selector(selector)
+        self.actions.append(("fill", selector))
+
+    async def inner_text(self, selector, timeout=None):
+        await self.wait_for_selector(selector)
+        return self.elements[selector]
+
+    async def press(self, key):
+        self.actions.append(("press", key))
+
+
+class FakeBrowserContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = []
+
+    async def new_page(self):
+        self.pages.append(FakePage(self, self.browser.elements))
+        self.browser.pages.append(self.pages[-1])
+        return self.pages[-1]
+
+
+class FakeBrowserPool:
+    """get_browser_pool() stand-in: every context serves pages of the same fake site."""
+
+    def __init__(self, elements):
+        self.elements = elements
+        self.contexts = []
+        self.pages = []
+        self.navigations = []
+        self.captures = 0
+
+    @contextlib.asynccontextmanager
+    async def context(self, browser_type="chromium", **options):
+        self.contexts.append(FakeBrowserContext(self))
+        yield self.contexts[-1]
+
+    def metrics(self):
+        return {"contexts": len(self.contexts)}
+
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    """The runner's browser pool and DOM capture, over a page holding `fake_browser.elements`."""
+    import test_runner
+    from utils.dom_index import DomIndex
+
+    pool = FakeBrowserPool({"body": "Welcome home", "#menu": "Menu", "#search": "", ".title": "Home"})
+
+    async def capture_dom(page, browser_type="chromium"):
+        pool.captures += 1
+        html = "".join(f"<div {'id' if s[0] == '#' else 'class'}='{s[1:]}'>{t}</div>"
+                       for s, t in page.elements.items() if s[0] in "#.")
+        return DomIndex.from_html(f"<body>{html}</body>"), None
+
+    monkeypatch.setattr(test_runner, "get_browser_pool", lambda: pool)
+    monkeypatch.setattr(test_runner, "capture_dom", capture_dom)
+    monkeypatch.setattr(test_runner, "SELECTOR_SETTLE_MS", 0)
+    return pool
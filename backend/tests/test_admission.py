@@ -0,0 +1,131 @@
+import pytest
+from utils import admission
+from utils.admission import AdmissionController, fleet_memory_budget_mb, node_memory_budget_mb
+
+
+class FakeQueue:
+    def __init__(self, usage=None, running=0, pending=0, user_running=0, user_pending=0):
+        self.usage = usage or []
+        self.counts = {"running": running, "pending": pending, "user_running": user_running,
+                       "user_pending": user_pending}
+
+    def recent_usage(self, limit):
+        return self.usage[:limit]
+
+    def stats(self, user_id=None):
+        return dict(self.counts)
+
+
+def run(node="worker-a", budget=8000, rss=1000, seconds=60):
+    return {"peak_rss_mb": rss, "duration_seconds": seconds, "node": node, "memory_budget_mb": budget}
+
+
+def test_fleet_budget_sums_the_newest_report_per_node():
+    samples = [run("a", 8000), run("b", 4000), run("a", 2000)]
+    assert fleet_memory_budget_mb(samples) == 12000
+
+
+def test_fleet_budget_defaults_until_a_worker_reports(monkeypatch):
+    monkeypatch.setattr(admission, "DEFAULT_FLEET_MEMORY_BUDGET_MB", 3000)
+    assert fleet_memory_budget_mb([]) == 3000
+    # Runs recorded before workers reported their node
+    assert fleet_memory_budget_mb([{"peak_rss_mb": 900}]) == 3000
+
+
+def test_capacity_comes_from_worker_reports_not_local_memory(monkeypatch):
+    # The API node's own memory must not matter
+    monkeypatch.setattr(admission, "available_memory_mb", lambda: 100)
+    controller = AdmissionController(FakeQueue([run("a", 8000), run("b", 8000)]), memory_budget_mb=0)
+
+    assert controller.memory_budget_mb() == 16000
+    assert controller.limits()["global_running"] == 16
+
+
+def test_explicit_budget_overrides_worker_reports():
+    controller = AdmissionController(FakeQueue([run("a", 8000)]), memory_budget_mb=3000)
+    assert controller.memory_budget_mb() == 3000
+    assert controller.limits()["global_running"] == 3
+
+
+def test_run_cost_averages_recent_runs_and_falls_back_to_defaults(monkeypatch):
+    monkeypatch.setattr(admission, "DEFAULT_RUN_MEMORY_MB", 1200)
+    monkeypatch.setattr(admission, "DEFAULT_RUN_SECONDS", 180)
+    assert AdmissionController(FakeQueue(), 4800).run_cost() == (1200, 180)
+    measured = AdmissionController(FakeQueue([run(rss=1000, seconds=60), run(rss=2000, seconds=120)]), 4800)
+    assert measured.run_cost() == (1500, 90)
+
+
+def test_run_cost_uses_only_the_most_recent_runs(monkeypatch):
+    monkeypatch.setattr(admission, "RUN_COST_SAMPLE_SIZE", 2)
+    queue = FakeQueue([run(rss=1000), run(rss=1000), run(rss=9000)])
+    assert AdmissionController(queue, 4800).run_cost()[0] == 1000
+
+
+def test_usage_lookup_failure_falls_back_to_defaults(monkeypatch):
+    class BrokenQueue(FakeQueue):
+        def recent_usage(self, limit):
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(admission, "DEFAULT_FLEET_MEMORY_BUDGET_MB", 2400)
+    monkeypatch.setattr(admission, "DEFAULT_RUN_MEMORY_MB", 1200)
+    assert AdmissionController(BrokenQueue(), 0).limits()["global_running"] == 2
+
+
+def test_per_user_limit_is_a_share_of_global(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_RUNS_PER_USER", 0)
+    controller = AdmissionController(FakeQueue([run(rss=1000)]), memory_budget_mb=8000)
+    assert controller.limits() == {"global_running": 8, "user_running": 2}
+
+
+def test_idle_fleet_admits_immediately():
+    decision = AdmissionController(FakeQueue([run(rss=1000, seconds=60)]), 4000).check("u")
+    assert decision["admitted"] is True
+    assert decision["eta_seconds"] == 0
+    assert decision["queue_position"] == 1
+
+
+def test_eta_grows_with_runs_ahead():
+    queue = FakeQueue([run(rss=1000, seconds=60)], running=4, pending=4)
+    decision = AdmissionController(queue, 4000).check("u")
+    # 4 slots, 8 runs ahead: this run starts after two waves
+    assert decision["eta_seconds"] == 120
+    assert decision["queue_position"] == 5
+
+
+def test_full_queue_is_rejected_with_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE", 3)
+    decision = AdmissionController(FakeQueue([run(rss=1000, seconds=60)], pending=3), 2000).check("u")
+    assert decision["admitted"] is False
+    assert decision["retry_after"] == 30
+
+
+def test_user_with_too_many_queued_runs_is_rejected(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUED_PER_USER", 2)
+    decision = AdmissionController(FakeQueue(pending=2, user_pending=2), 8000).check("u")
+    assert decision["admitted"] is False
+    assert "2 test runs queued" in decision["reason"]
+
+
+def test_node_budget_prefers_configuration(monkeypatch):
+    monkeypatch.setattr(admission, "available_memory_mb", lambda: 10000)
+    monkeypatch.setattr(admission, "WORKER_MEMORY_BUDGET_MB", 0)
+    assert node_memory_budget_mb() == 8000
+    monkeypatch.setattr(admission, "WORKER_MEMORY_BUDGET_MB", 5000)
+    assert node_memory_budget_mb() == 5000
+
+
+def test_worker_reports_its_node_budget(fake_supabase, monkeypatch, tmp_path):
+    worker = pytest.importorskip("worker")
+    from utils.job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(fake_supabase, str(tmp_path / "queue.db"))
+    fake_supabase.table("test_reports").rows.append({"id": "run-1", "status": "pending"})
+    queue.enqueue("run-1", {"url": "https://example.com", "test_types": ["uiux"], "user_id": "u"})
+    monkeypatch.setattr(worker, "start_test_task", lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, "NODE_MEMORY_BUDGET_MB", 6000)
+    monkeypatch.setattr(worker, "WORKER_NODE", "node-1")
+
+    worker.process_job(queue, queue.claim("node-1/0", 60), "node-1/0")
+
+    usage = queue.recent_usage()[0]
+    assert usage["node"] == "node-1" and usage["memory_budget_mb"] == 6000
+    assert fleet_memory_budget_mb(queue.recent_usage()) == 6000
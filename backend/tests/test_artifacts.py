@@ -0,0 +1,79 @@
+import os
+import asyncio
+import pytest
+import test_runner
+from utils import artifacts
+from utils.artifacts import (run_artifact_path, write_json_gz, read_json_gz, write_json, read_json,
+                             remove_run_artifacts, DOM_SNAPSHOT_FILE, DOM_SNAPSHOT_META_FILE)
+from test_dom_snapshot import payload, PAGE
+
+
+@pytest.fixture(autouse=True)
+def artifacts_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(artifacts, "KEEP_RUN_ARTIFACTS", False)
+    return tmp_path / "artifacts"
+
+
+def test_artifacts_round_trip_without_leaving_partial_files(artifacts_dir):
+    gz_path = run_artifact_path("run-1", DOM_SNAPSHOT_FILE)
+    json_path = run_artifact_path("run-1", "plans.json")
+    write_json_gz(gz_path, {"nodes": [1, 2, 3]})
+    write_json(json_path, {"uiux": []})
+
+    assert read_json_gz(gz_path) == {"nodes": [1, 2, 3]}
+    assert read_json(json_path) == {"uiux": []}
+    assert sorted(os.listdir(artifacts_dir / "run-1")) == sorted([DOM_SNAPSHOT_FILE, "plans.json"])
+
+
+def test_run_artifacts_are_removed_unless_kept(artifacts_dir, monkeypatch):
+    write_json(run_artifact_path("run-1", "a.json"), {})
+    write_json(run_artifact_path("run-2", "a.json"), {})
+
+    monkeypatch.setattr(artifacts, "KEEP_RUN_ARTIFACTS", True)
+    remove_run_artifacts("run-1")
+    assert (artifacts_dir / "run-1").exists()
+
+    monkeypatch.setattr(artifacts, "KEEP_RUN_ARTIFACTS", False)
+    remove_run_artifacts("run-1")
+    remove_run_artifacts("never-existed")
+    assert not (artifacts_dir / "run-1").exists()
+    assert (artifacts_dir / "run-2").exists()
+
+
+def test_run_snapshot_is_captured_once_and_shared_through_the_artifact(fake_browser, monkeypatch):
+    captured = payload(PAGE)
+
+    async def capture_snapshot_payload(page):
+        return captured
+
+    monkeypatch.setattr(test_runner, "DOM_CAPTURE", "snapshot")
+    monkeypatch.setattr(test_runner, "capture_snapshot_payload", capture_snapshot_payload)
+
+    meta = asyncio.run(test_runner.capture_run_snapshot("https://example.com", "run-1"))
+
+    assert meta["path"] == run_artifact_path("run-1", DOM_SNAPSHOT_FILE)
+    assert read_json(run_artifact_path("run-1", DOM_SNAPSHOT_META_FILE)) == meta
+    assert meta["prompt_version"] == test_runner.prompt_fingerprint()
+    shared = test_runner.load_run_snapshot(meta["path"])
+    assert meta["dom_hash"] == shared.to_index().fingerprint()
+    assert len(fake_browser.navigations) == 1
+
+
+def test_uiux_run_reads_the_shared_snapshot_instead_of_capturing(fake_browser):
+    shared = test_runner.DomSnapshot(payload(PAGE))
+    results = []
+    asyncio.run(test_runner.run_on_browser("https://example.com", [], "uiux", "chromium", results,
+                                           test_runner.ActionClock(), snapshot=shared))
+
+    assert fake_browser.captures == 0
+    assert {r["id"] for r in results} >= {"uiux-snapshot-tap-targets", "uiux-snapshot-font-size"}
+
+
+@pytest.mark.parametrize("contents", [None, b"not gzip"])
+def test_missing_or_unreadable_snapshot_is_not_shared(tmp_path, contents):
+    path = tmp_path / DOM_SNAPSHOT_FILE
+    if contents is not None:
+        path.write_bytes(contents)
+    assert test_runner.load_run_snapshot(str(path)) is None
+    assert test_runner.load_run_snapshot(None) is None
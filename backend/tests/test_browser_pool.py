@@ -0,0 +1,277 @@
+import asyncio
+import pytest
+from utils import browser_pool
+from utils.browser_pool import BrowserPool, PooledBrowser, get_browser_pool
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        self.contexts.append(FakeContext())
+        return self.contexts[-1]
+
+    async def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    """Every browser the pool launches, in order; no real browser is started."""
+    launched = []
+
+    async def launch(self, browser_type):
+        self.stats["launches"] += 1
+        launched.append(PooledBrowser(FakeBrowser(), browser_type, set()))
+        return launched[-1]
+
+    monkeypatch.setattr(BrowserPool, "_launch", launch)
+    return launched
+
+
+def run(coro_fn, **pool_options):
+    async def main():
+        return await coro_fn(BrowserPool(**pool_options))
+    return asyncio.run(main())
+
+
+def test_sequential_runs_reuse_one_warm_browser_with_fresh_contexts(launches):
+    async def two_runs(pool):
+        contexts = []
+        for _ in range(2):
+            async with pool.context() as context:
+                contexts.append(context)
+        return pool, contexts
+
+    pool, contexts = run(two_runs, size=2)
+    assert len(launches) == 1
+    assert contexts[0] is not contexts[1]
+    assert all(c.closed for c in contexts)
+    assert pool.metrics()["hits"] == 1 and pool.metrics()["misses"] == 1
+    assert pool.metrics()["hit_rate"] == 0.5
+
+
+def test_concurrent_runs_launch_up_to_the_pool_size_then_share(launches):
+    async def three_at_once(pool):
+        entered = asyncio.Event()
+        inside = []
+
+        async def hold():
+            async with pool.context():
+                inside.append(True)
+                if len(inside) == 3:
+                    entered.set()
+                await entered.wait()
+
+        await asyncio.gather(hold(), hold(), hold())
+        return pool
+
+    run(three_at_once, size=2)
+    assert len(launches) == 2
+    assert sorted(b.contexts_served for b in launches) == [1, 2]
+    assert all(b.active == 0 for b in launches)
+
+
+def test_browser_is_recycled_after_max_contexts(launches):
+    async def runs(pool):
+        for _ in range(3):
+            async with pool.context():
+                pass
+        return pool
+
+    pool = run(runs, size=1, max_contexts=2)
+    assert len(launches) == 2
+    assert not launches[0].browser.connected
+    assert pool.metrics()["recycles"] == 1
+    assert pool.metrics()["browsers"] == {"chromium": 1}
+
+
+def test_browser_is_recycled_when_its_processes_grow_too_large(launches, monkeypatch):
+    monkeypatch.setattr(PooledBrowser, "rss_mb", lambda self: 2000)
+
+    async def runs(pool):
+        for _ in range(2):
+            async with pool.context():
+                pass
+        return pool
+
+    pool = run(runs, size=1, max_contexts=50, max_rss_mb=1500)
+    assert len(launches) == 2
+    assert pool.metrics()["recycles"] == 2
+
+
+def test_busy_browser_is_closed_only_after_its_last_context(launches):
+    async def overlap(pool):
+        first = pool.context()
+        await first.__aenter__()
+        async with pool.context():
+            pass
+        # Both contexts were served, so the browser retires, but the first is still open
+        still_open = launches[0].browser.connected
+        await first.__aexit__(None, None, None)
+        return still_open
+
+    assert run(overlap, size=1, max_contexts=2) is True
+    assert not launches[0].browser.connected
+
+
+def test_disconnected_browser_is_replaced(launches):
+    async def runs(pool):
+        async with pool.context():
+            pass
+        launches[0].browser.connected = False
+        async with pool.context():
+            pass
+        return pool
+
+    pool = run(runs, size=1)
+    assert len(launches) == 2
+    assert pool.metrics()["browsers"] == {"chromium": 1}
+
+
+def test_browser_types_are_pooled_separately(launches):
+    async def runs(pool):
+        for browser_type in ("chromium", "firefox", "chromium"):
+            async with pool.context(browser_type):
+                pass
+        return pool
+
+    run(runs, size=1)
+    assert [b.browser_type for b in launches] == ["chromium", "firefox"]
+
+
+def test_pool_is_bound_to_the_running_loop(monkeypatch):
+    monkeypatch.setattr(browser_pool, "_pool", None)
+
+    async def get_twice():
+        return get_browser_pool(), get_browser_pool()
+
+    first, same = asyncio.run(get_twice())
+    other, _ = asyncio.run(get_twice())
+    assert first is same
+    assert other is not first
+
+
+def test_cold_launch_does_not_hold_up_checkouts_of_warm_browsers(launches, monkeypatch):
+    release = None
+
+    async def slow_firefox(self, browser_type):
+        if browser_type == "firefox":
+            await release.wait()
+        self.stats["launches"] += 1
+        launches.append(PooledBrowser(FakeBrowser(), browser_type, set()))
+        return launches[-1]
+
+    monkeypatch.setattr(BrowserPool, "_launch", slow_firefox)
+
+    async def runs(pool):
+        nonlocal release
+        release = asyncio.Event()
+        async with pool.context("chromium"):
+            pass
+        firefox = asyncio.ensure_future(pool.context("firefox").__aenter__())
+        await asyncio.sleep(0)
+        # Firefox is still launching; chromium is served from its warm browser meanwhile
+        async with pool.context("chromium"):
+            served_while_launching = not firefox.done()
+        release.set()
+        await firefox
+        return served_while_launching
+
+    assert run(runs, size=1) is True
+    assert [b.browser_type for b in launches] == ["chromium", "firefox"]
+
+
+def test_checkouts_that_share_a_launching_slot_get_its_browser(launches):
+    async def two_at_once(pool):
+        async def hold():
+            async with pool.context() as context:
+                await asyncio.sleep(0)
+                return context
+
+        return await asyncio.gather(hold(), hold())
+
+    contexts = run(two_at_once, size=1)
+    assert len(launches) == 1
+    assert launches[0].browser.contexts == contexts
+    assert launches[0].contexts_served == 2 and launches[0].active == 0
+
+
+def test_failed_launch_frees_its_slot(launches, monkeypatch):
+    async def launch(self, browser_type):
+        if not launches:
+            launches.append(None)
+            raise RuntimeError("browser crashed on start")
+        launches.append(PooledBrowser(FakeBrowser(), browser_type, set()))
+        return launches[-1]
+
+    monkeypatch.setattr(BrowserPool, "_launch", launch)
+
+    async def runs(pool):
+        with pytest.raises(RuntimeError):
+            async with pool.context():
+                pass
+        async with pool.context():
+            pass
+        return pool
+
+    pool = run(runs, size=1)
+    assert pool.metrics()["browsers"] == {"chromium": 1}
+    assert launches[1].contexts_served == 1
+
+
+def test_process_memory_is_sampled_outside_the_pool_lock(launches, monkeypatch):
+    pool_ref, locked = [], []
+
+    def rss_mb(self):
+        locked.append(pool_ref[0]._lock.locked())
+        return 0
+
+    monkeypatch.setattr(PooledBrowser, "rss_mb", rss_mb)
+
+    async def one_run(pool):
+        pool_ref.append(pool)
+        async with pool.context():
+            pass
+
+    run(one_run, size=1, max_rss_mb=1500)
+    assert locked == [False]
+
+
+def test_health_shows_the_pools_workers_report_under_queue_dispatch(fake_supabase, monkeypatch, tmp_path):
+    worker = pytest.importorskip("worker")
+    server = pytest.importorskip("server")
+    from utils.job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(fake_supabase, str(tmp_path / "queue.db"))
+    pool = {"total": {"hits": 3, "misses": 1, "launches": 1, "recycles": 0, "contexts": 4, "hit_rate": 0.75},
+            "workers": {}}
+
+    class Engine:
+        def browser_pool_metrics(self):
+            return pool
+
+    monkeypatch.setattr(worker, "get_engine", Engine)
+    monkeypatch.setattr(worker, "WORKER_ID", "node-1-42")
+    worker.report_status(queue)
+
+    monkeypatch.setattr(server, "TEST_DISPATCH", "queue")
+    monkeypatch.setattr(server, "TEST_EXECUTION_ENGINE", "pool")
+    monkeypatch.setattr(server, "get_job_queue", lambda: queue)
+    monkeypatch.setattr(server, "llm_cache_metrics", lambda: {"enabled": False})
+    health = server.app.test_client().get("/health").get_json()
+
+    assert health["browser_pool"]["workers"] == {"node-1-42": pool}
+    assert health["browser_pool"]["total"]["hit_rate"] == 0.75
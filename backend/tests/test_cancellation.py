@@ -0,0 +1,339 @@
+import os
+import time
+import asyncio
+import types
+import threading
+import pytest
+from utils import cancellation
+from utils.cancellation import request_cancel, is_cancel_requested, clear_cancel, run_cancellable, sweep_stale_cancels
+
+
+@pytest.fixture(autouse=True)
+def cancel_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cancellation, "CANCEL_DIR", str(tmp_path / "cancel"))
+    return tmp_path / "cancel"
+
+
+def test_flag_round_trip():
+    assert not is_cancel_requested("run-1")
+    request_cancel("run-1")
+    assert is_cancel_requested("run-1")
+    assert not is_cancel_requested("run-2")
+    clear_cancel("run-1")
+    clear_cancel("run-1")
+    assert not is_cancel_requested("run-1")
+
+
+def test_empty_run_id_is_never_cancelled():
+    request_cancel("run-1")
+    assert not is_cancel_requested(None)
+    assert not is_cancel_requested("")
+
+
+def test_sweep_removes_only_stale_flags(cancel_dir):
+    request_cancel("old")
+    request_cancel("new")
+    hour_ago = time.time() - 3600
+    os.utime(cancel_dir / "old", (hour_ago, hour_ago))
+
+    assert sweep_stale_cancels(max_age_seconds=600) == 1
+    assert not is_cancel_requested("old")
+    assert is_cancel_requested("new")
+
+
+def test_sweep_without_directory_is_a_no_op():
+    assert sweep_stale_cancels() == 0
+
+
+def test_run_cancellable_returns_result_when_not_cancelled():
+    async def work():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    assert asyncio.run(run_cancellable(work(), "run-1", poll_seconds=0.01)) == ("done", False)
+
+
+def test_run_cancellable_stops_work_when_flag_is_raised():
+    stopped = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.append(True)
+            raise
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, request_cancel, "run-1")
+        return await run_cancellable(work(), "run-1", poll_seconds=0.01)
+
+    started = time.monotonic()
+    assert asyncio.run(main()) == (None, True)
+    assert stopped == [True]
+    assert time.monotonic() - started < 2
+
+
+# Server side: who sets the status, who raises the flag, and who clears it
+
+@pytest.fixture
+def server(fake_supabase, monkeypatch):
+    server = pytest.importorskip("server")
+    monkeypatch.setattr(server, "supabase", fake_supabase)
+    monkeypatch.setattr(server, "verify_user_token", lambda header: types.SimpleNamespace(id="user-1"))
+    return server
+
+
+def add_run(fake_supabase, run_id, status):
+    fake_supabase.table("test_reports").rows.append(
+        {"id": run_id, "status": status, "test_requests": {"user_id": "user-1"}})
+    return fake_supabase.table("test_reports").get(run_id)
+
+
+def test_finish_records_completed_run(server, fake_supabase):
+    run = add_run(fake_supabase, "run-1", "running")
+
+    assert server.finish_test_run("run-1", {"all": []}, {"total": 0}) == "completed"
+    assert run["status"] == "completed"
+    assert run["summary"] == {"total": 0}
+
+
+def test_finish_never_overwrites_a_cancel_that_landed_late(server, fake_supabase):
+    # Cancelled through the API after the run's last flag check: the row says so, no flag here
+    run = add_run(fake_supabase, "run-1", "cancelled")
+
+    assert server.finish_test_run("run-1", {"all": [{"id": "t"}]}, {"total": 1}) == "cancelled"
+    assert run["status"] == "cancelled"
+    assert run["report_data"] == {"all": [{"id": "t"}]}
+    assert run["completed_at"]
+
+
+def test_finish_reports_cancel_seen_through_the_flag(server, fake_supabase):
+    run = add_run(fake_supabase, "run-1", "running")
+    request_cancel("run-1")
+
+    assert server.finish_test_run("run-1", {"all": []}, {"total": 0}) == "cancelled"
+    assert run["status"] == "cancelled"
+
+
+def test_run_cancelled_before_it_started_does_no_work(server, fake_supabase):
+    run = add_run(fake_supabase, "run-1", "cancelled")
+
+    result = asyncio.run(server.run_all_tests("https://example.com", "run-1", ["functional"]))
+
+    assert result == {"all": []}
+    assert run["status"] == "cancelled"
+    assert "started_at" not in run
+
+
+@pytest.fixture
+def preparing_run(server, fake_supabase, monkeypatch):
+    """A running two-type run whose tests must never start; returns the report row."""
+    async def snapshot(url, test_run_id):
+        return None
+
+    async def never_run(*args, **kwargs):
+        raise AssertionError("tests ran after the run was cancelled")
+
+    monkeypatch.setattr(server, "capture_run_snapshot", snapshot)
+    monkeypatch.setattr(server, "run_test_type_pooled", never_run)
+    monkeypatch.setattr(server, "run_test_type_subprocess", never_run)
+    monkeypatch.setattr(server, "GENERATION_MODE", "batch")
+    return add_run(fake_supabase, "run-1", "queued")
+
+
+def start_preparing_run(server, tmp_path):
+    srs = tmp_path / "srs.pdf"
+    srs.write_bytes(b"")
+    started = time.monotonic()
+    result = asyncio.run(server.run_all_tests("https://example.com", "run-1", ["functional", "uiux"],
+                                              str(srs), force=True))
+    return result, time.monotonic() - started, srs
+
+
+def test_cancel_during_batched_generation_stops_the_run(server, preparing_run, monkeypatch, tmp_path):
+    stopped = []
+
+    async def generate(test_run_id, srs_local_path, test_types):
+        request_cancel(test_run_id)
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            stopped.append(test_types)
+            raise
+
+    monkeypatch.setattr(server, "generate_run_plans", generate)
+
+    result, elapsed, srs = start_preparing_run(server, tmp_path)
+
+    assert result == {"all": []}
+    assert stopped == [["functional", "uiux"]]
+    assert elapsed < 5
+    assert preparing_run["status"] == "cancelled"
+    assert preparing_run["summary"]["total"] == 0
+    assert srs.exists()  # uploaded SRS files are kept
+
+
+def test_cancel_during_snapshot_capture_stops_the_run(server, preparing_run, monkeypatch, tmp_path):
+    async def snapshot(url, test_run_id):
+        request_cancel(test_run_id)
+        await asyncio.sleep(30)
+
+    async def generate(*args):
+        raise AssertionError("plans generated after the run was cancelled")
+
+    monkeypatch.setattr(server, "capture_run_snapshot", snapshot)
+    monkeypatch.setattr(server, "generate_run_plans", generate)
+
+    result, elapsed, _ = start_preparing_run(server, tmp_path)
+
+    assert result == {"all": []}
+    assert elapsed < 5
+    assert preparing_run["status"] == "cancelled"
+
+
+def test_test_task_clears_flag_and_keeps_cancel_when_run_crashes(server, fake_supabase, monkeypatch):
+    run = add_run(fake_supabase, "run-1", "cancelled")
+    request_cancel("run-1")
+
+    async def crash(*args, **kwargs):
+        raise RuntimeError("browser died")
+
+    monkeypatch.setattr(server, "run_all_tests", crash)
+    server.start_test_task("https://example.com", "run-1", ["functional"])
+
+    assert run["status"] == "cancelled"
+    assert not is_cancel_requested("run-1")
+
+
+def cancel(server, run_id):
+    with server.app.test_client() as client:
+        return client.post(f"/api/test-runs/{run_id}/cancel", headers={"Authorization": "Bearer token"})
+
+
+def test_cancel_running_thread_run_raises_local_flag(server, fake_supabase, monkeypatch):
+    monkeypatch.setattr(server, "TEST_DISPATCH", "thread")
+    run = add_run(fake_supabase, "run-1", "running")
+
+    response = cancel(server, "run-1")
+
+    assert response.status_code == 200
+    assert run["status"] == "cancelled"
+    assert is_cancel_requested("run-1")
+
+
+def test_cancel_queued_run_updates_report_and_queue_without_local_flag(server, fake_supabase, monkeypatch,
+                                                                     tmp_path):
+    from utils.job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(fake_supabase, str(tmp_path / "queue.db"))
+    monkeypatch.setattr(server, "TEST_DISPATCH", "queue")
+    monkeypatch.setattr(server, "get_job_queue", lambda: queue)
+    run = add_run(fake_supabase, "run-1", "pending")
+    queue.enqueue("run-1", {"user_id": "user-1"})
+
+    response = cancel(server, "run-1")
+
+    assert response.status_code == 200
+    assert run["status"] == "cancelled"
+    assert run["report_data"] == {"all": []}
+    assert queue.get("run-1")["status"] == "cancelled"
+    assert queue.claim("worker-1", 60) is None
+    # The flag is raised by the worker that holds the job, on its own node
+    assert not is_cancel_requested("run-1")
+
+
+def test_cancel_finished_run_is_rejected(server, fake_supabase):
+    add_run(fake_supabase, "run-1", "completed")
+
+    assert cancel(server, "run-1").status_code == 409
+    assert not is_cancel_requested("run-1")
+
+
+def test_worker_clears_flag_raised_after_run_finished(fake_supabase, monkeypatch, tmp_path):
+    worker = pytest.importorskip("worker")
+    from utils.job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(fake_supabase, str(tmp_path / "queue.db"))
+    add_run(fake_supabase, "run-1", "pending")
+    queue.enqueue("run-1", {"url": "https://example.com", "test_types": ["functional"], "user_id": "user-1"})
+    job = queue.claim("worker-1", 60)
+    monkeypatch.setattr(worker, "JOB_CANCEL_POLL_SECONDS", 0.01)
+
+    def run_then_cancel(*args, **kwargs):
+        # Cancelled through the API while the run is finishing
+        fake_supabase.table("test_reports").get("run-1")["status"] = "cancelled"
+        time.sleep(0.1)
+
+    monkeypatch.setattr(worker, "start_test_task", run_then_cancel)
+    worker.process_job(queue, job, "worker-1")
+
+    assert not is_cancel_requested("run-1")
+    assert queue.get("run-1")["lease_owner"] is None
+
+
+# A worker that loses its lease stops the run and leaves the report to the new owner
+
+@pytest.fixture
+def leased_run(fake_supabase, tmp_path):
+    from utils.job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(fake_supabase, str(tmp_path / "queue.db"))
+    add_run(fake_supabase, "run-1", "pending")
+    queue.enqueue("run-1", {"url": "https://example.com", "test_types": ["functional"], "user_id": "user-1"})
+    queue.claim("worker-1", 60)
+    return queue
+
+
+def heartbeat_once(worker, queue, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_HEARTBEAT_SECONDS", 0.01)
+    lease_lost = threading.Event()
+    worker.heartbeat_loop(queue, "run-1", "worker-1", threading.Event(), lease_lost)
+    return lease_lost
+
+
+def test_heartbeat_that_finds_the_job_taken_over_stops_the_run(leased_run, monkeypatch):
+    worker = pytest.importorskip("worker")
+    leased_run._connect().execute("UPDATE test_jobs SET lease_owner = 'worker-2' WHERE id = 'run-1'")
+
+    assert heartbeat_once(worker, leased_run, monkeypatch).is_set()
+    assert not is_cancel_requested("run-1")
+
+
+def test_heartbeat_of_a_cancelled_job_raises_the_flag_instead(leased_run, monkeypatch):
+    worker = pytest.importorskip("worker")
+    leased_run.cancel("run-1")
+
+    assert not heartbeat_once(worker, leased_run, monkeypatch).is_set()
+    assert is_cancel_requested("run-1")
+
+
+def test_lost_lease_cancels_the_run_task(server, fake_supabase, monkeypatch):
+    run = add_run(fake_supabase, "run-1", "running")
+    stopped = []
+
+    async def long_run(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.append(True)
+            raise
+
+    monkeypatch.setattr(server, "run_all_tests", long_run)
+    lease_lost = threading.Event()
+    threading.Timer(0.05, lease_lost.set).start()
+    started = time.monotonic()
+    server.start_test_task("https://example.com", "run-1", ["functional"], lease_owner="worker-1",
+                           lease_lost=lease_lost)
+
+    assert time.monotonic() - started < 2
+    assert stopped
+    assert run["status"] == "running"
+
+
+def test_finish_by_a_worker_that_lost_its_lease_writes_nothing(server, fake_supabase):
+    run = add_run(fake_supabase, "run-1", "running")
+    run["lease_owner"] = "worker-2"
+
+    assert server.finish_test_run("run-1", {"all": []}, {"total": 0}, lease_owner="worker-1") == "lease_lost"
+    assert run["status"] == "running"
+    assert "summary" not in run
+
+    assert server.finish_test_run("run-1", {"all": []}, {"total": 0}, lease_owner="worker-2") == "completed"
+    assert run["status"] == "completed"
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+import test_runner
+from utils import cancellation
+from utils.artifacts import write_json
+
+TESTCASES = [
+    {"id": "tc1", "name": "Home loads", "action": "goto", "selector": "", "expected": "Home"},
+    {"id": "tc2", "name": "Menu opens", "action": "click", "selector": "#menu", "expected": "Menu"},
+]
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record_type, **fields):
+        self.records.append({"type": record_type, **fields})
+
+    def close(self):
+        pass
+
+    def results(self):
+        return [r for r in self.records if r["type"] == "result"]
+
+
+@pytest.fixture
+def channel(monkeypatch, tmp_path):
+    monkeypatch.setattr(cancellation, "CANCEL_DIR", str(tmp_path / "cancel"))
+    channel = RecordingChannel()
+    monkeypatch.setattr(test_runner, "open_channel", lambda address: channel)
+    return channel
+
+
+@pytest.fixture
+def plans_path(tmp_path):
+    path = str(tmp_path / "plans.json")
+    write_json(path, {"compatibility": TESTCASES})
+    return path
+
+
+def fake_engines(failing):
+    async def run_on_browser(url, testcases, test_type, browser_type, results, clock, single_session=True,
+                             on_result=None, on_loaded=None, snapshot=None, on_validated=None, stream=None):
+        results[:] = [None] * len(testcases)
+        for i, tc in enumerate(testcases):
+            results[i] = {"id": tc["id"], "name": tc["name"], "status": "pass", "type": test_type}
+            on_result(i, results[i])
+        if browser_type in failing:
+            # e.g. the context failing to close once every testcase has reported
+            raise RuntimeError(f"{browser_type} crashed")
+        return results
+    return run_on_browser
+
+
+def run(plans_path):
+    return asyncio.run(test_runner.run_tests("https://example.com", "run-1", None, "compatibility",
+                                             plans_path=plans_path))
+
+
+def test_every_engine_runs_the_plan_with_distinct_indexes(channel, plans_path, monkeypatch):
+    monkeypatch.setattr(test_runner, "COMPATIBILITY_BROWSERS", ["chromium", "firefox", "webkit"])
+    monkeypatch.setattr(test_runner, "run_on_browser", fake_engines(failing=set()))
+
+    results = run(plans_path)
+
+    assert len(results) == 6
+    assert {r["browser"] for r in results} == {"chromium", "firefox", "webkit"}
+    assert "tc1-firefox" in {r["id"] for r in results}
+    indexes = [r["index"] for r in channel.results()]
+    assert sorted(indexes) == list(range(6))
+
+
+def test_engine_error_gets_its_own_index(channel, plans_path, monkeypatch):
+    monkeypatch.setattr(test_runner, "COMPATIBILITY_BROWSERS", ["chromium", "firefox", "webkit"])
+    monkeypatch.setattr(test_runner, "run_on_browser", fake_engines(failing={"firefox"}))
+
+    results = run(plans_path)
+
+    emitted = channel.results()
+    indexes = [r["index"] for r in emitted]
+    assert len(indexes) == len(set(indexes)), "a result was emitted over another one"
+    by_id = {r["result"]["id"]: r["result"] for r in emitted}
+    # firefox's testcases finished before it crashed, and are still reported
+    assert by_id["tc2-firefox"]["status"] == "pass"
+    assert by_id["compatibility-engine-firefox"]["status"] == "error"
+    assert {r["id"] for r in results} == set(by_id)
+    assert [r["stage"] for r in channel.records if r["type"] == "stage"][-1] == "finished"
+
+
+def test_non_compatibility_engine_failure_fails_the_type(channel, tmp_path, monkeypatch):
+    path = str(tmp_path / "plans.json")
+    write_json(path, {"functional": TESTCASES})
+    monkeypatch.setattr(test_runner, "run_on_browser", fake_engines(failing={"chromium"}))
+
+    results = asyncio.run(test_runner.run_tests("https://example.com", "run-1", None, "functional",
+                                                plans_path=path))
+
+    assert [r["id"] for r in results] == ["functional-error"]
@@ -0,0 +1,100 @@
+from utils.dom_index import DomIndex, css_escape, text_hash
+
+PAGE = """
+<html><head><meta name="viewport" content="width=device-width"><title>Shop</title></head>
+<body>
+  <div id="app" class="layout main">
+    <form id="login"><label for="user">User  name</label>
+      <input id="user" name="username" placeholder="Your name">
+      <input type="submit" value="Sign in" class="btn primary">
+    </form>
+    <span id="note">Not indexed</span>
+    <a class="nav-link">Home</a><a class="nav-link">Shop</a>
+    <button class="md:w-1/2">Buy <b>now</b></button>
+    <div><p>Unclosed paragraph <div class="inner">Inner</div></div>
+    <img src="x.png" alt="Logo">
+  </div>
+</body></html>
+"""
+
+
+def test_only_indexed_tags_are_recorded_under_their_old_selector():
+    index = DomIndex.from_html(PAGE)
+
+    assert "#app" in index and "#user" in index and "#login" in index
+    assert ".btn.primary" in index
+    assert "[name='viewport']" in index
+    assert "#note" not in index
+    assert index.get("#user").tag == "input"
+    # id wins over classes, classes over name
+    assert index.get("#app").classes == ("layout", "main")
+    assert "[name='username']" not in index
+
+
+def test_selectors_are_css_escaped():
+    index = DomIndex.from_html(PAGE)
+    assert css_escape("md:w-1/2") == "md\\:w-1\\/2"
+    assert ".md\\:w-1\\/2" in index
+
+
+def test_lookup_maps_and_uniqueness():
+    index = DomIndex.from_html(PAGE)
+
+    assert len(index.by_class["nav-link"]) == 2
+    assert not index.is_unique(".nav-link")
+    assert index.is_unique("#app")
+    assert index.by_name["username"] == index.by_id["user"]
+    assert set(index) == set(index.by_selector)
+    assert len(index) == len(index.by_selector)
+
+
+def test_labels_come_from_attributes_text_and_label_elements():
+    index = DomIndex.from_html(PAGE)
+
+    assert index.get("#user").label == "Your name"
+    assert index.get(".btn.primary").label == "Sign in"
+    assert index.get(".md\\:w-1\\/2").label == "Buy now"
+    assert index.labels_for == {"user": "User name"}
+
+
+def test_text_is_hashed_with_whitespace_collapsed():
+    index = DomIndex.from_html(PAGE)
+    assert index.get(".md\\:w-1\\/2").text_hash == text_hash("Buy now")
+    assert text_hash("Buy\n   now ") == text_hash("Buy now")
+
+
+def test_unclosed_children_end_with_their_parent():
+    index = DomIndex.from_html(PAGE)
+    assert index.get(".inner").text_hash == text_hash("Inner")
+    assert index.get("#app").text_hash != 0
+
+
+def test_every_element_is_noted_but_html_is_never_complete():
+    index = DomIndex.from_html(PAGE)
+    assert {"span", "p", "b", "title"} <= index.all_tags
+    assert "note" in index.all_ids
+    assert index.complete is False
+
+
+def test_fingerprint_tracks_content_not_identity():
+    assert DomIndex.from_html(PAGE).fingerprint() == DomIndex.from_html(PAGE).fingerprint()
+    changed = PAGE.replace("Buy <b>now</b>", "Buy later")
+    assert DomIndex.from_html(changed).fingerprint() != DomIndex.from_html(PAGE).fingerprint()
+
+
+def test_index_built_in_the_browser_matches_the_html_one():
+    html = '<div id="a" class="x">Hi</div><label for="a">Name</label><input name="q" placeholder="Search">'
+    collected = {
+        "rows": [["div", "a", ["x"], "", "Hi", "", ""], ["label", "", [], "", "Name", "", "a"],
+                 ["input", "", [], "q", "", "Search", ""]],
+        "ids": ["a"], "classes": ["x"], "tags": ["div", "label", "input", "body"], "names": ["q"],
+        "complete": True,
+    }
+    from_browser = DomIndex.from_browser(collected)
+    from_html = DomIndex.from_html(html)
+
+    assert from_browser.fingerprint() == from_html.fingerprint()
+    assert list(from_browser) == list(from_html)
+    assert from_browser.labels_for == from_html.labels_for == {"a": "Name"}
+    assert from_browser.get("[name='q']").label == "Search"
+    assert from_browser.complete is True
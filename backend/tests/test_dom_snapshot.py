@@ -0,0 +1,121 @@
+from utils.dom_index import DomIndex, text_hash
+from utils.dom_snapshot import DomSnapshot, SNAPSHOT_STYLES, snapshot_checks
+
+VISIBLE = {"box": [0, 0, 100, 40], "display": "block", "visibility": "visible", "opacity": "1", "font-size": "16px"}
+
+
+def el(tag, attrs=None, *children, layout=VISIBLE):
+    return {"tag": tag, "attrs": attrs or {}, "children": children, "layout": layout}
+
+
+def payload(root, content_width=1280):
+    """A DOMSnapshot.captureSnapshot payload for a tree of el() nodes and text strings, strings interned."""
+    strings = []
+
+    def intern(value):
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    nodes = {"nodeType": [], "parentIndex": [], "nodeName": [], "nodeValue": [], "attributes": []}
+    layout = {"nodeIndex": [], "bounds": [], "styles": []}
+
+    def add(node, parent, parent_layout):
+        index = len(nodes["nodeType"])
+        text = isinstance(node, str)
+        nodes["nodeType"].append(3 if text else 1)
+        nodes["parentIndex"].append(parent)
+        nodes["nodeName"].append(intern("#text" if text else node["tag"].upper()))
+        nodes["nodeValue"].append(intern(node) if text else -1)
+        nodes["attributes"].append([] if text else [intern(s) for pair in node["attrs"].items() for s in pair])
+        # Text is laid out with its parent's style
+        node_layout = parent_layout if text else node["layout"]
+        if node_layout is not None:
+            layout["nodeIndex"].append(index)
+            layout["bounds"].append(node_layout["box"])
+            layout["styles"].append([intern(node_layout[name]) for name in SNAPSHOT_STYLES])
+        for child in ([] if text else node["children"]):
+            add(child, index, node_layout)
+
+    add(root, -1, VISIBLE)
+    return {"strings": strings,
+            "documents": [{"nodes": nodes, "layout": layout, "contentWidth": content_width}]}
+
+
+PAGE = el("html", {}, el("body", {},
+    el("div", {"id": "app", "class": "main"},
+        el("label", {"for": "email"}, "Email"),
+        el("input", {"id": "email", "name": "email"}),
+        el("input", {"name": "q"}),
+        el("button", {"class": "buy"}, "Buy ", el("b", {}, "now")),
+        el("a", {"href": "/x"}, layout={**VISIBLE, "box": [0, 0, 10, 10]}),
+        el("img", {"src": "logo.png"}),
+        el("img", {"src": "hidden.png"}, layout={**VISIBLE, "display": "none"}),
+        el("span", {}, "tiny", layout={**VISIBLE, "font-size": "9px"}),
+    )))
+
+
+def test_payload_decodes_into_parallel_node_lists():
+    snapshot = DomSnapshot(payload(PAGE))
+    elements = {snapshot.tags[n]: n for n in reversed(list(snapshot.elements()))}
+
+    assert [snapshot.tags[n] for n in snapshot.elements()][:4] == ["html", "body", "div", "label"]
+    assert snapshot.text(elements["button"]) == "Buy now"
+    assert snapshot.attributes[elements["div"]] == {"id": "app", "class": "main"}
+    assert list(snapshot.ancestors(elements["b"])) == [elements["button"], elements["div"], elements["body"], 0]
+    # html > body > div > button > b > "now"
+    assert snapshot.depth() == 5
+
+
+def test_index_matches_the_html_index_and_is_complete():
+    snapshot_index = DomSnapshot(payload(PAGE)).to_index()
+    html_index = DomIndex.from_html(
+        '<html><body><div id="app" class="main"><label for="email">Email</label><input id="email" name="email">'
+        '<input name="q"><button class="buy">Buy <b>now</b></button><a href="/x"></a><img src="logo.png">'
+        '<img src="hidden.png"><span>tiny</span></div></body></html>')
+
+    assert list(snapshot_index) == list(html_index)
+    assert snapshot_index.fingerprint() == html_index.fingerprint()
+    assert snapshot_index.get(".buy").text_hash == text_hash("Buy now")
+    assert snapshot_index.labels_for == {"email": "Email"}
+    assert snapshot_index.complete is True
+
+
+def test_visibility_follows_boxes_and_styles():
+    snapshot = DomSnapshot(payload(PAGE))
+    images = [n for n in snapshot.elements() if snapshot.tags[n] == "img"]
+    assert [snapshot.visible(n) for n in images] == [True, False]
+
+
+def by_id(results):
+    return {r["id"]: r for r in results}
+
+
+def test_accessibility_checks():
+    results = by_id(snapshot_checks(DomSnapshot(payload(PAGE)), "accessibility"))
+
+    assert results["accessibility-snapshot-img-alt"]["status"] == "fail"
+    assert "img" in results["accessibility-snapshot-img-alt"]["details"]
+    # The hidden image is not reported
+    assert results["accessibility-snapshot-img-alt"]["details"].startswith("1 found")
+    assert results["accessibility-snapshot-form-labels"]["details"] == "1 found: input[name='q']"
+    assert results["accessibility-snapshot-control-names"]["details"] == "1 found: a"
+
+
+def test_uiux_checks():
+    results = by_id(snapshot_checks(DomSnapshot(payload(PAGE, content_width=1600)), "uiux", viewport_width=1280))
+
+    assert results["uiux-snapshot-tap-targets"]["status"] == "warning"
+    assert "a (10x10px)" in results["uiux-snapshot-tap-targets"]["details"]
+    assert results["uiux-snapshot-font-size"]["details"] == "1 found: span (9px)"
+    assert results["uiux-snapshot-horizontal-overflow"]["status"] == "warning"
+
+
+def test_performance_checks_pass_on_a_small_page():
+    results = snapshot_checks(DomSnapshot(payload(PAGE)), "performance")
+    assert [r["status"] for r in results] == ["pass", "pass"]
+    assert results[1]["details"] == "Depth 5"
+
+
+def test_types_the_snapshot_cannot_answer_get_no_checks():
+    assert snapshot_checks(DomSnapshot(payload(PAGE)), "functional") == []
@@ -0,0 +1,167 @@
+import json
+import time
+import types
+import threading
+import pytest
+from utils import run_events
+from utils.run_events import issue_stream_token, read_stream_token
+
+
+@pytest.fixture
+def server(fake_supabase, monkeypatch):
+    server = pytest.importorskip("server")
+    monkeypatch.setattr(server, "supabase", fake_supabase)
+    monkeypatch.setattr(server, "verify_user_token",
+                        lambda header: types.SimpleNamespace(id="user-1") if header == "Bearer token" else None)
+    monkeypatch.setattr(run_events, "EVENTS_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(run_events, "EVENTS_STATUS_SECONDS", 0)
+    monkeypatch.setattr(run_events, "EVENTS_TAIL_IDLE_SECONDS", 0)
+    monkeypatch.setattr(run_events, "_tails", {})
+    return server
+
+
+@pytest.fixture
+def finished_run(fake_supabase):
+    fake_supabase.table("test_reports").rows.append({
+        "id": "run-1", "status": "completed", "summary": {"total": 1},
+        "test_requests": {"user_id": "user-1"}
+    })
+    logs = fake_supabase.table("test_execution_logs").rows
+    logs += [
+        {"report_id": "run-1", "seq": 1, "test_type": "uiux", "event_type": "stage", "message": "started",
+         "details": {}, "timestamp": "t1"},
+        {"report_id": "run-1", "seq": 2, "test_type": "uiux", "event_type": "log", "message": "noise",
+         "details": {}, "timestamp": "t2"},
+        {"report_id": "run-1", "seq": 3, "test_type": "uiux", "event_type": "result", "message": "r",
+         "details": {"id": "uiux-1", "status": "pass"}, "timestamp": "t3"},
+        {"report_id": "run-1", "seq": 4, "test_type": "uiux", "event_type": "stage", "message": "finished",
+         "details": {"count": 1}, "timestamp": "t4"},
+        {"report_id": "run-2", "seq": 5, "test_type": "uiux", "event_type": "stage", "message": "started",
+         "details": {}, "timestamp": "t5"},
+    ]
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and line[0] != ":")
+        if "event" in fields:
+            events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def get_events(server, path="/api/test-runs/run-1/events", headers=None):
+    with server.app.test_client() as client:
+        response = client.get(path, headers={"Authorization": "Bearer token", **(headers or {})})
+        return response, response.get_data(as_text=True)
+
+
+def test_stream_sends_stages_and_results_then_done(server, finished_run):
+    response, body = get_events(server)
+
+    assert response.mimetype == "text/event-stream"
+    assert body.startswith("retry: 2000\n\n")
+    events = parse_events(body)
+    assert [(name, event_id) for name, event_id, _ in events] == [
+        ("status", None), ("stage", "1"), ("result", "3"), ("stage", "4"), ("done", None)
+    ]
+    assert events[2][2] == {"test_type": "uiux", "result": {"id": "uiux-1", "status": "pass"}}
+    assert events[3][2]["count"] == 1
+    assert events[-1][2] == {"status": "completed", "summary": {"total": 1}}
+
+
+def test_reconnect_resumes_after_the_last_event_id(server, finished_run):
+    _, body = get_events(server, headers={"Last-Event-ID": "3"})
+
+    assert [(name, event_id) for name, event_id, _ in parse_events(body)] == [
+        ("status", None), ("stage", "4"), ("done", None)
+    ]
+
+
+def test_status_change_is_streamed_while_the_run_is_live(server, finished_run, fake_supabase):
+    run = fake_supabase.table("test_reports").get("run-1")
+    run["status"] = "running"
+    reads = []
+    table = fake_supabase.table("test_reports")
+    select = table.select
+
+    def select_and_finish(*columns, **kwargs):
+        # The run completes between the stream's first and second status checks
+        reads.append(columns)
+        if len(reads) == 3:
+            run["status"] = "completed"
+        return select(*columns, **kwargs)
+
+    table.select = select_and_finish
+    _, body = get_events(server)
+
+    names = [(name, data.get("status")) for name, _, data in parse_events(body) if name in ("status", "done")]
+    assert names == [("status", "running"), ("status", "completed"), ("done", "completed")]
+
+
+def test_stream_token_opens_only_its_own_run(server, finished_run):
+    with server.app.test_client() as client:
+        issued = client.post("/api/test-runs/run-1/events/token", headers={"Authorization": "Bearer token"})
+        token = issued.get_json()["token"]
+
+        assert issued.get_json()["expires_in"] == run_events.EVENTS_TOKEN_TTL_SECONDS
+        response = client.get(f"/api/test-runs/run-1/events?token={token}")
+        assert response.status_code == 200
+        assert parse_events(response.get_data(as_text=True))[-1][0] == "done"
+        assert client.get(f"/api/test-runs/run-2/events?token={token}").status_code == 401
+        assert client.post("/api/test-runs/run-1/events/token").status_code == 401
+
+
+def test_session_token_is_not_accepted_in_the_query_string(server, finished_run):
+    with server.app.test_client() as client:
+        assert client.get("/api/test-runs/run-1/events?token=token").status_code == 401
+        assert client.get("/api/test-runs/run-1/events").status_code == 401
+
+
+def test_expired_stream_token_asks_the_client_to_renew_it(server, finished_run):
+    token = issue_stream_token("run-1", "user-1", ttl_seconds=-1)
+
+    with server.app.test_client() as client:
+        response = client.get(f"/api/test-runs/run-1/events?token={token}")
+
+    assert response.status_code == 200
+    assert [name for name, _, _ in parse_events(response.get_data(as_text=True))] == ["expired"]
+
+
+def test_stream_tokens_are_signed():
+    token = issue_stream_token("run-1", "user-1")
+    payload, signature = token.split(".")
+    forged = issue_stream_token("run-1", "user-2").split(".")[0]
+
+    assert read_stream_token(token, "run-1") == ("user-1", None)
+    assert read_stream_token(f"{forged}.{signature}", "run-1") == (None, "invalid")
+    assert read_stream_token("not-a-token", "run-1") == (None, "invalid")
+
+
+def test_streams_of_a_run_share_one_tail(server, finished_run, fake_supabase, monkeypatch):
+    run = fake_supabase.table("test_reports").get("run-1")
+    run["status"] = "running"
+    started = []
+    start = run_events.RunEventTail.start
+    monkeypatch.setattr(run_events.RunEventTail, "start", lambda tail: started.append(tail) or start(tail))
+    bodies = []
+    streams = [threading.Thread(target=lambda: bodies.append(get_events(server)[1])) for _ in range(2)]
+    for stream in streams:
+        stream.start()
+    deadline = time.monotonic() + 5
+    while not (started and started[0].subscribers == 2) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    run["status"] = "completed"
+    for stream in streams:
+        stream.join(5)
+
+    assert len(started) == 1
+    assert len(bodies) == 2 and bodies[0] == bodies[1]
+    assert [name for name, _, _ in parse_events(bodies[0])][-1] == "done"
+    assert run_events._tails == {}
+
+
+def test_other_users_runs_are_not_found(server, finished_run, fake_supabase):
+    fake_supabase.table("test_reports").get("run-1")["test_requests"]["user_id"] = "user-2"
+    response, _ = get_events(server)
+    assert response.status_code == 404
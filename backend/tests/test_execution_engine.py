@@ -0,0 +1,134 @@
+import os
+import asyncio
+import types
+import pytest
+from utils import execution_engine
+from utils.execution_engine import ExecutionEngine, max_concurrent_test_types
+
+
+def test_configured_concurrency_wins(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_TEST_TYPES", "7")
+    monkeypatch.setattr(execution_engine, "available_memory_mb", lambda: 100)
+    assert max_concurrent_test_types() == 7
+
+
+@pytest.mark.parametrize("cpus, memory_mb, expected", [
+    (8, None, 5),
+    (2, None, 2),
+    (8, 1800, 3),
+    (8, 100, 1),
+    (None, None, 1),
+])
+def test_derived_concurrency_is_bounded_by_cpus_and_memory(monkeypatch, cpus, memory_mb, expected):
+    monkeypatch.delenv("MAX_CONCURRENT_TEST_TYPES", raising=False)
+    monkeypatch.setattr(execution_engine.os, "cpu_count", lambda: cpus)
+    monkeypatch.setattr(execution_engine, "available_memory_mb", lambda: memory_mb)
+    monkeypatch.setattr(execution_engine, "TEST_TYPE_MEMORY_MB", 600)
+    assert max_concurrent_test_types() == expected
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = ExecutionEngine(workers=1, max_tasks_per_worker=0).start(warm=False)
+    yield engine
+    engine.shutdown()
+
+
+def test_worker_process_is_reused_between_tasks(engine):
+    async def pings():
+        return [await engine.ping() for _ in range(3)]
+
+    pids = asyncio.run(pings())
+    assert len(set(pids)) == 1
+    assert pids[0] != os.getpid()
+
+
+def crash_first_call(marker):
+    # Runs in the worker: the first call kills it, the retry after the restart returns normally
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return os.getpid()
+
+
+def test_broken_pool_is_restarted_and_the_task_retried(engine, tmp_path):
+    before = asyncio.run(engine.ping())
+    after = asyncio.run(engine._submit(crash_first_call, str(tmp_path / "crashed")))
+    assert (tmp_path / "crashed").exists()
+    assert after != before
+    assert asyncio.run(engine.ping()) == after
+
+
+def test_browser_pool_metrics_add_up_across_workers(engine):
+    engine._browser_pool_metrics = {
+        1: {"hits": 3, "misses": 1, "launches": 1, "recycles": 0, "contexts": 4},
+        2: {"hits": 1, "misses": 1, "launches": 1, "recycles": 1, "contexts": 2},
+    }
+    total = engine.browser_pool_metrics()["total"]
+    assert total == {"hits": 4, "misses": 2, "launches": 2, "recycles": 1, "contexts": 6, "hit_rate": 0.667}
+
+
+# Test types of one run go through the engine concurrently, never more than the limit at once
+
+@pytest.fixture
+def server(fake_supabase, monkeypatch):
+    server = pytest.importorskip("server")
+    monkeypatch.setattr(server, "supabase", fake_supabase)
+    monkeypatch.setattr(server, "GENERATION_MODE", "per_type")
+    monkeypatch.setattr(server, "get_result_cache", lambda: None)
+
+    async def no_snapshot(url, test_run_id):
+        return None
+
+    monkeypatch.setattr(server, "capture_run_snapshot", no_snapshot)
+    return server
+
+
+def test_selected_types_run_concurrently_up_to_the_limit(server, fake_supabase, monkeypatch, tmp_path):
+    fake_supabase.table("test_reports").rows.append({"id": "run-1", "status": "pending"})
+    srs = tmp_path / "srs.pdf"
+    srs.write_bytes(b"")
+    monkeypatch.setattr(server, "max_concurrent_test_types", lambda: 2)
+    in_flight = types.SimpleNamespace(now=0, peak=0)
+
+    async def fake_run(test_type, *args):
+        in_flight.now += 1
+        in_flight.peak = max(in_flight.peak, in_flight.now)
+        await asyncio.sleep(0.05)
+        in_flight.now -= 1
+        return [{"id": f"{test_type}-1", "name": test_type, "status": "pass", "type": test_type}]
+
+    monkeypatch.setattr(server, "run_test_type_pooled", fake_run)
+    selected = ["functional", "uiux", "accessibility", "performance"]
+
+    results = asyncio.run(server.run_all_tests("https://example.com", "run-1", selected, str(srs)))
+
+    assert in_flight.peak == 2
+    assert sorted(r["type"] for r in results["all"]) == sorted(selected)
+    run = fake_supabase.table("test_reports").get("run-1")
+    assert run["status"] == "completed"
+    assert run["summary"]["timing"]["concurrency_limit"] == 2
+    assert run["summary"]["timing"]["overlap"] > 1
+
+
+def test_summary_comes_from_the_log_and_skips_results_of_a_type_that_crashed(server, fake_supabase, monkeypatch,
+                                                                            tmp_path):
+    fake_supabase.table("test_reports").rows.append({"id": "run-1", "status": "pending"})
+    srs = tmp_path / "srs.pdf"
+    srs.write_bytes(b"")
+
+    async def fake_run(test_type, url, test_run_id, srs_path, deadline, channel, *args):
+        result = {"id": f"{test_type}-1", "name": test_type, "status": "pass", "type": test_type}
+        channel.on_record({"type": "result", "test_type": test_type, "result": result})
+        if test_type == "uiux":
+            raise RuntimeError("engine worker died")
+        return [result]
+
+    monkeypatch.setattr(server, "run_test_type_pooled", fake_run)
+
+    results = asyncio.run(server.run_all_tests("https://example.com", "run-1", ["functional", "uiux"], str(srs)))
+
+    assert sorted(r["status"] for r in results["all"]) == ["error", "pass"]
+    summary = fake_supabase.table("test_reports").get("run-1")["summary"]
+    assert summary["source"] == "execution_log"
+    assert (summary["total"], summary["passed"], summary["errors"]) == (2, 1, 1)
@@ -0,0 +1,201 @@
+import time
+import pytest
+from utils import execution_log
+from utils.execution_log import ExecutionLogBuffer, summarize_results
+
+
+def test_summary_counts_each_status_and_success_rate():
+    results = [{"status": s} for s in ["pass", "pass", "pass", "fail", "warning", "error", "skipped", "invalid"]]
+
+    assert summarize_results(results) == {
+        "total": 8, "passed": 3, "failed": 1, "warnings": 1, "errors": 1, "skipped": 1, "invalid": 1,
+        "success_rate": 37.5
+    }
+
+
+def test_summary_of_no_results():
+    assert summarize_results([])["success_rate"] == 0
+    assert summarize_results([])["total"] == 0
+
+
+def logs(fake_supabase):
+    return fake_supabase.table("test_execution_logs")
+
+
+def test_buffer_writes_results_and_stages_in_order_on_close(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase, flush_records=100, flush_ms=10000).start()
+    buffer.add_stage("functional", "generated", count=2)
+    buffer.add_result("functional", {"id": "t1", "name": "Login", "status": "pass"})
+    buffer.add_result("functional", {"id": "t2", "status": "fail"})
+    buffer.close()
+
+    rows = logs(fake_supabase).rows
+    assert [row["seq"] for row in rows] == [1, 2, 3]
+    assert [row["event_type"] for row in rows] == ["stage", "result", "result"]
+    assert rows[0]["details"] == {"count": 2}
+    assert rows[1]["message"] == "Login"
+    assert rows[2]["log_level"] == "warning"
+    assert buffer.stats["rows"] == 3
+
+
+def test_buffer_flushes_in_batches_without_waiting_for_close(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase, flush_records=2, flush_ms=10000).start()
+    for n in range(4):
+        buffer.add_result("functional", {"id": f"t{n}", "status": "pass"})
+    deadline = time.monotonic() + 2
+    while len(logs(fake_supabase).rows) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(logs(fake_supabase).rows) == 4
+    assert buffer.stats["rows"] == 4
+    buffer.close()
+
+
+def test_restarted_run_replaces_its_rows_and_keeps_numbering(fake_supabase):
+    logs(fake_supabase).rows.extend([
+        {"report_id": "run-1", "seq": 1, "event_type": "result", "status": "pass"},
+        {"report_id": "run-1", "seq": 2, "event_type": "status"},
+        {"report_id": "run-2", "seq": 9, "event_type": "result", "status": "pass"},
+    ])
+    buffer = ExecutionLogBuffer("run-1", fake_supabase).start()
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    buffer.close()
+
+    rows = [row for row in logs(fake_supabase).rows if row["report_id"] == "run-1"]
+    assert [(row["event_type"], row["seq"]) for row in rows] == [("status", 2), ("result", 3)]
+
+
+class FlakyInserts:
+    """Fails the first `failures` inserts into test_execution_logs."""
+
+    def __init__(self, supabase, failures):
+        self.supabase = supabase
+        self.failures = failures
+
+    def rpc(self, name, params):
+        return self.supabase.rpc(name, params)
+
+    def table(self, name):
+        table = self.supabase.table(name)
+        flaky = self
+
+        class Table:
+            def __getattr__(self, attr):
+                return getattr(table, attr)
+
+            def insert(self, rows):
+                if flaky.failures:
+                    flaky.failures -= 1
+                    raise ConnectionError("supabase unreachable")
+                return table.insert(rows)
+
+        return Table()
+
+
+def test_failed_batch_is_retried_in_order(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", FlakyInserts(fake_supabase, 1), flush_records=100, flush_ms=10000)
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    assert buffer.flush() is False
+    buffer.add_result("functional", {"id": "t2", "status": "pass"})
+    assert buffer.flush() is True
+
+    assert [row["details"]["id"] for row in logs(fake_supabase).rows] == ["t1", "t2"]
+    assert buffer.stats["failed_batches"] == 1
+
+
+def test_pending_rows_are_capped_while_writes_fail(fake_supabase, monkeypatch):
+    monkeypatch.setattr(execution_log, "EXECUTION_LOG_MAX_PENDING", 3)
+    buffer = ExecutionLogBuffer("run-1", FlakyInserts(fake_supabase, 1))
+    for n in range(5):
+        buffer.add_result("functional", {"id": f"t{n}", "status": "pass"})
+    buffer.flush()
+    buffer.flush()
+
+    assert [row["details"]["id"] for row in logs(fake_supabase).rows] == ["t2", "t3", "t4"]
+    assert buffer.stats["dropped"] == 2
+
+
+def test_channel_records_are_persisted_by_kind(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase)
+    buffer.add_record({"type": "stage", "test_type": "uiux", "stage": "validated", "pruned": 1, "ts": 1.0})
+    buffer.add_record({"type": "result", "test_type": "uiux", "result": {"id": "t1", "status": "error"}})
+    buffer.add_record({"type": "done", "test_type": "uiux"})
+    buffer.flush()
+
+    rows = logs(fake_supabase).rows
+    assert [row["event_type"] for row in rows] == ["stage", "result"]
+    assert rows[0]["details"] == {"pruned": 1}
+    assert rows[1]["log_level"] == "error"
+
+
+@pytest.mark.parametrize("status,level", [("pass", "info"), ("fail", "warning"), ("error", "error")])
+def test_result_log_level(fake_supabase, status, level):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase)
+    buffer.add_result("functional", {"id": "t", "status": status})
+    buffer.flush()
+    assert logs(fake_supabase).rows[0]["log_level"] == level
+
+
+# The run summary is counted from the persisted rows of the current attempt
+
+def test_summary_counts_only_this_attempts_rows(fake_supabase):
+    # A crashed attempt whose rows the reset could not remove
+    logs(fake_supabase).rows.append({"report_id": "run-1", "attempt": "crashed", "test_type": "functional",
+                                     "seq": 1, "event_type": "result", "status": "fail"})
+    buffer = ExecutionLogBuffer("run-1", FlakyDeletes(fake_supabase)).start()
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    buffer.close()
+
+    assert len(logs(fake_supabase).rows) == 2
+    assert buffer.summary() == {"total": 1, "passed": 1, "failed": 0, "warnings": 0, "errors": 0, "skipped": 0,
+                                "invalid": 0, "success_rate": 100.0}
+
+
+def test_summary_counts_a_retried_batch_once(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase)
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    buffer.flush()
+    # The first write landed although the client saw it fail
+    logs(fake_supabase).rows.append(dict(logs(fake_supabase).rows[0]))
+
+    assert buffer.summary()["total"] == 1
+
+
+def test_superseded_results_are_not_counted(fake_supabase):
+    buffer = ExecutionLogBuffer("run-1", fake_supabase)
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    buffer.add_result("uiux", {"id": "u1", "status": "pass"})
+    buffer.supersede("functional", "exception")
+    buffer.add_result("functional", {"id": "functional-exception", "status": "error"})
+    buffer.close()
+
+    summary = buffer.summary()
+    assert (summary["total"], summary["passed"], summary["errors"]) == (2, 1, 1)
+
+
+def test_no_summary_from_incomplete_rows(fake_supabase, monkeypatch):
+    monkeypatch.setattr(execution_log, "EXECUTION_LOG_MAX_PENDING", 1)
+    buffer = ExecutionLogBuffer("run-1", FlakyInserts(fake_supabase, 1))
+    buffer.add_result("functional", {"id": "t1", "status": "pass"})
+    buffer.add_result("functional", {"id": "t2", "status": "pass"})
+    buffer.flush()
+    buffer.close()
+
+    assert buffer.stats["dropped"] == 1
+    assert buffer.summary() is None
+
+
+class FlakyDeletes(FlakyInserts):
+    """Every delete from test_execution_logs fails."""
+
+    def __init__(self, supabase):
+        super().__init__(supabase, 0)
+
+    def table(self, name):
+        table = super().table(name)
+
+        def delete():
+            raise ConnectionError("supabase unreachable")
+
+        table.delete = delete
+        return table
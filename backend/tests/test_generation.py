@@ -0,0 +1,266 @@
+import json
+import asyncio
+import pytest
+from utils import gemini_client, artifacts
+from utils.artifacts import read_json, TESTCASE_PLANS_FILE
+
+TESTCASES = [{"id": "t1", "action": "assert", "selector": "body", "expected": "x"}]
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Replaces the Gemini round trip; `gemini.reply(prompt)` returns the response text, prompts are recorded."""
+    class FakeGemini:
+        prompts = []
+
+        def reply(self, prompt, max_output_tokens):
+            keys = prompt.split("test types: ", 1)[1].split(", based", 1)[0]
+            return json.dumps({k.strip('"'): TESTCASES for k in keys.split(", ")})
+
+    fake = FakeGemini()
+
+    async def call_gemini_async(prompt, max_output_tokens=gemini_client.MAX_OUTPUT_TOKENS, json_output=False):
+        fake.prompts.append((prompt, max_output_tokens, json_output))
+        text = fake.reply(prompt, max_output_tokens)
+        return text, {"requests": 1, "prompt_chars": len(prompt), "prompt_tokens": 10, "output_tokens": 20,
+                      "latency_ms": 5, "retries": 0, "cached": False}
+
+    monkeypatch.setattr(gemini_client, "call_gemini_async", call_gemini_async)
+    monkeypatch.setattr(gemini_client, "GENERATION_BATCH_SIZE", 3)
+    return fake
+
+
+# One request generates the plans of several test types
+
+def test_batch_prompt_asks_for_one_object_keyed_by_type():
+    prompt = gemini_client.build_batch_prompt(["uiux", "functional"], "SRS TEXT")
+    assert 'exactly the keys "uiux", "functional"' in prompt
+    assert prompt.rstrip().endswith("SRS TEXT")
+
+
+def test_types_are_generated_in_chunks_of_the_batch_size(gemini):
+    types = ["functional", "uiux", "accessibility", "compatibility", "performance"]
+    plans, stats = asyncio.run(gemini_client.generate_testcases_batch(types, "The app shall load."))
+
+    assert plans == {t: TESTCASES for t in types}
+    assert len(gemini.prompts) == 2
+    # Output budget and JSON mode follow the chunk size
+    assert [(tokens, json_output) for _, tokens, json_output in gemini.prompts] == \
+        [(3 * gemini_client.MAX_OUTPUT_TOKENS, True), (2 * gemini_client.MAX_OUTPUT_TOKENS, True)]
+    assert (stats["requests"], stats["prompt_tokens"], stats["output_tokens"]) == (2, 20, 40)
+    assert stats["types"] == sorted(types) and stats["missing"] == []
+
+
+def test_types_a_batch_misses_are_reported_for_per_type_generation(gemini, monkeypatch):
+    def reply(prompt, max_output_tokens):
+        if '"uiux"' in prompt:
+            raise RuntimeError("quota exceeded")
+        return json.dumps({"functional": TESTCASES, "accessibility": "not a list"})
+
+    monkeypatch.setattr(gemini, "reply", reply)
+    monkeypatch.setattr(gemini_client, "GENERATION_BATCH_SIZE", 2)
+
+    plans, stats = asyncio.run(gemini_client.generate_testcases_batch(
+        ["functional", "accessibility", "uiux"], "The app shall load."))
+
+    assert plans == {"functional": TESTCASES}
+    assert stats["missing"] == ["accessibility", "uiux"]
+    assert stats["errors"] == ["quota exceeded"]
+
+
+def test_response_that_is_not_an_object_fails_the_chunk(gemini, monkeypatch):
+    monkeypatch.setattr(gemini, "reply", lambda prompt, tokens: json.dumps(TESTCASES))
+    plans, stats = asyncio.run(gemini_client.generate_testcases_batch(["uiux", "functional"], "SRS"))
+    assert plans == {}
+    assert "Expected a JSON object" in stats["errors"][0]
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = pytest.importorskip("server")
+    monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(server, "extract_text_from_pdf", lambda path: "The app shall load.")
+    return server
+
+
+def test_run_plans_are_stored_as_an_artifact_each_type_reads(gemini, server):
+    import test_runner
+
+    path, stats = asyncio.run(server.generate_run_plans("run-1", "srs.pdf", ["uiux", "functional"]))
+
+    assert path == artifacts.run_artifact_path("run-1", TESTCASE_PLANS_FILE)
+    assert read_json(path) == {"uiux": TESTCASES, "functional": TESTCASES}
+    assert test_runner.load_run_plan(path, "uiux") == TESTCASES
+    assert test_runner.load_run_plan(path, "performance") is None
+
+
+def test_failed_batch_leaves_every_type_to_generate_its_own_plan(gemini, server, monkeypatch):
+    monkeypatch.setattr(gemini, "reply", lambda prompt, tokens: "not json")
+
+    path, stats = asyncio.run(server.generate_run_plans("run-1", "srs.pdf", ["uiux", "functional"]))
+
+    assert path is None
+    assert stats["missing"] == ["uiux", "functional"]
+
+
+def test_generation_totals_cover_the_batch_and_per_type_requests(server):
+    summary = server.generation_summary({
+        "mode": "batch",
+        "batch": {"requests": 1, "cached_requests": 1, "prompt_chars": 100, "prompt_tokens": 30,
+                  "output_tokens": 60, "latency_ms": 900, "context_chars": 80},
+        "types": {"uiux": {"mode": "batch"},
+                  "performance": {"mode": "per_type", "requests": 1, "prompt_chars": 50, "prompt_tokens": 10,
+                                  "output_tokens": 20, "latency_ms": 400, "cached": True,
+                                  "srs": {"context_chars": 40}}},
+        "time_to_first_test_ms": {},
+    })
+    totals = summary["totals"]
+    assert (totals["requests"], totals["prompt_tokens"], totals["latency_ms"]) == (2, 40, 1300)
+    assert totals["cached_requests"] == 2
+    assert totals["srs_context_chars"] == 120
+
+
+# Streamed generation runs each testcase as soon as the response contains all of it
+
+STREAMED = [
+    {"id": "t1", "action": "assert", "selector": "body", "expected": "Welcome"},
+    {"id": "t2", "action": "click", "selector": "a[title=\"{x}\"]", "description": "Quote \" and ] and }"},
+    {"id": "t3", "action": "assert", "selector": "#menu", "expected": "Menu", "tags": [{"nested": [1, 2]}]},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 10000])
+def test_array_stream_yields_each_object_once_it_is_complete(chunk_size):
+    text = "```json\n" + json.dumps(STREAMED, indent=2) + "\n```"
+    parser = gemini_client.JsonArrayStream()
+    items = []
+    for k in range(0, len(text), chunk_size):
+        items += parser.feed(text[k:k + chunk_size])
+    assert items == STREAMED
+
+
+def test_array_stream_holds_back_an_unfinished_object():
+    parser = gemini_client.JsonArrayStream()
+    assert parser.feed('[{"id": "t1"}, {"id": "t') == [{"id": "t1"}]
+    assert parser.feed('2"}]') == [{"id": "t2"}]
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Replaces the streamed Gemini round trip with `stream.fragments`, sent one by one."""
+    class FakeStream:
+        fragments = [json.dumps(STREAMED)[:40], json.dumps(STREAMED)[40:]]
+        requests = 0
+
+    fake = FakeStream()
+
+    async def stream_gemini(prompt, config, on_text):
+        fake.requests += 1
+        for fragment in fake.fragments:
+            on_text(fragment)
+            await asyncio.sleep(0)
+        if not fake.fragments:
+            raise RuntimeError("Gemini stream ended without any text")
+        return "".join(fake.fragments), {"requests": 1, "latency_ms": 10, "retries": 0}
+
+    monkeypatch.setattr(gemini_client, "_stream_gemini", stream_gemini)
+    return fake
+
+
+@pytest.fixture
+def fresh_llm_cache(monkeypatch, tmp_path):
+    from utils import llm_cache
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm.db"))
+    monkeypatch.setattr(llm_cache, "_cache", None)
+
+
+def generate_stream(delivered):
+    return asyncio.run(gemini_client.generate_testcases_stream("functional", "The app shall load.",
+                                                              delivered.append))
+
+
+def test_streamed_testcases_are_delivered_once_as_they_complete(stream, fresh_llm_cache):
+    delivered = []
+    testcases, stats = generate_stream(delivered)
+
+    assert delivered == STREAMED
+    assert testcases == STREAMED
+    assert stats["streamed"] is True and stats["first_testcase_ms"] is not None
+
+
+def test_cached_stream_delivers_every_testcase_at_once(stream, fresh_llm_cache):
+    generate_stream([])
+    delivered = []
+    testcases, stats = generate_stream(delivered)
+
+    assert stream.requests == 1
+    assert stats["cached"] is True
+    assert delivered == testcases == STREAMED
+
+
+def test_stream_that_breaks_keeps_the_testcases_already_delivered(stream, fresh_llm_cache, monkeypatch):
+    async def broken(prompt, config, on_text):
+        text = json.dumps(STREAMED)
+        # The first testcase and part of the second arrive before the connection drops
+        on_text(text[:text.index('"t2"') + 10])
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(gemini_client, "_stream_gemini", broken)
+    delivered = []
+    testcases, stats = generate_stream(delivered)
+
+    assert testcases == delivered == STREAMED[:1]
+    assert stats["error"] == "connection reset"
+
+
+def test_stream_without_testcases_reports_a_generation_error(stream, fresh_llm_cache):
+    stream.fragments = []
+    testcases, stats = generate_stream([])
+    assert testcases[0]["status"] == "error"
+    assert "without any text" in testcases[0]["details"]
+
+
+def test_runner_yields_streamed_testcases_and_then_the_outcome(monkeypatch):
+    import test_runner
+
+    async def generate(test_type, srs_content, on_testcase):
+        for tc in STREAMED:
+            on_testcase(tc)
+            await asyncio.sleep(0)
+        return STREAMED, {"mode": "per_type"}
+
+    monkeypatch.setattr(test_runner, "generate_testcases_stream", generate)
+    outcome = {}
+
+    async def consume():
+        return [tc async for tc in test_runner.stream_testcases("functional", "SRS", test_runner.ActionClock(),
+                                                                outcome)]
+
+    assert asyncio.run(consume()) == STREAMED
+    assert outcome == {"testcases": STREAMED, "generation": {"mode": "per_type"}}
+
+
+def test_runner_stops_waiting_and_cancels_generation_when_the_budget_runs_out(monkeypatch):
+    import test_runner
+    cancelled = []
+
+    async def generate(test_type, srs_content, on_testcase):
+        on_testcase(STREAMED[0])
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(test_runner, "generate_testcases_stream", generate)
+    outcome = {}
+
+    async def consume():
+        clock = test_runner.ActionClock(budget_seconds=0.2)
+        items = [tc async for tc in test_runner.stream_testcases("functional", "SRS", clock, outcome)]
+        await asyncio.sleep(0)
+        return items
+
+    assert asyncio.run(consume()) == STREAMED[:1]
+    assert outcome == {"timed_out": True}
+    assert cancelled == [True]
@@ -0,0 +1,237 @@
+import sqlite3
+import threading
+import pytest
+from datetime import datetime, timedelta, timezone
+from utils.job_queue import SQLiteJobQueue
+
+
+class FakeReports:
+    """test_reports rows the queue writes through to."""
+
+    def __init__(self, supabase):
+        self.client = supabase
+        self.table = supabase.table("test_reports")
+
+    def add(self, job_id, status="pending"):
+        self.table.rows.append({"id": job_id, "status": status})
+
+    def row(self, job_id):
+        return self.table.get(job_id)
+
+    def status(self, job_id):
+        return self.row(job_id)["status"]
+
+
+@pytest.fixture
+def reports(fake_supabase):
+    return FakeReports(fake_supabase)
+
+
+@pytest.fixture
+def queue(tmp_path, reports):
+    return SQLiteJobQueue(reports.client, str(tmp_path / "queue.db"))
+
+
+def enqueue(queue, reports, job_id, user_id="user-1"):
+    reports.add(job_id)
+    return queue.enqueue(job_id, {"user_id": user_id})
+
+
+def test_claim_takes_oldest_pending_job_and_marks_report_running(queue, reports):
+    enqueue(queue, reports, "a")
+    enqueue(queue, reports, "b")
+
+    job = queue.claim("worker-1", lease_seconds=60)
+
+    assert job["id"] == "a"
+    assert job["lease_owner"] == "worker-1"
+    assert job["attempts"] == 1
+    assert job["job_payload"] == {"user_id": "user-1"}
+    assert reports.status("a") == "running"
+    assert reports.status("b") == "pending"
+
+
+def test_claim_returns_none_when_queue_is_empty(queue):
+    assert queue.claim("worker-1", lease_seconds=60) is None
+
+
+def test_claim_respects_global_and_per_user_limits(queue, reports):
+    enqueue(queue, reports, "a", user_id="alice")
+    enqueue(queue, reports, "b", user_id="alice")
+    enqueue(queue, reports, "c", user_id="bob")
+
+    assert queue.claim("w", 60, user_running_limit=1)["id"] == "a"
+    # alice is at her limit, so bob's later job goes first
+    assert queue.claim("w", 60, user_running_limit=1)["id"] == "c"
+    assert queue.claim("w", 60, user_running_limit=1) is None
+    assert queue.claim("w", 60, global_running_limit=2) is None
+
+
+def test_concurrent_claims_never_hand_out_a_job_twice(queue, reports):
+    for n in range(20):
+        enqueue(queue, reports, f"job-{n}")
+    claimed, lock = [], threading.Lock()
+
+    def worker(name):
+        while True:
+            job = queue.claim(name, 60)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker, args=(f"w{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(f"job-{n}" for n in range(20))
+
+
+def test_heartbeat_extends_only_the_owners_lease(queue, reports):
+    enqueue(queue, reports, "a")
+    job = queue.claim("worker-1", lease_seconds=1)
+
+    assert queue.heartbeat("a", "worker-2", 60) is False
+    assert queue.heartbeat("a", "worker-1", 60) is True
+    renewed = queue.get("a")
+    assert renewed["lease_expires_at"] > job["lease_expires_at"]
+
+
+def expire_lease(queue, job_id):
+    past = (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat()
+    conn = sqlite3.connect(queue.path)
+    conn.execute("UPDATE test_jobs SET lease_expires_at = ? WHERE id = ?", (past, job_id))
+    conn.commit()
+    conn.close()
+
+
+def test_requeue_expired_returns_stale_job_to_pending_and_it_can_be_reclaimed(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+    expire_lease(queue, "a")
+
+    assert queue.requeue_expired(max_attempts=3) == 1
+    assert reports.status("a") == "pending"
+    assert queue.heartbeat("a", "worker-1", 60) is False
+
+    job = queue.claim("worker-2", 60)
+    assert job["id"] == "a"
+    assert job["attempts"] == 2
+
+
+def test_requeue_expired_fails_job_after_max_attempts(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+    expire_lease(queue, "a")
+
+    assert queue.requeue_expired(max_attempts=1) == 1
+    assert reports.status("a") == "failed"
+    assert reports.row("a")["error_message"]
+    assert queue.claim("worker-2", 60) is None
+
+
+def test_requeue_expired_leaves_live_leases_alone(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+
+    assert queue.requeue_expired(max_attempts=3) == 0
+    assert reports.status("a") == "running"
+
+
+def test_cancel_pending_job_updates_report_and_is_never_claimed(queue, reports):
+    enqueue(queue, reports, "a")
+
+    assert queue.cancel("a") is True
+    assert reports.status("a") == "cancelled"
+    assert queue.status("a") == "cancelled"
+    assert queue.claim("worker-1", 60) is None
+
+
+def test_cancel_running_job_is_visible_through_status(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+
+    assert queue.cancel("a") is True
+    # worker.py's cancel watcher polls status()
+    assert queue.status("a") == "cancelled"
+
+
+def test_cancel_finished_job_is_a_no_op(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+    reports.row("a")["status"] = "completed"
+    queue.release("a", "worker-1")
+
+    assert queue.cancel("a") is False
+    assert reports.status("a") == "completed"
+
+
+def test_release_clears_lease_and_keeps_status_the_run_recorded(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+    reports.row("a")["status"] = "failed"
+
+    queue.release("a", "worker-1")
+
+    job = queue.get("a")
+    assert job["lease_owner"] is None
+    assert job["lease_expires_at"] is None
+    assert job["status"] == "failed"
+    assert reports.status("a") == "failed"
+
+
+def test_release_by_another_worker_keeps_the_lease(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+
+    queue.release("a", "worker-2")
+
+    assert queue.get("a")["lease_owner"] == "worker-1"
+
+
+
+def test_lease_owner_is_written_through_to_the_report(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.claim("worker-1", 60)
+    assert reports.row("a")["lease_owner"] == "worker-1"
+
+    expire_lease(queue, "a")
+    queue.requeue_expired(max_attempts=3)
+    assert reports.row("a")["lease_owner"] is None
+
+    queue.claim("worker-2", 60)
+    queue.release("a", "worker-2")
+    assert reports.row("a")["lease_owner"] is None
+
+
+def test_record_usage_is_written_to_the_report(queue, reports):
+    enqueue(queue, reports, "a")
+    queue.record_usage("a", {"peak_rss_mb": 512})
+
+    assert reports.row("a")["resource_usage"] == {"peak_rss_mb": 512}
+    assert queue.recent_usage() == [{"peak_rss_mb": 512}]
+
+
+def test_worker_status_keeps_the_latest_report_of_each_live_worker(queue, monkeypatch):
+    queue.report_worker("worker-1", {"node": "n1", "active_jobs": 0, "browser_pool": None})
+    queue.report_worker("worker-1", {"node": "n1", "active_jobs": 2, "browser_pool": {"total": {}}})
+    queue.report_worker("worker-2", {"node": "n2", "active_jobs": 1, "browser_pool": None})
+    statuses = queue.worker_statuses(60)
+
+    assert [(s["worker_id"], s["active_jobs"]) for s in statuses] == [("worker-1", 2), ("worker-2", 1)]
+    assert statuses[0]["browser_pool"] == {"total": {}}
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=120)
+    monkeypatch.setattr(SQLiteJobQueue, "_now", staticmethod(lambda: later))
+    assert queue.worker_statuses(60) == []
+
+
+def test_supabase_queue_upserts_one_status_row_per_worker(fake_supabase):
+    from utils.job_queue import SupabaseJobQueue
+    queue = SupabaseJobQueue(fake_supabase)
+    queue.report_worker("worker-1", {"node": "n1", "active_jobs": 0})
+    queue.report_worker("worker-1", {"node": "n1", "active_jobs": 1})
+
+    assert [s["active_jobs"] for s in queue.worker_statuses(60)] == [1]
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import pytest
+from utils import llm_cache
+from utils.llm_cache import cached_completion, cached_completion_async, llm_cache_key, llm_cache_metrics
+
+CONFIG = {"temperature": 0.4, "maxOutputTokens": 2048}
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm.db"))
+    monkeypatch.setattr(llm_cache, "_cache", None)
+    return llm_cache.get_llm_cache()
+
+
+class Provider:
+    """complete() for cached_completion, counting the requests that reach the provider."""
+
+    def __init__(self, text='[{"id": "t1"}]'):
+        self.text = text
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.text, {"requests": 1, "prompt_tokens": 100, "output_tokens": 40, "latency_ms": 1200,
+                           "retries": 1}
+
+
+def complete(provider, prompt="Generate uiux testcases", config=CONFIG, model="gemini", accept=None):
+    return cached_completion("gemini", model, prompt, config, provider, accept=accept)
+
+
+def test_second_identical_prompt_is_served_from_the_cache():
+    provider = Provider()
+    text, stats = complete(provider)
+    assert stats["cached"] is False
+
+    cached_text, cached_stats = complete(provider)
+
+    assert provider.calls == 1
+    assert cached_text == text
+    assert cached_stats["cached"] is True
+    assert (cached_stats["requests"], cached_stats["retries"], cached_stats["latency_ms"]) == (0, 0, 0)
+    assert (cached_stats["prompt_tokens"], cached_stats["prompt_tokens_saved"]) == (0, 100)
+    assert cached_stats["latency_saved_ms"] == 1200
+
+
+def test_whitespace_does_not_change_the_key():
+    assert llm_cache_key("gemini", "m", "Generate\n  uiux   testcases\n", CONFIG) == \
+        llm_cache_key("gemini", "m", "Generate uiux testcases", CONFIG)
+
+
+@pytest.mark.parametrize("change", [
+    {"prompt": "Generate functional testcases"},
+    {"model": "other-model"},
+    {"config": {**CONFIG, "temperature": 0.9}},
+])
+def test_prompt_model_and_config_all_key_the_entry(change):
+    provider = Provider()
+    complete(provider)
+    complete(provider, **change)
+    assert provider.calls == 2
+
+
+def test_rejected_responses_are_not_replayed():
+    provider = Provider(text="Sorry, I cannot help")
+    for _ in range(2):
+        complete(provider, accept=lambda text: text.startswith("["))
+    assert provider.calls == 2
+
+
+def test_disabled_cache_always_asks_the_provider(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    provider = Provider()
+    complete(provider)
+    _, stats = complete(provider)
+    assert provider.calls == 2 and stats["cached"] is False
+    assert llm_cache_metrics() == {"enabled": False}
+
+
+def test_async_and_blocking_callers_share_entries():
+    provider = Provider()
+
+    async def complete_async():
+        return provider()
+
+    _, stats = asyncio.run(cached_completion_async("gemini", "gemini", "Generate uiux testcases", CONFIG,
+                                                   complete_async))
+    assert stats["cached"] is False
+    _, stats = complete(provider)
+    assert stats["cached"] is True
+    assert provider.calls == 1
+
+
+def test_async_callers_read_and_write_the_cache_off_the_event_loop(cache, monkeypatch):
+    threads = []
+    for name in ("get", "set"):
+        method = getattr(cache, name)
+        monkeypatch.setattr(cache, name, lambda *args, _method=method, _name=name:
+                            threads.append((_name, threading.get_ident())) or _method(*args))
+
+    async def complete_twice():
+        async def complete_async():
+            return Provider()()
+
+        for _ in range(2):
+            await cached_completion_async("gemini", "gemini", "Generate uiux testcases", CONFIG, complete_async)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(complete_twice())
+
+    assert [name for name, _ in threads] == ["get", "set", "get"]
+    assert loop_thread not in {thread for _, thread in threads}
+
+
+def test_metrics_count_hits_misses_and_savings():
+    provider = Provider()
+    prompt = "Generate uiux testcases"
+    complete(provider, prompt)
+    complete(provider, prompt)
+    complete(provider, prompt)
+
+    metrics = llm_cache_metrics()
+    assert (metrics["hits"], metrics["misses"], metrics["entries"]) == (2, 1, 1)
+    assert metrics["hit_rate"] == 0.667
+    assert metrics["latency_saved_ms"] == 2400
+    assert metrics["bytes_saved"] == 2 * (len(prompt) + len(provider.text))
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import threading
+import subprocess
+import pytest
+from utils import llm_http, gemini_client
+from utils.llm_http import LLMHTTPClient, CircuitBreaker, CircuitOpenError, LLMHTTPError
+
+STUB_SERVER = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts", "gemini_stub_server.py"))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def stub():
+    """start(*args) runs scripts/gemini_stub_server.py with `args` and returns its base URL."""
+    processes = []
+
+    def start(*args):
+        port = free_port()
+        process = subprocess.Popen([sys.executable, STUB_SERVER, "--port", str(port), *args],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        processes.append(process)
+        # The stub prints once it is listening
+        process.stdout.readline()
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=5)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_http, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_http, "LLM_BACKOFF_MAX_SECONDS", 0.02)
+
+
+def body(prompt="Generate testcases"):
+    return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+
+def generate_url(base):
+    return f"{base}/v1beta/models/stub:generateContent?key=stub"
+
+
+def stream_url(base):
+    return f"{base}/v1beta/models/stub:streamGenerateContent?alt=sse&key=stub"
+
+
+async def uncached(provider, model, prompt, config, complete, accept=None):
+    text, stats = await complete()
+    stats["cached"] = False
+    return text, stats
+
+
+def test_503_is_retried_until_the_provider_recovers(stub):
+    base = stub("--fail-first", "2", "--fail-status", "503")
+    client = LLMHTTPClient(timeout_seconds=10)
+    data, stats = asyncio.run(client.post_json_async(generate_url(base), body()))
+    assert stats["status"] == 200
+    assert stats["retries"] == 2
+    assert json.loads(data["candidates"][0]["content"]["parts"][0]["text"])[0]["id"] == "stub_home_loads"
+    metrics = client.metrics_snapshot()
+    assert (metrics["calls"], metrics["retries"], metrics["failures"], metrics["breaker"]) == (1, 2, 0, "closed")
+
+
+def test_blocking_post_shares_the_retrying_client(stub):
+    base = stub("--fail-first", "1")
+    client = LLMHTTPClient(timeout_seconds=10)
+    _, stats = client.post_json(generate_url(base), body())
+    assert (stats["status"], stats["retries"]) == (200, 1)
+
+
+def test_breaker_opens_after_consecutive_failures_and_rejects_without_a_request(stub, monkeypatch):
+    monkeypatch.setattr(llm_http, "LLM_MAX_RETRIES", 0)
+    base = stub("--fail-first", "100", "--fail-status", "503")
+    client = LLMHTTPClient(timeout_seconds=10)
+    client.breaker = CircuitBreaker(failures=2, reset_seconds=60)
+
+    async def calls():
+        for _ in range(2):
+            with pytest.raises(LLMHTTPError):
+                await client.post_json_async(generate_url(base), body())
+        with pytest.raises(CircuitOpenError):
+            await client.post_json_async(generate_url(base), body())
+
+    asyncio.run(calls())
+    metrics = client.metrics_snapshot()
+    assert (metrics["breaker"], metrics["breaker_opens"], metrics["rejected"]) == ("open", 1, 1)
+    assert metrics["calls"] == 2
+
+
+def test_rejected_request_does_not_count_against_the_breaker(stub):
+    base = stub("--fail-first", "100", "--fail-status", "400")
+    client = LLMHTTPClient(timeout_seconds=10)
+    client.breaker = CircuitBreaker(failures=1, reset_seconds=60)
+    with pytest.raises(LLMHTTPError):
+        asyncio.run(client.post_json_async(generate_url(base), body()))
+    assert client.breaker.state == "closed"
+
+
+def test_cancelled_request_releases_the_half_open_trial(stub):
+    base = stub("--delay", "5")
+    client = LLMHTTPClient(timeout_seconds=10)
+    client.breaker = CircuitBreaker(failures=1, reset_seconds=0)
+    client.breaker.record_failure()
+    assert client.breaker.state == "half_open"
+
+    async def abandon():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.post_json_async(generate_url(base), body()), timeout=0.2)
+
+    asyncio.run(abandon())
+    # The cancel reaches the request on the client's own loop thread
+    deadline = time.monotonic() + 5
+    while client.breaker.trial_running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.breaker.consecutive_failures == 1
+    assert client.breaker.trial_running is False
+    assert client.breaker.allow()
+
+
+def test_streamed_lines_arrive_once_in_order_on_the_callers_loop(stub):
+    # The first attempt fails before any line is sent, so the retry must not repeat lines
+    base = stub("--fail-first", "1", "--chunk-delay", "0")
+    client = LLMHTTPClient(timeout_seconds=10)
+    lines, threads = [], set()
+
+    def on_line(line):
+        threads.add(threading.get_ident())
+        lines.append(line)
+
+    async def stream():
+        _, stats = await client.post_lines_async(stream_url(base), body(), on_line)
+        return stats, threading.get_ident()
+
+    stats, caller = asyncio.run(stream())
+    assert stats["retries"] == 1
+    assert threads == {caller}
+    data = [json.loads(line[5:]) for line in lines if line.startswith("data:")]
+    text = "".join(part["text"] for chunk in data for part in chunk["candidates"][0]["content"]["parts"])
+    assert [tc["id"] for tc in json.loads(text)] == ["stub_home_loads", "stub_has_link", "stub_open_link"]
+
+
+def test_error_in_on_line_stops_the_stream_and_reaches_the_caller(stub):
+    base = stub("--chunk-delay", "0.05")
+    client = LLMHTTPClient(timeout_seconds=10)
+    lines = []
+
+    def on_line(line):
+        lines.append(line)
+        if line.startswith("data:"):
+            raise ValueError("unparseable chunk")
+
+    async def stream():
+        with pytest.raises(ValueError, match="unparseable chunk"):
+            await client.post_lines_async(stream_url(base), body(), on_line)
+
+    asyncio.run(stream())
+    assert len([line for line in lines if line.startswith("data:")]) == 1
+    # The request was cancelled, which does not count against the provider
+    deadline = time.monotonic() + 5
+    while client.metrics["calls"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.metrics["failures"] == 1
+    assert client.breaker.consecutive_failures == 0
+
+
+def test_streamed_generation_delivers_each_testcase_once(stub, monkeypatch):
+    base = stub("--fail-first", "1", "--chunk-delay", "0")
+    client = LLMHTTPClient(timeout_seconds=10)
+    monkeypatch.setattr(gemini_client, "get_llm_http_client", lambda timeout_seconds: client)
+    monkeypatch.setattr(gemini_client, "STREAM_API_URL", f"{base}/v1beta/models/stub:streamGenerateContent")
+    monkeypatch.setattr(gemini_client, "cached_completion_async", uncached)
+    delivered = []
+
+    testcases, stats = asyncio.run(gemini_client.generate_testcases_stream("functional", "The app shall load.",
+                                                                           delivered.append))
+    assert [tc["id"] for tc in delivered] == ["stub_home_loads", "stub_has_link", "stub_open_link"]
+    assert testcases == delivered
+    assert (stats["retries"], stats["streamed"]) == (1, True)
+    assert stats["first_testcase_ms"] is not None
+
+
+def test_batch_generation_awaits_every_chunk(stub, monkeypatch):
+    base = stub()
+    client = LLMHTTPClient(timeout_seconds=10)
+    monkeypatch.setattr(gemini_client, "get_llm_http_client", lambda timeout_seconds: client)
+    monkeypatch.setattr(gemini_client, "API_URL", f"{base}/v1beta/models/stub:generateContent")
+    monkeypatch.setattr(gemini_client, "cached_completion_async", uncached)
+    monkeypatch.setattr(gemini_client, "GENERATION_BATCH_SIZE", 2)
+
+    plans, stats = asyncio.run(gemini_client.generate_testcases_batch(["functional", "uiux", "performance"],
+                                                                      "The app shall load."))
+    assert sorted(plans) == ["functional", "performance", "uiux"]
+    assert (stats["requests"], stats["missing"], stats["errors"]) == (2, [], [])
+    assert client.metrics_snapshot()["calls"] == 2
+
@@ -0,0 +1,85 @@
+import pytest
+from utils.dom_index import DomIndex
+from utils.plan_validation import validate_plan, validate_testcase, selector_reason, selector_syntax_error
+
+
+def complete_index(html):
+    """An index that saw every element of the page, as the browser-built ones do."""
+    index = DomIndex.from_html(html)
+    index.complete = True
+    return index
+
+
+PAGE = complete_index('<form id="login" class="card wide"><input name="user"><input name="pass">'
+                      '<button class="btn primary md:w-1/2">Go</button></form><ul><li>One</li></ul>')
+
+
+@pytest.mark.parametrize("selector", [
+    "#login", ".card", "form.card.wide", "#login > input[name='user']", "ul li", "button:hover",
+    ".btn:not(.missing)", "#nope, #login", "input[type=text]", ".md\\:w-1\\/2", "*",
+    "text=Sign in", "//form", "css=#login", "#login >> text=Go",
+])
+def test_selectors_that_may_match_pass(selector):
+    assert selector_reason(selector, PAGE) is None
+
+
+@pytest.mark.parametrize("selector, reason", [
+    ("#signup", "no element with id 'signup'"),
+    (".card .missing", "no element with class 'missing'"),
+    ("input[name='email']", "no element named 'email'"),
+    ("table td", "no <table> element"),
+    ("#a, .b", "no element with id 'a'; no element with class 'b'"),
+])
+def test_selectors_that_cannot_match_say_why(selector, reason):
+    assert selector_reason(selector, PAGE) == reason
+
+
+@pytest.mark.parametrize("selector", ["#login[", "div(", "a[href='x]"])
+def test_unbalanced_selectors_are_syntax_errors(selector):
+    assert "not valid CSS" in selector_syntax_error(selector)
+
+
+@pytest.mark.parametrize("testcase, reason", [
+    ({"action": "hover", "selector": "#login"}, "Unsupported action 'hover'"),
+    ({"action": "click", "selector": "  "}, "A click step needs a selector"),
+    ({"action": "assert"}, "A assert step needs a selector"),
+    ({"action": "login", "selector": "#user"}, "A login step needs username and password selectors"),
+])
+def test_structurally_broken_testcases_are_invalid(testcase, reason):
+    assert validate_testcase(testcase, PAGE) == reason
+
+
+def test_goto_and_login_are_never_checked_against_the_dom():
+    assert validate_testcase({"action": "goto", "selector": "#anything"}, PAGE) is None
+    assert validate_testcase({"action": "login", "selector": "#u, #p"}, PAGE) is None
+
+
+def test_html_index_is_never_trusted_to_prove_absence():
+    incomplete = DomIndex.from_html("<div id='a'></div>")
+    assert validate_testcase({"action": "click", "selector": "#missing"}, incomplete) is None
+
+
+def test_dom_is_only_checked_until_the_page_changes():
+    plan = [
+        {"action": "click", "selector": "#missing"},
+        {"action": "click", "selector": "#login"},
+        {"action": "assert", "selector": "#appears-after-click"},
+        {"action": "assert", "selector": "#still-missing", "freshState": True},
+        {"action": "dance", "selector": "#login"},
+    ]
+    invalid = validate_plan(plan, PAGE)
+
+    assert sorted(invalid) == [0, 3, 4]
+    assert invalid[0][1] is True and invalid[3][1] is True
+    # Structural problems do not rest on the DOM index
+    assert invalid[4] == ("Unsupported action 'dance'", False)
+
+
+def test_invalid_testcase_does_not_count_as_changing_the_page():
+    plan = [{"action": "click", "selector": "#missing"}, {"action": "assert", "selector": "#gone"}]
+    assert sorted(validate_plan(plan, PAGE)) == [0, 1]
+
+
+def test_plan_that_starts_on_a_changed_page_skips_dom_checks():
+    plan = [{"action": "assert", "selector": "#missing"}]
+    assert validate_plan(plan, PAGE, mutated=True) == {}
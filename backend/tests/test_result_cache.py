@@ -0,0 +1,128 @@
+import os
+import time
+import pytest
+from utils import gemini_client, result_cache, llm_cache, srs_index, job_queue, artifacts
+from utils.disk_cache import DiskCache, cache_key
+from utils.result_cache import result_cache_key, cacheable, file_sha256
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.mark.parametrize("path", [
+    result_cache.RESULT_CACHE_PATH, llm_cache.LLM_CACHE_PATH, srs_index.SRS_INDEX_CACHE_PATH,
+    job_queue.JOB_QUEUE_SQLITE_PATH, artifacts.ARTIFACTS_DIR
+])
+def test_shared_files_are_anchored_to_the_backend_directory(path):
+    assert os.path.isabs(path)
+    assert path.startswith(os.path.join(BACKEND_DIR, "temp") + os.sep)
+
+
+def snapshot(**overrides):
+    return {"dom_hash": "dom-1", "model": "gemini", "prompt_version": gemini_client.prompt_fingerprint(),
+            **overrides}
+
+
+def test_key_is_stable_for_identical_inputs():
+    assert result_cache_key("srs", "https://a.test", snapshot(), "uiux") == \
+        result_cache_key("srs", "https://a.test", snapshot(), "uiux")
+
+
+@pytest.mark.parametrize("change", [
+    lambda args: {**args, "srs_hash": "other"},
+    lambda args: {**args, "url": "https://b.test"},
+    lambda args: {**args, "fingerprint": snapshot(dom_hash="dom-2")},
+    lambda args: {**args, "fingerprint": snapshot(model="other-model")},
+    lambda args: {**args, "test_type": "functional"},
+])
+def test_key_changes_with_any_input(change):
+    args = {"srs_hash": "srs", "url": "https://a.test", "fingerprint": snapshot(), "test_type": "uiux"}
+    assert result_cache_key(**args) != result_cache_key(**change(args))
+
+
+def test_prompt_fingerprint_is_the_same_for_batched_and_per_type_generation(monkeypatch):
+    monkeypatch.setattr(gemini_client, "GENERATION_MODE", "batch")
+    batched = result_cache_key("srs", "https://a.test", snapshot(), "uiux")
+    monkeypatch.setattr(gemini_client, "GENERATION_MODE", "per_type")
+    per_type = result_cache_key("srs", "https://a.test", snapshot(), "uiux")
+
+    assert batched == per_type
+
+
+@pytest.mark.parametrize("module,version", [(gemini_client, "PROMPT_VERSION"),
+                                            (gemini_client, "BATCH_PROMPT_VERSION"),
+                                            (srs_index, "SRS_INDEX_VERSION")])
+def test_prompt_fingerprint_changes_with_any_prompt_version(monkeypatch, module, version):
+    before = gemini_client.prompt_fingerprint()
+    monkeypatch.setattr(module, version, getattr(module, version) + "-next")
+    assert gemini_client.prompt_fingerprint() != before
+
+
+def test_only_results_about_the_site_are_cacheable():
+    assert cacheable([{"status": "pass"}, {"status": "fail"}, {"status": "warning"}])
+    assert not cacheable([])
+    assert not cacheable([{"status": "pass"}, {"status": "error"}])
+    assert not cacheable([{"status": "skipped"}])
+
+
+def test_file_hash_follows_content(tmp_path):
+    a, b = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    a.write_bytes(b"same")
+    b.write_bytes(b"same")
+    assert file_sha256(str(a)) == file_sha256(str(b))
+    b.write_bytes(b"changed")
+    assert file_sha256(str(a)) != file_sha256(str(b))
+
+
+def test_result_cache_is_off_unless_enabled(monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_ENABLED", False)
+    assert result_cache.get_result_cache() is None
+
+
+def test_disk_cache_round_trip_and_shared_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    DiskCache(path, 60, 10).set("k", [{"id": "t1", "status": "pass"}])
+    # Another process (here: another instance) sees the same entry
+    assert DiskCache(path, 60, 10).get("k") == [{"id": "t1", "status": "pass"}]
+
+
+def test_disk_cache_expires_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), 60, 10)
+    cache.set("k", 1, ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), 60, 2)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats["evictions"] == 1
+
+
+def test_disk_cache_evicts_by_size(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), 60, 100, max_bytes=250)
+    for n in range(5):
+        cache.set(f"k{n}", "x" * 100)
+        time.sleep(0.01)
+    assert cache.size_bytes() <= 250
+    assert cache.get("k4") is not None
+
+
+def test_disk_cache_counters_accumulate(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), 60, 10)
+    cache.add_counters(hits=1, bytes_saved=10)
+    cache.add_counters(hits=2)
+    assert cache.counters() == {"hits": 3, "bytes_saved": 10}
+
+
+def test_cache_key_ignores_dict_order():
+    assert cache_key("x", {"a": 1, "b": 2}) == cache_key("x", {"b": 2, "a": 1})
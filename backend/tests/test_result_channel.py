@@ -0,0 +1,92 @@
+import asyncio
+import socket
+from utils.result_channel import ResultChannelServer, ResultChannelWriter, NullChannel, open_channel
+
+
+def runner(address, test_type, indexes):
+    """What a runner does: stage events and results (in any order), then disconnect."""
+    channel = open_channel(address)
+    channel.emit("stage", test_type=test_type, stage="started")
+    for i in indexes:
+        channel.emit("result", test_type=test_type, index=i, result={"id": f"{test_type}-{i}"})
+    channel.emit("stage", test_type=test_type, stage="finished", count=len(indexes))
+    channel.close()
+
+
+def test_results_arrive_live_and_are_collected_in_plan_order():
+    async def main():
+        records = []
+        server = await ResultChannelServer(on_record=records.append).start()
+        await asyncio.to_thread(runner, server.address, "uiux", [2, 0, 1])
+        collected = await server.collect("uiux")
+        await server.close()
+        return records, collected
+
+    records, collected = asyncio.run(main())
+
+    assert [r["id"] for r in collected] == ["uiux-0", "uiux-1", "uiux-2"]
+    assert [r["type"] for r in records] == ["stage", "result", "result", "result", "stage"]
+    assert [r.get("index") for r in records if r["type"] == "result"] == [2, 0, 1]
+    assert all("ts" in r for r in records)
+
+
+def test_concurrent_test_types_are_kept_apart():
+    async def main():
+        server = await ResultChannelServer().start()
+        await asyncio.gather(asyncio.to_thread(runner, server.address, "uiux", [0, 1]),
+                             asyncio.to_thread(runner, server.address, "functional", [0]))
+        collected = await server.collect("uiux"), await server.collect("functional")
+        await server.close()
+        return collected
+
+    uiux, functional = asyncio.run(main())
+
+    assert [r["id"] for r in uiux] == ["uiux-0", "uiux-1"]
+    assert [r["id"] for r in functional] == ["functional-0"]
+
+
+def test_malformed_lines_and_failing_handlers_do_not_end_the_stream():
+    def on_record(record):
+        if record["type"] == "stage":
+            raise ValueError("handler bug")
+
+    async def main():
+        server = await ResultChannelServer(on_record=on_record).start()
+        host, port = server.address.rsplit(":", 1)
+
+        def send():
+            with socket.create_connection((host, int(port))) as sock:
+                sock.sendall(b'{"type": "stage", "test_type": "uiux", "stage": "started"}\n'
+                             b'not json\n'
+                             b'{"type": "result", "test_type": "uiux", "index": 0, "result": {"id": "r"}}\n')
+
+        await asyncio.to_thread(send)
+        collected = await server.collect("uiux")
+        await server.close()
+        return collected
+
+    assert asyncio.run(main()) == [{"id": "r"}]
+
+
+def test_collect_returns_what_arrived_when_the_runner_never_disconnects():
+    async def main():
+        server = await ResultChannelServer().start()
+        writer = await asyncio.to_thread(ResultChannelWriter, server.address)
+        writer.emit("result", test_type="uiux", index=0, result={"id": "r"})
+        await asyncio.sleep(0.05)
+        collected = await server.collect("uiux", timeout=0.1)
+        writer.close()
+        await server.close()
+        return collected
+
+    assert asyncio.run(main()) == [{"id": "r"}]
+
+
+def test_runner_without_a_reachable_server_gets_a_null_channel():
+    assert isinstance(open_channel(None), NullChannel)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        unused = s.getsockname()[1]
+    channel = open_channel(f"127.0.0.1:{unused}")
+    assert isinstance(channel, NullChannel)
+    channel.emit("result", index=0, result={})
@@ -0,0 +1,283 @@
+import time
+import asyncio
+import test_runner
+from test_runner import ActionClock, run_on_browser, plan_execution, execute_plan
+from utils.dom_index import DomIndex
+from utils.selector_repair import SelectorRepairIndex
+from conftest import FakePage
+
+URL = "https://example.com"
+
+
+def run(testcases, test_type="functional", **options):
+    results = []
+    asyncio.run(run_on_browser(URL, testcases, test_type, "chromium", results, ActionClock(), **options))
+    return results
+
+
+# One navigation serves both the DOM map and the testcases
+
+def test_single_session_loads_the_target_once(fake_browser):
+    results = run([
+        {"id": "t1", "action": "assert", "selector": "body", "expected": "Welcome"},
+        {"id": "t2", "action": "assert", "selector": ".title", "expected": "Home"},
+    ], single_session=True)
+
+    assert [r["status"] for r in results] == ["pass", "pass"]
+    assert fake_browser.navigations == [URL]
+    assert fake_browser.captures == 1
+    assert len(fake_browser.contexts) == 1
+
+
+def test_separate_scrape_loads_the_target_twice(fake_browser):
+    run([{"id": "t1", "action": "assert", "selector": "body", "expected": "Welcome"}], single_session=False)
+
+    assert fake_browser.navigations == [URL, URL]
+    assert len(fake_browser.contexts) == 2
+
+
+def test_fresh_state_reloads_only_after_the_page_changed(fake_browser):
+    results = run([
+        {"id": "t1", "action": "assert", "selector": "body", "expected": "Welcome", "freshState": True},
+        {"id": "t2", "action": "click", "selector": "#menu"},
+        {"id": "t3", "action": "type", "selector": "#search"},
+        {"id": "t4", "action": "click", "selector": "#menu", "freshState": True},
+    ], single_session=True)
+
+    assert [r["status"] for r in results] == ["pass"] * 4
+    page = fake_browser.pages[0]
+    assert page.navigations == [URL, URL]
+    assert page.actions == [("click", "#menu"), ("fill", "#search"), ("click", "#menu")]
+
+
+class SharedSnapshot:
+    """The run's DOM snapshot artifact, as far as a functional run reads it."""
+
+    def to_index(self):
+        return DomIndex.from_html("<body><div id='menu'>Menu</div></body>")
+
+
+def test_run_snapshot_replaces_capturing_the_page(fake_browser):
+    run([{"id": "t1", "action": "assert", "selector": "body", "expected": "Welcome"}], snapshot=SharedSnapshot())
+
+    assert fake_browser.captures == 0
+    assert fake_browser.navigations == [URL]
+
+
+# Pristine read-only testcases are sharded across isolated contexts
+
+def test_plan_splits_pristine_asserts_from_ordered_steps():
+    plan = [
+        {"action": "assert"}, {"action": "assert"},
+        {"action": "click"},
+        {"action": "assert"}, {"action": "assert"},
+        {"action": "type"},
+        {"action": "assert", "freshState": True},
+        {"action": "assert"},
+    ]
+    pristine, steps = plan_execution(plan)
+    assert pristine == [0, 1, 6]
+    assert steps == [("serial", [2]), ("parallel", [3, 4]), ("serial", [5]), ("parallel", [7])]
+
+
+def asserts(count):
+    return [{"id": f"a{n}", "action": "assert", "selector": "body", "expected": "Welcome"} for n in range(count)]
+
+
+def execute(testcases, shards=4):
+    async def main():
+        async with test_runner.get_browser_pool().context() as context:
+            page = await context.new_page()
+            await page.goto(URL)
+            return await execute_plan(URL, page, testcases, DomIndex(), "functional", shards=shards)
+    return asyncio.run(main())
+
+
+def test_pristine_asserts_run_in_shards_and_keep_their_order(fake_browser, monkeypatch):
+    monkeypatch.setattr(test_runner, "MIN_TESTS_PER_SHARD", 3)
+    plan = asserts(6) + [{"id": "c1", "action": "click", "selector": "#menu"}]
+
+    results = execute(plan, shards=4)
+
+    assert [r["id"] for r in results] == [tc["id"] for tc in plan]
+    assert all(r["status"] == "pass" for r in results)
+    # The primary page plus two shards, each loading the target once
+    assert len(fake_browser.contexts) == 3
+    assert len(fake_browser.navigations) == 3
+    # Each shard resolves its selectors once, on its own page
+    assert [p.resolutions for p in fake_browser.pages[1:]] == [[["body"]], [["body"]]]
+    assert fake_browser.pages[0].actions == [("click", "#menu")]
+
+
+def test_too_few_asserts_stay_on_the_primary_page(fake_browser, monkeypatch):
+    monkeypatch.setattr(test_runner, "MIN_TESTS_PER_SHARD", 3)
+
+    results = execute(asserts(5), shards=4)
+
+    assert len(results) == 5
+    assert len(fake_browser.contexts) == 1
+
+
+def test_failed_shard_reports_errors_for_its_own_testcases_only(fake_browser, monkeypatch):
+    monkeypatch.setattr(test_runner, "MIN_TESTS_PER_SHARD", 3)
+    context = fake_browser.context
+    opened = []
+
+    def failing_second_shard(browser_type="chromium", **options):
+        opened.append(browser_type)
+        if len(opened) == 3:
+            raise RuntimeError("context crashed")
+        return context(browser_type, **options)
+
+    monkeypatch.setattr(fake_browser, "context", failing_second_shard)
+
+    results = execute(asserts(6), shards=2)
+
+    assert [r["status"] for r in results] == ["pass", "error"] * 3
+    assert "context crashed" in results[1]["details"]
+
+
+# Selectors are resolved in one round trip before the testcases run
+
+def test_selectors_resolve_in_one_batch_and_missing_ones_are_rechecked_once(monkeypatch):
+    monkeypatch.setattr(test_runner, "SELECTOR_SETTLE_MS", 1)
+    page = FakePage(None, {"body": "Welcome", "#menu": "Menu"})
+
+    resolution = asyncio.run(test_runner.resolve_selectors(page, ["#menu", "body", "#gone", "#menu", None]))
+
+    assert page.resolutions == [["#gone", "#menu", "body"], ["#gone"]]
+    assert resolution["body"]["visible"] is True
+    assert resolution["#gone"]["exists"] is False
+
+
+def test_unresolvable_page_falls_back_to_per_test_waits():
+    class BrokenPage(FakePage):
+        async def evaluate(self, script, selectors):
+            raise RuntimeError("Execution context was destroyed")
+
+    assert asyncio.run(test_runner.resolve_selectors(BrokenPage(None, {}), ["body"])) == {}
+
+
+def test_selector_the_pre_pass_did_not_find_fails_without_waiting():
+    page = FakePage(None, {})
+    resolution = {"#gone": {"exists": False, "visible": False, "count": 0, "bbox": None}}
+
+    results = [asyncio.run(test_runner.execute_test(page, {"id": "t1", "action": action, "selector": "#gone"},
+                                                    {}, "functional", resolution=resolution))
+               for action in ("click", "assert")]
+
+    assert [r["details"] for r in results] == ["Error: element #gone not found on the page",
+                                               "Assertion failed: element #gone not found"]
+    assert page.actions == []
+
+
+# Per-type time budgets and adaptive action timeouts
+
+def test_clock_takes_the_earlier_of_its_budget_and_the_run_deadline():
+    soon = time.time() + 10
+    assert ActionClock(budget_seconds=300, deadline=soon).deadline == soon
+    assert ActionClock(budget_seconds=5, deadline=time.time() + 300).remaining_ms() <= 5000
+
+
+def test_action_timeout_defaults_until_the_page_is_measured():
+    assert ActionClock().action_timeout() == test_runner.DEFAULT_ACTION_TIMEOUT_MS
+
+
+def test_action_timeout_follows_load_time_and_slow_actions(monkeypatch):
+    monkeypatch.setattr(test_runner, "MIN_ACTION_TIMEOUT_MS", 750)
+    monkeypatch.setattr(test_runner, "MAX_ACTION_TIMEOUT_MS", 15000)
+    clock = ActionClock()
+    clock.record_load(100)
+    assert clock.action_timeout() == 750
+    clock.record_load(2000)
+    assert clock.action_timeout() == 4000
+    # One slow outlier in ten is ignored; two set the 90th percentile
+    clock.record_action(2000)
+    for ms in [100] * 9:
+        clock.record_action(ms)
+    assert clock.action_timeout() == 4000
+    clock.record_action(2000)
+    assert clock.action_timeout() == 6000
+    clock.record_load(60000)
+    assert clock.action_timeout() == 15000
+
+
+def test_only_recent_actions_count():
+    clock = ActionClock()
+    for ms in [5000] * 20 + [100] * 20:
+        clock.record_action(ms)
+    assert clock.action_ms == [100] * 20
+
+
+def test_timeouts_never_outlast_the_budget():
+    clock = ActionClock(budget_seconds=1)
+    clock.record_load(60000)
+    assert clock.action_timeout() <= 1000
+    assert clock.navigation_timeout() <= 1000
+    clock.deadline = time.time() - 1
+    assert clock.expired()
+    assert clock.action_timeout() == 1 and clock.navigation_timeout() == 1
+
+
+def test_testcases_past_the_budget_are_skipped(fake_browser):
+    async def main():
+        async with test_runner.get_browser_pool().context() as context:
+            page = await context.new_page()
+            clock = ActionClock()
+            clock.deadline = time.time() - 1
+            return await execute_plan(URL, page, asserts(2) + [{"id": "c1", "action": "click", "selector": "#menu"}],
+                                      DomIndex(), "functional", clock=clock)
+
+    results = asyncio.run(main())
+
+    assert [r["status"] for r in results] == ["skipped"] * 3
+    assert fake_browser.pages[0].actions == []
+
+
+# Testcases that cannot run are reported without touching the browser
+
+def test_invalid_testcases_are_pruned_before_execution(fake_browser, monkeypatch):
+    async def complete_capture(page, browser_type="chromium"):
+        index = DomIndex.from_html("<body><div id='menu'>Menu</div><div id='search'></div></body>")
+        index.complete = True
+        return index, None
+
+    monkeypatch.setattr(test_runner, "capture_dom", complete_capture)
+    validated = []
+
+    results = run([
+        {"id": "t1", "action": "click", "selector": "#checkout-basket"},
+        {"id": "t2", "action": "hover", "selector": "#menu"},
+        {"id": "t3", "action": "click", "selector": "#menu"},
+    ], on_validated=lambda pruned, saved_ms, repaired: validated.append((pruned, repaired)))
+
+    assert [r["status"] for r in results] == ["invalid", "invalid", "pass"]
+    assert "matches nothing on the loaded page" in results[0]["details"]
+    assert validated == [(2, 0)]
+    assert fake_browser.pages[0].actions == [("click", "#menu")]
+
+
+def test_streamed_testcases_share_one_repair_index(fake_browser, monkeypatch):
+    async def complete_capture(page, browser_type="chromium"):
+        index = DomIndex.from_html("<body><div id='menu'>Menu</div><div id='search'></div></body>")
+        index.complete = True
+        return index, None
+
+    monkeypatch.setattr(test_runner, "capture_dom", complete_capture)
+    builds = []
+    build = SelectorRepairIndex.__init__
+
+    def counted_build(self, dom_map):
+        builds.append(dom_map)
+        build(self, dom_map)
+
+    monkeypatch.setattr(SelectorRepairIndex, "__init__", counted_build)
+
+    async def stream():
+        for n, selector in enumerate(["#menu-button", "#serch", "#menuu"]):
+            yield {"id": f"t{n}", "action": "click", "selector": selector}
+
+    results = run([], stream=stream())
+
+    assert [r["status"] for r in results] == ["invalid", "invalid", "invalid"]
+    assert len(builds) == 1
@@ -0,0 +1,117 @@
+import time
+import random
+import pytest
+from utils import selector_repair
+from utils.dom_index import DomIndex
+from utils.selector_repair import SelectorRepairIndex, query_terms, normalize_term
+from benchmark_dom_index import synthetic_page, WORDS
+
+PAGE = """
+<html><body>
+  <form id="login-form">
+    <label for="user-email">Email address</label>
+    <input id="user-email" type="email">
+    <input name="password" type="password" placeholder="Your password">
+    <button id="submit-button">Sign in</button>
+  </form>
+  <a id="forgot-link">Forgot password?</a>
+  <button class="send-btn primary-action">Send message</button>
+  <div id="checkout-summary">Checkout total</div>
+  <input type="submit" id="newsletter-subscribe" value="Subscribe">
+</body></html>
+"""
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SelectorRepairIndex(DomIndex.from_html(PAGE))
+
+
+def repaired(index, selector, action=None):
+    result = index.repair(selector, action)
+    return result[0] if result else None
+
+
+def test_terms_are_normalized_across_naming_styles():
+    assert normalize_term("submitButton") == normalize_term("submit-button") == normalize_term("Submit_button")
+
+
+def test_query_terms_know_what_kind_of_term_they_name():
+    terms, tag = query_terms("button#submitBtn.primary[name='goto']:has-text('Sign in')")
+    assert tag == "button"
+    assert set(terms) == {("key", "submit btn"), ("class", "primary"), ("key", "goto"), ("text", "sign in")}
+
+
+def test_selector_engine_prefix_is_not_a_tag():
+    assert query_terms("text=Forgot password") == ([("text", "forgot password")], None)
+
+
+@pytest.mark.parametrize("selector,action,expected", [
+    ("#submitButton", "click", "#submit-button"),
+    ("#user_email", "type", "#user-email"),
+    ("[name='Password']", "type", "[name='password']"),
+    ("button:has-text('Send')", "click", ".send-btn.primary-action"),
+    ("text=Forgot password", "click", "#forgot-link"),
+    ("input[placeholder='Your password']", "type", "[name='password']"),
+    # A submit input stands in for a button
+    ("button#newsletterSubscribe", "click", "#newsletter-subscribe"),
+])
+def test_near_misses_are_repaired(index, selector, action, expected):
+    assert repaired(index, selector, action) == expected
+
+
+@pytest.mark.parametrize("selector,action", [
+    # Nothing like it on the page
+    ("#shopping-cart", "click"),
+    ("button:has-text('Add to basket')", "click"),
+    (".navbar-toggle", "click"),
+    # Right words, wrong kind: an id is not repaired to some element's text
+    ("#checkout-total", "assert"),
+    ("#sign-in", "click"),
+    # Right id, wrong tag
+    ("button#forgot-link-x", "click"),
+    ("input#checkout-summary", "assert"),
+    # Typing needs an input, however close the name
+    ("#submit_button", "type"),
+    # Too short to say anything
+    ("#go", "click"),
+])
+def test_real_misses_are_not_repaired(index, selector, action):
+    assert index.repair(selector, action) is None
+
+
+def test_random_selectors_over_the_page_vocabulary_are_not_repaired():
+    repair_index = SelectorRepairIndex(DomIndex.from_html(synthetic_page(10_000)))
+    rng = random.Random(3)
+    misses = [f"#{rng.choice(WORDS)}-{rng.choice(WORDS)}-btn" for _ in range(200)] + \
+             [f"button:has-text('{rng.choice(WORDS).capitalize()} now')" for _ in range(200)] + \
+             [f".{rng.choice(WORDS)}-{rng.choice(WORDS)}-panel" for _ in range(200)]
+
+    assert [s for s in misses if repair_index.repair(s, "click")] == []
+
+
+def test_lookups_stay_fast_on_large_pages():
+    dom_map = DomIndex.from_html(synthetic_page(100_000))
+    repair_index = SelectorRepairIndex(dom_map)
+    rng = random.Random(5)
+    selectors = [f"#{rng.choice(WORDS)}-{rng.choice(WORDS)}-btn" for _ in range(200)] + \
+                [f"#{record.id.replace('-', '_')}" for record in dom_map.records[:2000:10] if record.id]
+
+    started = time.perf_counter()
+    for selector in selectors:
+        repair_index.repair(selector, "click")
+    per_query = (time.perf_counter() - started) / len(selectors)
+
+    # Around 0.25ms here; the bound only catches a return to scanning whole posting lists
+    assert per_query < 0.005
+
+
+def test_posting_scan_is_capped(monkeypatch):
+    monkeypatch.setattr(selector_repair, "MAX_POSTINGS_SCANNED", 1)
+    index = SelectorRepairIndex(DomIndex.from_html(PAGE))
+    # Still finds what the first posting read leads to, and never more work than the cap
+    assert repaired(index, "#submit_button", "click") == "#submit-button"
+
+
+def test_selector_equal_to_its_repair_is_not_reported(index):
+    assert index.repair("#submit-button") is None
@@ -0,0 +1,128 @@
+import json
+import pytest
+from utils import srs_index
+from utils.srs_index import SrsIndex, split_sections, section_text, stem, tokenize, relevant_context
+
+
+@pytest.fixture(autouse=True)
+def index_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(srs_index, "SRS_INDEX_CACHE_PATH", str(tmp_path / "srs.db"))
+    monkeypatch.setattr(srs_index, "_cache", None)
+    monkeypatch.setattr(srs_index, "SRS_RETRIEVAL_ENABLED", True)
+    monkeypatch.setattr(srs_index, "SRS_RETRIEVAL_MIN_CHARS", 0)
+
+
+def test_sections_start_at_headings_and_requirement_ids():
+    text = ("1. Introduction\nThis document describes the shop.\n\n"
+            "2. Functional Requirements\nREQ-1 Users shall log in.\nThe login form has two fields.\n"
+            "FR-2.3 Users shall log out.\n"
+            "# Empty\n## Next\nBody.")
+
+    assert split_sections(text) == [
+        {"title": "1. Introduction", "text": "1. Introduction\nThis document describes the shop."},
+        {"title": "2. Functional Requirements / REQ-1", "text": "REQ-1 Users shall log in.\nThe login form has two fields."},
+        {"title": "2. Functional Requirements / FR-2.3", "text": "FR-2.3 Users shall log out."},
+        {"title": "Next", "text": "## Next\nBody."},
+    ]
+
+
+def test_long_sections_are_split_at_line_breaks(monkeypatch):
+    monkeypatch.setattr(srs_index, "MAX_SECTION_CHARS", 60)
+    body = [f"step {n} of the checkout flow" for n in range(6)]
+    sections = split_sections("## Checkout\n" + "\n".join(body))
+
+    assert len(sections) > 1
+    assert {s["title"] for s in sections} == {"Checkout"}
+    assert all(len(s["text"]) <= 60 for s in sections)
+    assert "\n".join(s["text"] for s in sections) == "\n".join(["## Checkout"] + body)
+    # Chunks after the first carry their heading when prompted
+    assert section_text(sections[0]) == sections[0]["text"]
+    assert section_text(sections[1]) == f"Checkout\n{sections[1]['text']}"
+
+
+def test_tokens_drop_stopwords_and_share_stems():
+    assert {stem(w) for w in ("loads", "loaded", "loading")} == {"load"}
+    assert stem("bus") == "bus"
+    assert tokenize("The page LOADS in 2 seconds") == ["page", "load", "second"]
+
+
+SECTIONS = [
+    {"title": "Billing", "text": "Invoices are archived quarterly."},
+    {"title": "Keyboard", "text": "Every control is reachable by keyboard with a visible focus ring."},
+    {"title": "Speed", "text": "Pages load within two seconds."},
+    {"title": "Images", "text": "Images have alt text for screen readers."},
+]
+
+
+def test_best_sections_come_back_in_document_order():
+    index = SrsIndex(SECTIONS)
+    assert index.top("keyboard focus screen reader", k=2) == [1, 3]
+    # A query nothing matches falls back to the earliest sections
+    assert index.top("payroll", k=2) == [0, 1]
+
+
+def test_index_round_trips_through_json():
+    index = SrsIndex(SECTIONS)
+    restored = SrsIndex.from_dict(json.loads(json.dumps(index.to_dict())))
+    assert restored.scores("alt text load") == index.scores("alt text load")
+
+
+def test_index_is_built_once_per_document():
+    first, cached = srs_index.load_srs_index("## Speed\nPages load fast.")
+    assert cached is False
+    second, cached = srs_index.load_srs_index("## Speed\nPages load fast.")
+    assert cached is True
+    assert second.sections == first.sections
+    assert srs_index.load_srs_index("## Speed\nPages load slowly.")[1] is False
+
+
+def document():
+    """Twenty sections: a repeated footer, filler nobody asks for, then accessibility and performance ones."""
+    parts = ["## Legal\nAcme Corp confidential."] * 2
+    parts += [f"## Billing {n}\nInvoices are archived quarterly by the finance team." for n in range(10)]
+    parts += [f"## Accessibility {n}\nImages carry alt text for screen reader number {n}." for n in range(4)]
+    parts += [f"## Performance {n}\nPages respond within {n + 1} second under load." for n in range(4)]
+    return "\n".join(parts), parts
+
+
+def test_context_is_the_union_of_each_types_best_sections_in_document_order():
+    text, parts = document()
+    context, stats = relevant_context(text, ["accessibility", "performance"])
+
+    # Each type takes its four sections and, on ties, the four earliest
+    expected = parts[1:4] + parts[12:]
+    assert context == "\n\n".join(expected)
+    assert stats["retrieval"] is True
+    assert (stats["sections"], stats["sections_used"]) == (20, 12)
+    assert stats["context_chars"] == len(context) < stats["srs_chars"]
+    assert stats["index_cached"] is False
+    assert relevant_context(text, ["accessibility", "performance"])[1]["index_cached"] is True
+
+
+def test_repeated_sections_are_sent_once():
+    text, _ = document()
+    context, _ = relevant_context(text, ["accessibility"])
+    assert context.count("Acme Corp confidential.") == 1
+
+
+@pytest.mark.parametrize("setting, value", [("SRS_RETRIEVAL_ENABLED", False), ("SRS_RETRIEVAL_MIN_CHARS", 10 ** 6)])
+def test_whole_document_is_sent_when_retrieval_is_off_or_the_document_short(monkeypatch, setting, value):
+    monkeypatch.setattr(srs_index, setting, value)
+    text, _ = document()
+    context, stats = relevant_context(text, ["accessibility"])
+    assert context == text
+    assert stats == {"srs_chars": len(text), "context_chars": len(text), "retrieval": False}
+
+
+def test_whole_document_is_sent_when_there_are_too_few_sections_to_choose_from():
+    text = "\n".join(f"## Part {n}\nText {n}." for n in range(srs_index.SRS_TOP_K))
+    context, stats = relevant_context(text, ["uiux"])
+    assert context == text and stats["retrieval"] is False
+
+
+def test_fingerprint_follows_the_retrieval_settings(monkeypatch):
+    fingerprint = srs_index.retrieval_fingerprint()
+    monkeypatch.setattr(srs_index, "MAX_SECTION_CHARS", 900)
+    assert srs_index.retrieval_fingerprint() not in ("", fingerprint)
+    monkeypatch.setattr(srs_index, "SRS_RETRIEVAL_ENABLED", False)
+    assert srs_index.retrieval_fingerprint() == ""
@@ -0,0 +1,150 @@
+import os
+import math
+import time
+import threading
+from utils.resources import available_memory_mb
+
+# Memory the worker fleet may spend on test runs; 0 sums the budgets workers report for their nodes
+ADMISSION_MEMORY_BUDGET_MB = int(os.getenv("ADMISSION_MEMORY_BUDGET_MB", "0"))
+# One worker node's budget, reported with every run it finishes; 0 is 80% of its free memory at startup
+WORKER_MEMORY_BUDGET_MB = int(os.getenv("WORKER_MEMORY_BUDGET_MB", "0"))
+# Fleet budget assumed until a worker has reported its node's
+DEFAULT_FLEET_MEMORY_BUDGET_MB = int(os.getenv("DEFAULT_FLEET_MEMORY_BUDGET_MB", "3200"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+ADMISSION_MAX_QUEUED_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUED_PER_USER", "5"))
+# 0 derives the per-user limit from the global one
+ADMISSION_MAX_RUNS_PER_USER = int(os.getenv("ADMISSION_MAX_RUNS_PER_USER", "0"))
+
+# Per-run cost assumed until workers have reported measurements
+DEFAULT_RUN_MEMORY_MB = int(os.getenv("DEFAULT_RUN_MEMORY_MB", "1200"))
+DEFAULT_RUN_SECONDS = int(os.getenv("DEFAULT_RUN_SECONDS", "180"))
+RUN_COST_SAMPLE_SIZE = 20
+# Runs looked at to find the worker nodes, which reach further back than the cost average
+CAPACITY_SAMPLE_SIZE = 100
+RUN_COST_TTL_SECONDS = 60
+
+
+def node_memory_budget_mb() -> int:
+    """What this worker node may spend on test runs, for worker.py to report."""
+    return WORKER_MEMORY_BUDGET_MB or int((available_memory_mb() or 4096) * 0.8)
+
+
+def fleet_memory_budget_mb(samples: list) -> int:
+    """
+    Sum of the newest budget each worker node reported in `samples`
+    (newest first), or DEFAULT_FLEET_MEMORY_BUDGET_MB before any has.
+    """
+    budgets = {}
+    for sample in samples:
+        node = sample.get("node")
+        if node and sample.get("memory_budget_mb") and node not in budgets:
+            budgets[node] = sample["memory_budget_mb"]
+    return sum(budgets.values()) or DEFAULT_FLEET_MEMORY_BUDGET_MB
+
+
+class AdmissionController:
+    """
+    Decides whether a new test run is queued or rejected. Concurrency limits
+    come from the measured cost of recent runs (peak RSS and duration that
+    worker.py records in `resource_usage`) rather than fixed numbers, set
+    against the memory the worker nodes report having. The API server and
+    the workers run on different machines, so neither side's own memory
+    says anything about the fleet's.
+    """
+
+    def __init__(self, queue, memory_budget_mb: int = ADMISSION_MEMORY_BUDGET_MB):
+        self.queue = queue
+        # Explicit configuration wins over what the workers report
+        self.configured_budget_mb = memory_budget_mb
+        self._cost = None
+        self._budget_mb = None
+        self._cost_at = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Run cost and fleet budget from recent runs, cached for RUN_COST_TTL_SECONDS."""
+        with self._lock:
+            if self._cost is None or time.monotonic() - self._cost_at > RUN_COST_TTL_SECONDS:
+                memory_mb, seconds = DEFAULT_RUN_MEMORY_MB, DEFAULT_RUN_SECONDS
+                try:
+                    samples = self.queue.recent_usage(CAPACITY_SAMPLE_SIZE)
+                except Exception as e:
+                    print(f" Admission: could not load run costs: {e}")
+                    samples = []
+                recent = samples[:RUN_COST_SAMPLE_SIZE]
+                memory = [s["peak_rss_mb"] for s in recent if s.get("peak_rss_mb")]
+                durations = [s["duration_seconds"] for s in recent if s.get("duration_seconds")]
+                if memory:
+                    memory_mb = sum(memory) / len(memory)
+                if durations:
+                    seconds = sum(durations) / len(durations)
+                self._cost = (memory_mb, seconds)
+                self._budget_mb = self.configured_budget_mb or fleet_memory_budget_mb(samples)
+                self._cost_at = time.monotonic()
+            return self._cost, self._budget_mb
+
+    def run_cost(self):
+        """(memory_mb, seconds) of an average recent run."""
+        return self._refresh()[0]
+
+    def memory_budget_mb(self) -> int:
+        return self._refresh()[1]
+
+    def limits(self):
+        (memory_mb, _), budget_mb = self._refresh()
+        global_limit = max(1, int(budget_mb // max(memory_mb, 1)))
+        per_user = ADMISSION_MAX_RUNS_PER_USER or max(1, global_limit // 4)
+        return {"global_running": global_limit, "user_running": per_user}
+
+    def _eta_seconds(self, runs_ahead, slots):
+        """Seconds until a run with `runs_ahead` runs in front of it can start."""
+        _, seconds = self.run_cost()
+        if runs_ahead < slots:
+            return 0
+        return math.ceil((runs_ahead - slots + 1) / slots) * seconds
+
+    def check(self, user_id: str) -> dict:
+        stats = self.queue.stats(user_id)
+        limits = self.limits()
+        slots = limits["global_running"]
+        _, seconds = self.run_cost()
+
+        if stats["pending"] >= ADMISSION_MAX_QUEUE:
+            return {
+                "admitted": False,
+                "reason": "Test queue is full",
+                "retry_after": max(1, math.ceil(seconds / slots))
+            }
+        if stats["user_pending"] >= ADMISSION_MAX_QUEUED_PER_USER:
+            return {
+                "admitted": False,
+                "reason": f"You already have {stats['user_pending']} test runs queued",
+                "retry_after": max(1, math.ceil(seconds))
+            }
+
+        # The run waits for a global slot and for one of its user's slots
+        eta = max(
+            self._eta_seconds(stats["running"] + stats["pending"], slots),
+            self._eta_seconds(stats["user_running"] + stats["user_pending"], limits["user_running"])
+        )
+        return {
+            "admitted": True,
+            "queue_position": stats["pending"] + 1,
+            "eta_seconds": round(eta),
+            "limits": limits
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller(queue=None) -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            if queue is None:
+                from utils.job_queue import get_job_queue
+                queue = get_job_queue()
+            _controller = AdmissionController(queue)
+    return _controller
@@ -0,0 +1,49 @@
+import os
+import gzip
+import json
+import shutil
+
+# Run-scoped files shared between the server, engine workers and per-type scripts on one node
+ARTIFACTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "temp", "artifacts"))
+KEEP_RUN_ARTIFACTS = os.getenv("KEEP_RUN_ARTIFACTS", "false").lower() == "true"
+
+DOM_SNAPSHOT_FILE = "dom_snapshot.json.gz"
+DOM_SNAPSHOT_META_FILE = "dom_snapshot.meta.json"
+TESTCASE_PLANS_FILE = "testcase_plans.json"
+
+
+def run_artifact_path(test_run_id, name: str) -> str:
+    return os.path.join(ARTIFACTS_DIR, str(test_run_id), name)
+
+
+def write_json_gz(path: str, data):
+    """Write atomically, so a reader never sees a half-written artifact."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(partial, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(partial, path)
+
+
+def read_json_gz(path: str):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(partial, path)
+
+
+def read_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def remove_run_artifacts(test_run_id):
+    if KEEP_RUN_ARTIFACTS:
+        return
+    shutil.rmtree(os.path.join(ARTIFACTS_DIR, str(test_run_id)), ignore_errors=True)
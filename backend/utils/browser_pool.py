@@ -0,0 +1,209 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from utils.resources import child_map, descendants, rss_mb
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "50"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+
+
+class PooledBrowser:
+    def __init__(self, browser, browser_type, root_pids):
+        self.browser = browser
+        self.browser_type = browser_type
+        self.root_pids = root_pids
+        self.contexts_served = 0
+        self.active = 0
+        self.retiring = False
+        # Set while the slot's browser is still launching; resolves to the launched PooledBrowser
+        self.launching = None
+
+    def connected(self):
+        return self.launching is not None or self.browser.is_connected()
+
+    def rss_mb(self):
+        if not self.root_pids:
+            return 0
+        children = child_map()
+        pids = set(self.root_pids)
+        for pid in self.root_pids:
+            pids |= descendants(pid, children)
+        return rss_mb(pids)
+
+
+class BrowserPool:
+    """
+    Warm browser processes shared across runs. Each checkout gets a fresh
+    BrowserContext for isolation; a browser is recycled once it has served
+    `max_contexts` contexts or its process tree grows past `max_rss_mb`.
+    The pool lock only guards bookkeeping: launches, closes and the RSS
+    scan run outside it, so a cold launch never holds up checkouts that a
+    warm browser can serve.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_contexts: int = BROWSER_MAX_CONTEXTS,
+                 max_rss_mb: int = BROWSER_MAX_RSS_MB):
+        self.size = max(1, size)
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.loop = asyncio.get_running_loop()
+        self._playwright = None
+        self._browsers = {}
+        self._lock = asyncio.Lock()
+        # Launches are serialized with each other only, so new processes can be attributed to their browser
+        self._launch_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "launches": 0, "recycles": 0, "contexts": 0}
+
+    async def _launch(self, browser_type):
+        async with self._launch_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            before = descendants(os.getpid())
+            browser = await getattr(self._playwright, browser_type).launch(headless=True)
+            # Processes that appeared during launch belong to this browser, minus
+            # renderers that other pooled browsers spawned in the meantime.
+            children = child_map()
+            new_pids = descendants(os.getpid(), children) - before
+            for pooled in (b for browsers in self._browsers.values() for b in browsers):
+                for pid in pooled.root_pids:
+                    new_pids -= descendants(pid, children)
+            self.stats["launches"] += 1
+            return PooledBrowser(browser, browser_type, new_pids)
+
+    async def _checkout(self, browser_type):
+        launch = None
+        async with self._lock:
+            browsers = self._browsers.setdefault(browser_type, [])
+            browsers[:] = [b for b in browsers if b.connected() or b.active]
+            usable = [b for b in browsers if not b.retiring and b.connected()]
+            idle = [b for b in usable if b.active == 0]
+
+            if idle or (usable and len(browsers) >= self.size):
+                pooled = min(idle or usable, key=lambda b: b.active)
+                self.stats["hits"] += 1
+            else:
+                # Reserve the slot now and launch once the lock is released
+                pooled = launch = PooledBrowser(None, browser_type, set())
+                pooled.launching = self.loop.create_future()
+                browsers.append(pooled)
+                self.stats["misses"] += 1
+
+            pooled.active += 1
+            pooled.contexts_served += 1
+            self.stats["contexts"] += 1
+
+        if launch is not None:
+            await self._fill(launch)
+        if pooled.launching is not None:
+            # Checkouts that share a launching slot wait for its browser, not for the pool
+            return await asyncio.shield(pooled.launching)
+        return pooled
+
+    async def _fill(self, slot):
+        """Launch the browser for a reserved slot and hand it to every checkout waiting on the slot."""
+        try:
+            launched = await self._launch(slot.browser_type)
+        except BaseException as e:
+            async with self._lock:
+                browsers = self._browsers.get(slot.browser_type, [])
+                if slot in browsers:
+                    browsers.remove(slot)
+            if isinstance(e, asyncio.CancelledError):
+                slot.launching.cancel()
+            else:
+                slot.launching.set_exception(e)
+                slot.launching.exception()
+            raise
+        async with self._lock:
+            launched.active += slot.active
+            launched.contexts_served += slot.contexts_served
+            browsers = self._browsers.setdefault(slot.browser_type, [])
+            if slot in browsers:
+                browsers[browsers.index(slot)] = launched
+            else:
+                browsers.append(launched)
+        slot.launching.set_result(launched)
+
+    async def _checkin(self, pooled):
+        # Sampled before taking the lock: the /proc scan is slow and must not hold up checkouts
+        oversized = bool(self.max_rss_mb) and not pooled.retiring and \
+            await asyncio.to_thread(pooled.rss_mb) >= self.max_rss_mb
+        async with self._lock:
+            pooled.active -= 1
+            if not pooled.retiring and (pooled.contexts_served >= self.max_contexts or oversized):
+                pooled.retiring = True
+            retire = pooled.retiring and pooled.active == 0 and self._forget(pooled)
+        if retire:
+            await self._close(pooled)
+
+    def _forget(self, pooled) -> bool:
+        """Drop a retiring browser from the pool; False if another checkin already did."""
+        browsers = self._browsers.get(pooled.browser_type, [])
+        if pooled not in browsers:
+            return False
+        browsers.remove(pooled)
+        self.stats["recycles"] += 1
+        return True
+
+    async def _close(self, pooled):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"[BrowserPool] Failed to close {pooled.browser_type}: {e}")
+
+    @asynccontextmanager
+    async def context(self, browser_type: str = "chromium", **context_options):
+        """Yield a fresh BrowserContext on a warm browser of `browser_type`."""
+        pooled = await self._checkout(browser_type)
+        context = None
+        try:
+            context = await pooled.browser.new_context(**context_options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._checkin(pooled)
+
+    def metrics(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0,
+            "browsers": {t: len(b) for t, b in self._browsers.items()},
+        }
+
+    async def close(self):
+        async with self._lock:
+            for browsers in self._browsers.values():
+                for pooled in (b for b in browsers if b.launching is None):
+                    try:
+                        await pooled.browser.close()
+                    except Exception:
+                        pass
+            self._browsers = {}
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+_pool = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Pool bound to the running event loop, created on first use."""
+    global _pool
+    if _pool is None or _pool.loop is not asyncio.get_running_loop():
+        _pool = BrowserPool()
+    return _pool
+
+
+async def close_browser_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
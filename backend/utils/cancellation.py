@@ -0,0 +1,82 @@
+import os
+import time
+import asyncio
+
+# Flag files are visible to every process on the node: the server, worker.py,
+# engine pool workers and per-type script subprocesses.
+CANCEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "temp", "cancel"))
+CANCEL_POLL_SECONDS = float(os.getenv("CANCEL_POLL_SECONDS", "0.25"))
+# Flags outlive their run only if its process died; older than this they are swept
+CANCEL_FLAG_TTL_SECONDS = float(os.getenv("CANCEL_FLAG_TTL_SECONDS", str(6 * 3600)))
+
+
+def _flag_path(test_run_id):
+    return os.path.join(CANCEL_DIR, str(test_run_id))
+
+
+def request_cancel(test_run_id):
+    os.makedirs(CANCEL_DIR, exist_ok=True)
+    sweep_stale_cancels()
+    with open(_flag_path(test_run_id), "w"):
+        pass
+
+
+def is_cancel_requested(test_run_id) -> bool:
+    return bool(test_run_id) and os.path.exists(_flag_path(test_run_id))
+
+
+def clear_cancel(test_run_id):
+    try:
+        os.remove(_flag_path(test_run_id))
+    except FileNotFoundError:
+        pass
+
+
+def sweep_stale_cancels(max_age_seconds: float = CANCEL_FLAG_TTL_SECONDS) -> int:
+    """Remove flags older than `max_age_seconds`; returns how many were removed."""
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    try:
+        names = os.listdir(CANCEL_DIR)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(CANCEL_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def run_until(coro, should_stop, poll_seconds: float = CANCEL_POLL_SECONDS):
+    """
+    Await `coro`, cancelling it as soon as `should_stop()` is true.
+    Returns (result, stopped); result is None when it was stopped.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result(), False
+            if should_stop():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                return None, True
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def run_cancellable(coro, test_run_id, poll_seconds: float = CANCEL_POLL_SECONDS):
+    """
+    Await `coro`, cancelling it as soon as a cancel is requested for the run.
+    Returns (result, cancelled); result is None when the run was cancelled.
+    """
+    return await run_until(coro, lambda: is_cancel_requested(test_run_id), poll_seconds)
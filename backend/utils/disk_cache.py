@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def cache_key(*parts) -> str:
+    """Stable content-addressed key for any JSON-serializable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    JSON value cache in a SQLite file with a TTL and LRU eviction by entry
+    count and, optionally, total size. Safe to share between the server,
+    worker.py and engine worker processes: WAL lets readers proceed while
+    one process writes. Named counters kept in the same file give metrics
+    summed over every process using it.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: int = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connect().execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at)")
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS cache_counters (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork (engine workers) must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            if row is not None:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at < ?", (key, now))
+            self.stats["misses"] += 1
+            return None
+        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl_seconds: float = None):
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache_entries (key, value, created_at, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, created_at = excluded.created_at, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, json.dumps(value, default=str), now, now + ttl, now)
+            )
+            evicted = conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,)).rowcount
+            # Least recently used entries go once the cache is over its size
+            evicted += conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                "  SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?"
+                ")", (self.max_entries,)
+            ).rowcount
+            if self.max_bytes:
+                evicted += conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN ("
+                    "  SELECT key FROM ("
+                    "    SELECT key, SUM(LENGTH(CAST(value AS BLOB))) OVER (ORDER BY accessed_at DESC, key) AS total"
+                    "    FROM cache_entries"
+                    "  ) WHERE total > ?"
+                    ")", (self.max_bytes,)
+                ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.stats["writes"] += 1
+        self.stats["evictions"] += evicted
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def add_counters(self, **deltas):
+        conn = self._connect()
+        for name, delta in deltas.items():
+            conn.execute(
+                "INSERT INTO cache_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, delta)
+            )
+
+    def counters(self) -> dict:
+        return dict(self._connect().execute("SELECT name, value FROM cache_counters").fetchall())
+
+    def size_bytes(self) -> int:
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(value AS BLOB))), 0) FROM cache_entries"
+        ).fetchone()[0]
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
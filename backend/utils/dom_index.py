@@ -0,0 +1,264 @@
+import re
+import zlib
+import hashlib
+from html.parser import HTMLParser
+
+# Tags the index records; the same set the BeautifulSoup dom_map used to keep
+INDEXED_TAGS = frozenset(["input", "button", "a", "form", "div", "img", "meta", "label", "textarea", "select"])
+VOID_TAGS = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+                       "track", "wbr"])
+# Leading characters of an element's text that go into its text hash
+TEXT_HASH_CHARS = 256
+# Characters of an element's label (accessible name or leading text) kept for selector repair
+LABEL_CHARS = 64
+# Attributes that name an element, in order of preference
+LABEL_ATTRS = ("aria-label", "placeholder", "title", "alt")
+BUTTON_INPUT_TYPES = {"submit", "button", "reset"}
+
+_CSS_SPECIAL = re.compile(r'([!"#$%&\'()*+,./:;<=>?@[\\\]^`{|}~])')
+
+
+def css_escape(s):
+    return _CSS_SPECIAL.sub(r'\\\1', s)
+
+
+def text_hash(text: str) -> int:
+    return zlib.crc32(" ".join(text.split())[:TEXT_HASH_CHARS].encode("utf-8"))
+
+
+def label_text(text: str) -> str:
+    return " ".join(text.split())[:LABEL_CHARS]
+
+
+def attribute_label(tag: str, attrs: dict) -> str:
+    """An element's name from its attributes; button-like inputs show their value."""
+    for attr in LABEL_ATTRS:
+        if attrs.get(attr):
+            return label_text(attrs[attr])
+    if tag == "input" and (attrs.get("type") or "").lower() in BUTTON_INPUT_TYPES:
+        return label_text(attrs.get("value") or "")
+    return ""
+
+
+class ElementRecord:
+    __slots__ = ("tag", "id", "classes", "name", "text_hash", "label", "unique")
+
+    def __init__(self, tag, id=None, classes=(), name=None, text_hash=0, label=""):
+        self.tag = tag
+        self.id = id
+        self.classes = classes
+        self.name = name
+        self.text_hash = text_hash
+        self.label = label
+        self.unique = False
+
+    def selector(self):
+        """The selector the old dom_map keyed this element by: id, then classes, then name."""
+        if self.id:
+            return f"#{self.id}"
+        if self.classes:
+            return "." + ".".join(css_escape(c) for c in self.classes)
+        if self.name:
+            return f"[name='{self.name}']"
+        return None
+
+    def __repr__(self):
+        return f"<{self.tag} {self.selector() or ''}>"
+
+
+class DomIndex:
+    """
+    Compact index of a page's interesting elements: slotted records plus
+    lookup maps by id, class and name. Nothing from the parse tree is kept.
+    Supports the mapping operations callers used on the old dom_map
+    (`in`, iteration over selectors, `len`).
+
+    Separately, the ids, classes, tags and names seen on *any* element are
+    kept as plain sets. `complete` says they cover the whole rendered page
+    (never true for HTML source), which is enough to prove a selector
+    cannot match anything on it.
+    """
+
+    def __init__(self, records=()):
+        self.records = []
+        self.by_id = {}
+        self.by_class = {}
+        self.by_name = {}
+        self.by_selector = {}
+        self.all_ids = set()
+        self.all_classes = set()
+        self.all_tags = set()
+        self.all_names = set()
+        self.complete = False
+        # Text of <label for=...> elements by the id they label
+        self.labels_for = {}
+        # SelectorRepairIndex over the records, built on the first repair and dropped on add
+        self.repair_index = None
+        for record in records:
+            self.add(record)
+        self.finalize()
+
+    def note_element(self, tag, id=None, classes=(), name=None):
+        """Record that some element with these attributes exists, indexed or not."""
+        self.all_tags.add(tag)
+        if id:
+            self.all_ids.add(id)
+        self.all_classes.update(classes)
+        if name:
+            self.all_names.add(name)
+
+    def note_label(self, for_id, text):
+        if for_id and text:
+            self.labels_for[for_id] = label_text(text)
+
+    def add(self, record: ElementRecord):
+        position = len(self.records)
+        self.records.append(record)
+        self.repair_index = None
+        if record.id:
+            self.by_id.setdefault(record.id, []).append(position)
+        for cls in record.classes:
+            self.by_class.setdefault(cls, []).append(position)
+        if record.name:
+            self.by_name.setdefault(record.name, []).append(position)
+        selector = record.selector()
+        if selector:
+            self.by_selector.setdefault(selector, []).append(position)
+
+    def finalize(self):
+        for positions in self.by_selector.values():
+            if len(positions) == 1:
+                self.records[positions[0]].unique = True
+        return self
+
+    @classmethod
+    def from_html(cls, html: str):
+        parser = _IndexParser()
+        parser.feed(html)
+        parser.close()
+        return parser.index.finalize()
+
+    @classmethod
+    def from_browser(cls, collected):
+        """
+        Build from what INDEX_PAGE_JS collected: [tag, id, classes, name,
+        text, label, for] rows plus every element's attributes.
+        """
+        index = cls()
+        for tag, id, classes, name, text, label, for_id in collected["rows"]:
+            index.add(ElementRecord(tag, id or None, tuple(classes), name or None, text_hash(text or ""),
+                                    label_text(label or text or "")))
+            if tag == "label":
+                index.note_label(for_id, text or "")
+        index.finalize()
+        index.all_ids.update(collected["ids"])
+        index.all_classes.update(collected["classes"])
+        index.all_tags.update(collected["tags"])
+        index.all_names.update(collected["names"])
+        index.complete = collected["complete"]
+        return index
+
+    def get(self, selector: str):
+        positions = self.by_selector.get(selector)
+        return self.records[positions[-1]] if positions else None
+
+    def is_unique(self, selector: str) -> bool:
+        return len(self.by_selector.get(selector, ())) == 1
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for record in self.records:
+            digest.update(f"{record.tag}|{record.id}|{' '.join(record.classes)}|{record.name}|{record.text_hash};"
+                          .encode("utf-8"))
+        return digest.hexdigest()
+
+    def __contains__(self, selector):
+        return selector in self.by_selector
+
+    def __iter__(self):
+        return iter(self.by_selector)
+
+    def __len__(self):
+        return len(self.by_selector)
+
+
+class _IndexParser(HTMLParser):
+    """Streaming stdlib parser: records indexed tags as they open, hashes their text as it passes."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.index = DomIndex()
+        # (tag, record or None, text parts, collected chars, label's for id) for every open element
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        record = None
+        values = dict(attrs)
+        classes = tuple((values.get("class") or "").split())
+        self.index.note_element(tag, values.get("id"), classes, values.get("name"))
+        if tag in INDEXED_TAGS:
+            record = ElementRecord(tag, values.get("id") or None, classes, values.get("name") or None,
+                                   label=attribute_label(tag, values))
+            self.index.add(record)
+        if tag in VOID_TAGS:
+            return
+        self._open.append([tag, record, [], 0, values.get("for") if tag == "label" else None])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self._open and self._open[-1][0] == tag:
+            self._close(self._open.pop())
+
+    def handle_endtag(self, tag):
+        # Unclosed children end with their parent, as browsers do
+        for depth in range(len(self._open) - 1, -1, -1):
+            if self._open[depth][0] == tag:
+                while len(self._open) > depth:
+                    self._close(self._open.pop())
+                return
+
+    def handle_data(self, data):
+        for entry in self._open:
+            if entry[1] is not None and entry[3] < TEXT_HASH_CHARS * 2:
+                entry[2].append(data)
+                entry[3] += len(data)
+
+    def _close(self, entry):
+        if entry[1] is not None:
+            text = "".join(entry[2])
+            entry[1].text_hash = text_hash(text)
+            entry[1].label = entry[1].label or label_text(text)
+            self.index.note_label(entry[4], text)
+
+    def close(self):
+        super().close()
+        while self._open:
+            self._close(self._open.pop())
+
+
+# Collected in the page so no HTML is serialized or parsed on the Python side
+INDEX_PAGE_JS = """
+(tags) => {
+    const wanted = new Set(tags);
+    const rows = [];
+    const ids = new Set(), classes = new Set(), seen = new Set(), names = new Set();
+    let complete = true;
+    for (const el of document.querySelectorAll("*")) {
+        const tag = el.tagName.toLowerCase();
+        // Playwright selectors pierce shadow roots this walk does not enter
+        if (el.shadowRoot) complete = false;
+        const name = el.getAttribute("name") || "";
+        seen.add(tag);
+        if (el.id) ids.add(el.id);
+        el.classList.forEach((c) => classes.add(c));
+        if (name) names.add(name);
+        if (wanted.has(tag)) {
+            const named = ["aria-label", "placeholder", "title", "alt"].map((a) => el.getAttribute(a)).find((v) => v)
+                || (tag === "input" && ["submit", "button", "reset"].includes(el.type) ? el.value : "");
+            rows.push([tag, el.id || "", Array.from(el.classList), name, (el.textContent || "").slice(0, %d),
+                       named || "", tag === "label" ? el.htmlFor : ""]);
+        }
+    }
+    return {rows, ids: [...ids], classes: [...classes], tags: [...seen], names: [...names], complete};
+}
+""" % (TEXT_HASH_CHARS * 2)
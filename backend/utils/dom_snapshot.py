@@ -0,0 +1,243 @@
+from utils.dom_index import (DomIndex, ElementRecord, INDEXED_TAGS, TEXT_HASH_CHARS, text_hash, label_text,
+                              attribute_label)
+
+# Computed styles captured for every laid-out node, in this order
+SNAPSHOT_STYLES = ["display", "visibility", "opacity", "font-size"]
+
+ELEMENT_NODE = 1
+TEXT_NODE = 3
+
+# Thresholds for the snapshot-derived checks
+MIN_TAP_TARGET_PX = 24
+MIN_FONT_SIZE_PX = 12
+MAX_DOM_ELEMENTS = 1500
+MAX_DOM_DEPTH = 32
+LABELLED_BY_ATTRS = ("aria-label", "aria-labelledby", "title")
+UNLABELLED_INPUT_TYPES = {"hidden", "submit", "button", "reset", "image"}
+
+
+async def capture_snapshot_payload(page) -> dict:
+    """
+    Nodes, layout boxes and SNAPSHOT_STYLES of the main frame in one
+    DOMSnapshot.captureSnapshot call. Chromium only (CDP).
+    """
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        return await cdp.send("DOMSnapshot.captureSnapshot", {
+            "computedStyles": SNAPSHOT_STYLES,
+            "includeDOMRects": True
+        })
+    finally:
+        await cdp.detach()
+
+
+async def capture_snapshot(page):
+    return DomSnapshot(await capture_snapshot_payload(page))
+
+
+class DomSnapshot:
+    """
+    Decoded main-frame document from a captureSnapshot payload. The payload
+    is columnar (one array per property, strings interned in a shared
+    table); it is decoded into parallel per-node lists, so nodes are plain
+    indices in document order.
+    """
+
+    def __init__(self, payload: dict):
+        strings = payload["strings"]
+        document = payload["documents"][0]
+        nodes = document["nodes"]
+
+        def string(index):
+            return strings[index] if index is not None and index >= 0 else ""
+
+        self.node_types = nodes["nodeType"]
+        self.parents = nodes["parentIndex"]
+        self.tags = [string(i).lower() for i in nodes["nodeName"]]
+        self.values = [string(i) for i in nodes.get("nodeValue", [])]
+        self.attributes = [
+            {string(flat[k]): string(flat[k + 1]) for k in range(0, len(flat) - 1, 2)}
+            for flat in nodes.get("attributes", [[] for _ in self.node_types])
+        ]
+        self.content_width = document.get("contentWidth")
+        self._ends = None
+
+        # Only laid-out nodes have boxes and computed styles
+        layout = document["layout"]
+        self.bounds = {}
+        self.styles = {}
+        for position, node in enumerate(layout["nodeIndex"]):
+            self.bounds[node] = layout["bounds"][position]
+            self.styles[node] = {name: string(value) for name, value in zip(SNAPSHOT_STYLES, layout["styles"][position])}
+
+    def __len__(self):
+        return len(self.node_types)
+
+    def elements(self):
+        return (n for n, node_type in enumerate(self.node_types) if node_type == ELEMENT_NODE)
+
+    def ancestors(self, node):
+        parent = self.parents[node]
+        while parent is not None and parent >= 0:
+            yield parent
+            parent = self.parents[parent]
+
+    def visible(self, node) -> bool:
+        box = self.bounds.get(node)
+        if not box or box[2] <= 0 or box[3] <= 0:
+            return False
+        style = self.styles[node]
+        return style.get("visibility") != "hidden" and style.get("display") != "none" \
+            and style.get("opacity") not in ("0", "0.0")
+
+    def text(self, node, limit: int = TEXT_HASH_CHARS * 2) -> str:
+        parts, size = [], 0
+        for n in range(node + 1, self._subtree_ends()[node]):
+            if self.node_types[n] == TEXT_NODE:
+                parts.append(self.values[n])
+                size += len(self.values[n])
+                if size >= limit:
+                    break
+        return "".join(parts)
+
+    def _subtree_ends(self):
+        # Nodes are in document order, so a node's descendants are the run of indices after it
+        if self._ends is None:
+            ends = list(range(1, len(self.node_types) + 1))
+            for n in range(len(self.node_types) - 1, -1, -1):
+                parent = self.parents[n]
+                if parent is not None and parent >= 0 and ends[n] > ends[parent]:
+                    ends[parent] = ends[n]
+            self._ends = ends
+        return self._ends
+
+    def depth(self) -> int:
+        depths = [0] * len(self.node_types)
+        for n, parent in enumerate(self.parents):
+            if parent is not None and parent >= 0:
+                depths[n] = depths[parent] + 1
+        return max(depths, default=0)
+
+    def to_index(self) -> DomIndex:
+        """DomIndex records for the indexed tags, text hashed from their descendant text nodes."""
+        index = DomIndex()
+        for n in self.elements():
+            attrs = self.attributes[n]
+            classes = tuple((attrs.get("class") or "").split())
+            index.note_element(self.tags[n], attrs.get("id"), classes, attrs.get("name"))
+            if self.tags[n] in INDEXED_TAGS:
+                text = self.text(n)
+                index.add(ElementRecord(
+                    self.tags[n],
+                    attrs.get("id") or None,
+                    classes,
+                    attrs.get("name") or None,
+                    text_hash(text),
+                    attribute_label(self.tags[n], attrs) or label_text(text)
+                ))
+                if self.tags[n] == "label":
+                    index.note_label(attrs.get("for"), text)
+        index.complete = True
+        return index.finalize()
+
+    def describe(self, node) -> str:
+        attrs = self.attributes[node]
+        if attrs.get("id"):
+            return f"{self.tags[node]}#{attrs['id']}"
+        if attrs.get("class"):
+            return f"{self.tags[node]}." + ".".join(attrs["class"].split())
+        if attrs.get("name"):
+            return f"{self.tags[node]}[name='{attrs['name']}']"
+        return self.tags[node]
+
+
+def _check_result(test_type, check_id, name, description, offenders, status_on_fail="fail", details_ok=None):
+    status = status_on_fail if offenders else "pass"
+    if offenders:
+        shown = ", ".join(offenders[:5]) + (f" and {len(offenders) - 5} more" if len(offenders) > 5 else "")
+        details = f"{len(offenders)} found: {shown}"
+    else:
+        details = details_ok or "No issues found"
+    return {
+        "id": f"{test_type}-snapshot-{check_id}",
+        "name": name,
+        "status": status,
+        "type": test_type,
+        "description": description,
+        "details": details,
+        "srsReference": "N/A"
+    }
+
+
+def _accessibility_checks(snapshot):
+    labelled_ids = {snapshot.attributes[n].get("for") for n in snapshot.elements() if snapshot.tags[n] == "label"}
+    labelled_ids.discard(None)
+    missing_alt, unlabelled, nameless = [], [], []
+    for n in snapshot.elements():
+        tag, attrs = snapshot.tags[n], snapshot.attributes[n]
+        if tag == "img" and "alt" not in attrs and snapshot.visible(n):
+            missing_alt.append(snapshot.describe(n))
+        elif tag in ("input", "textarea", "select") and attrs.get("type", "").lower() not in UNLABELLED_INPUT_TYPES:
+            if not (any(attrs.get(a) for a in LABELLED_BY_ATTRS) or attrs.get("id") in labelled_ids
+                    or any(snapshot.tags[a] == "label" for a in snapshot.ancestors(n))):
+                unlabelled.append(snapshot.describe(n))
+        elif tag in ("button", "a") and snapshot.visible(n):
+            if not snapshot.text(n).strip() and not any(attrs.get(a) for a in LABELLED_BY_ATTRS):
+                nameless.append(snapshot.describe(n))
+    return [
+        ("img-alt", "Images have alt text", "Every visible image carries an alt attribute", missing_alt, "fail"),
+        ("form-labels", "Form controls are labelled",
+         "Inputs, textareas and selects have a label, aria-label, aria-labelledby or title", unlabelled, "fail"),
+        ("control-names", "Buttons and links have accessible names",
+         "Visible buttons and links have text or an aria-label", nameless, "fail"),
+    ]
+
+
+def _uiux_checks(snapshot, viewport_width=None):
+    small_targets, small_text = [], []
+    for n in snapshot.elements():
+        if snapshot.tags[n] in ("a", "button") and snapshot.visible(n):
+            _, _, width, height = snapshot.bounds[n]
+            if width < MIN_TAP_TARGET_PX or height < MIN_TAP_TARGET_PX:
+                small_targets.append(f"{snapshot.describe(n)} ({width:.0f}x{height:.0f}px)")
+    for n, node_type in enumerate(snapshot.node_types):
+        if node_type == TEXT_NODE and n in snapshot.styles and snapshot.values[n].strip():
+            size = snapshot.styles[n].get("font-size", "")
+            if size.endswith("px") and float(size[:-2]) < MIN_FONT_SIZE_PX:
+                parent = snapshot.parents[n]
+                small_text.append(f"{snapshot.describe(parent)} ({size})")
+    overflow = []
+    if viewport_width and snapshot.content_width and snapshot.content_width > viewport_width:
+        overflow.append(f"page is {snapshot.content_width:.0f}px wide in a {viewport_width}px viewport")
+    return [
+        ("tap-targets", "Tap targets are large enough",
+         f"Visible links and buttons are at least {MIN_TAP_TARGET_PX}x{MIN_TAP_TARGET_PX}px", small_targets, "warning"),
+        ("font-size", "Text is legible", f"Rendered text is at least {MIN_FONT_SIZE_PX}px", small_text, "warning"),
+        ("horizontal-overflow", "No horizontal scrolling", "Content fits the viewport width", overflow, "warning"),
+    ]
+
+
+def _performance_checks(snapshot):
+    elements = sum(1 for _ in snapshot.elements())
+    depth = snapshot.depth()
+    size = [f"{elements} elements"] if elements > MAX_DOM_ELEMENTS else []
+    deep = [f"depth {depth}"] if depth > MAX_DOM_DEPTH else []
+    return [
+        ("dom-size", "DOM size is reasonable", f"The page has at most {MAX_DOM_ELEMENTS} elements", size, "warning",
+         f"{elements} elements, {len(snapshot.bounds)} laid-out nodes"),
+        ("dom-depth", "DOM nesting is shallow", f"The DOM is at most {MAX_DOM_DEPTH} levels deep", deep, "warning",
+         f"Depth {depth}"),
+    ]
+
+
+def snapshot_checks(snapshot: DomSnapshot, test_type: str, viewport_width: int = None) -> list:
+    """Results for the checks a snapshot answers on its own, for uiux, accessibility and performance."""
+    if test_type == "accessibility":
+        checks = _accessibility_checks(snapshot)
+    elif test_type == "uiux":
+        checks = _uiux_checks(snapshot, viewport_width)
+    elif test_type == "performance":
+        checks = _performance_checks(snapshot)
+    else:
+        return []
+    return [_check_result(test_type, *check) for check in checks]
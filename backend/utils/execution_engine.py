@@ -0,0 +1,175 @@
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.resources import available_memory_mb
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+# Rough resident cost of one test type in flight (worker + Chromium + page)
+TEST_TYPE_MEMORY_MB = int(os.getenv("TEST_TYPE_MEMORY_MB", "600"))
+
+
+def max_concurrent_test_types():
+    """
+    How many test types this worker may run at once: MAX_CONCURRENT_TEST_TYPES
+    if set, otherwise bounded by CPU count and available memory.
+    """
+    configured = int(os.getenv("MAX_CONCURRENT_TEST_TYPES", "0"))
+    if configured > 0:
+        return configured
+
+    limit = os.cpu_count() or 1
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        limit = min(limit, memory_mb // TEST_TYPE_MEMORY_MB)
+    return max(1, min(limit, 5))
+
+
+ENGINE_WORKERS = int(os.getenv("TEST_ENGINE_WORKERS", "0")) or max_concurrent_test_types()
+ENGINE_MAX_TASKS_PER_WORKER = int(os.getenv("TEST_ENGINE_MAX_TASKS_PER_WORKER", "50"))
+
+# Event loop owned by a pool worker; kept for the lifetime of the process so that
+# anything bound to it (Playwright driver, browsers) survives between tasks.
+_worker_loop = None
+
+
+def _init_worker():
+    """
+    Pool worker initializer: pay the Playwright / PyMuPDF / gemini_client
+    import cost once per process instead of once per test type.
+    """
+    global _worker_loop
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    import test_runner  # noqa: F401
+
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+
+def _run_in_worker(url, test_run_id, srs_pdf_path, test_type, deadline=None, channel_address=None,
+                   snapshot_path=None, plans_path=None):
+    import test_runner
+    from utils.browser_pool import get_browser_pool
+
+    async def run():
+        results = await test_runner.run_tests(url, test_run_id, srs_pdf_path, test_type, deadline=deadline,
+                                               channel_address=channel_address, snapshot_path=snapshot_path,
+                                               plans_path=plans_path)
+        return results, get_browser_pool().metrics()
+
+    return os.getpid(), *_worker_loop.run_until_complete(run())
+
+
+def _snapshot_in_worker(url, test_run_id):
+    import test_runner
+    return _worker_loop.run_until_complete(test_runner.capture_run_snapshot(url, test_run_id))
+
+
+def _ping():
+    return os.getpid()
+
+
+def total_pool_metrics(metrics) -> dict:
+    """Browser pool counters summed over `metrics`, with the hit rate taken over the sums."""
+    metrics = list(metrics)
+    total = {key: sum(m[key] for m in metrics) for key in ("hits", "misses", "launches", "recycles", "contexts")}
+    lookups = total["hits"] + total["misses"]
+    total["hit_rate"] = round(total["hits"] / lookups, 3) if lookups else 0
+    return total
+
+
+class ExecutionEngine:
+    """
+    Pool of long-lived, pre-imported worker processes that call
+    scripts/test_runner.run_tests directly instead of spawning
+    `python scripts/<type>_testing.py` for every test type.
+    """
+
+    def __init__(self, workers: int = ENGINE_WORKERS, max_tasks_per_worker: int = ENGINE_MAX_TASKS_PER_WORKER):
+        self.workers = max(1, workers)
+        self.max_tasks_per_worker = max_tasks_per_worker or None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._browser_pool_metrics = {}
+
+    def start(self, warm: bool = True):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    max_tasks_per_child=self.max_tasks_per_worker,
+                )
+                print(f" Execution engine started with {self.workers} workers")
+        if warm:
+            self.warm()
+        return self
+
+    def warm(self):
+        """Force every worker to spawn and finish its imports."""
+        futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+        pids = {f.result() for f in futures}
+        print(f" Execution engine warmed: {len(pids)} worker process(es) ready")
+        return pids
+
+    def _restart(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.start(warm=False)
+
+    async def _submit(self, fn, *args):
+        if self._executor is None:
+            self.start(warm=False)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool:
+            print(" Execution engine pool broken, restarting workers")
+            self._restart()
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def run(self, url: str, test_run_id: str, srs_pdf_path: str, test_type: str, deadline: float = None,
+                  channel_address: str = None, snapshot_path: str = None, plans_path: str = None):
+        pid, results, pool_metrics = await self._submit(_run_in_worker, url, test_run_id, srs_pdf_path, test_type,
+                                                        deadline, channel_address, snapshot_path, plans_path)
+        self._browser_pool_metrics[pid] = pool_metrics
+        return results
+
+    async def capture_run_snapshot(self, url: str, test_run_id: str) -> dict:
+        """Capture the run's shared DOM snapshot artifact; returns its metadata."""
+        return await self._submit(_snapshot_in_worker, url, test_run_id)
+
+    def browser_pool_metrics(self):
+        """Browser pool counters as last reported by each worker, plus a total."""
+        per_worker = dict(self._browser_pool_metrics)
+        return {"total": total_pool_metrics(per_worker.values()), "workers": per_worker}
+
+    async def ping(self):
+        return await self._submit(_ping)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ExecutionEngine:
+    """Process-wide engine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ExecutionEngine().start(warm=False)
+    return _engine
@@ -0,0 +1,190 @@
+import os
+import uuid
+import threading
+from datetime import datetime, timezone
+
+EXECUTION_LOG_FLUSH_RECORDS = int(os.getenv("EXECUTION_LOG_FLUSH_RECORDS", "25"))
+EXECUTION_LOG_FLUSH_MS = int(os.getenv("EXECUTION_LOG_FLUSH_MS", "500"))
+# Rows kept for retry while Supabase is unreachable; the oldest are dropped past this
+EXECUTION_LOG_MAX_PENDING = 5000
+
+LOG_LEVELS = {"fail": "warning", "warning": "warning", "error": "error", "invalid": "warning"}
+
+
+class ExecutionLogBuffer:
+    """
+    Write-behind buffer for `test_execution_logs`. Stage events and
+    per-testcase results are appended without blocking the caller and
+    inserted in batches by a background thread, whenever `flush_records`
+    rows are waiting or `flush_ms` has passed since the last flush.
+    """
+
+    def __init__(self, report_id: str, client=None, flush_records: int = EXECUTION_LOG_FLUSH_RECORDS,
+                 flush_ms: int = EXECUTION_LOG_FLUSH_MS):
+        if client is None:
+            from utils.supabase_client import supabase as client
+        self.client = client
+        self.report_id = report_id
+        self.flush_records = max(1, flush_records)
+        self.flush_seconds = flush_ms / 1000
+        # Tags this attempt's rows; a requeued run's earlier attempt never counts towards its summary
+        self.attempt = uuid.uuid4().hex
+        self.stats = {"rows": 0, "batches": 0, "failed_batches": 0, "dropped": 0}
+        self._rows = []
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self, reset: bool = True):
+        """
+        Begin flushing. With `reset`, rows left by an earlier attempt at the
+        same report (a requeued run) are removed so they are not counted twice;
+        numbering continues after them so streaming cursors stay valid.
+        """
+        try:
+            if reset:
+                self.client.table("test_execution_logs").delete() \
+                    .eq("report_id", self.report_id).in_("event_type", ["stage", "result"]).execute()
+            response = self.client.table("test_execution_logs").select("seq") \
+                .eq("report_id", self.report_id).not_.is_("seq", "null") \
+                .order("seq", desc=True).limit(1).execute()
+            if response.data:
+                self._seq = response.data[0]["seq"]
+        except Exception as e:
+            print(f" Execution log: could not prepare report {self.report_id}: {e}")
+        self._thread = threading.Thread(target=self._flush_loop, name=f"execution-log-{self.report_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _append(self, row):
+        with self._cond:
+            self._seq += 1
+            row["report_id"] = self.report_id
+            row["attempt"] = self.attempt
+            row["seq"] = self._seq
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_records:
+                self._cond.notify()
+
+    def add_stage(self, test_type: str, stage: str, ts: float = None, **details):
+        self._append({
+            "test_type": test_type,
+            "event_type": "stage",
+            "log_level": "error" if stage == "failed" else "info",
+            "message": stage,
+            "details": details,
+            "timestamp": _iso(ts)
+        })
+
+    def add_result(self, test_type: str, result: dict, ts: float = None):
+        status = result.get("status")
+        self._append({
+            "test_type": test_type,
+            "event_type": "result",
+            "log_level": LOG_LEVELS.get(status, "info"),
+            "message": result.get("name") or result.get("id") or "Testcase",
+            "details": result,
+            "status": status,
+            "timestamp": _iso(ts)
+        })
+
+    def supersede(self, test_type: str, reason: str = None):
+        """
+        Mark the results already logged for `test_type` as replaced: the
+        summary only counts the type's results logged after this.
+        """
+        self.add_stage(test_type, "superseded", **({"reason": reason} if reason else {}))
+
+    def add_record(self, record: dict):
+        """Persist one record from the result channel."""
+        if record["type"] == "result":
+            self.add_result(record.get("test_type"), record["result"], record.get("ts"))
+        elif record["type"] == "stage":
+            details = {k: v for k, v in record.items() if k not in ("type", "test_type", "stage", "ts")}
+            self.add_stage(record.get("test_type"), record["stage"], record.get("ts"), **details)
+
+    def _flush_loop(self):
+        healthy = True
+        while True:
+            with self._cond:
+                # After a failed write, wait out the interval before retrying
+                if not self._closed and (not healthy or len(self._rows) < self.flush_records):
+                    self._cond.wait(self.flush_seconds)
+                closing = self._closed
+            healthy = self.flush()
+            if closing:
+                return
+
+    def flush(self) -> bool:
+        with self._cond:
+            batch, self._rows = self._rows, []
+        if not batch:
+            return True
+        try:
+            self.client.table("test_execution_logs").insert(batch).execute()
+            self.stats["rows"] += len(batch)
+            self.stats["batches"] += 1
+            return True
+        except Exception as e:
+            print(f" Execution log: failed to write {len(batch)} rows: {e}")
+            self.stats["failed_batches"] += 1
+            with self._cond:
+                # Keep them for the next flush, in order, within the retry cap
+                self._rows[:0] = batch
+                overflow = len(self._rows) - EXECUTION_LOG_MAX_PENDING
+                if overflow > 0:
+                    del self._rows[:overflow]
+                    self.stats["dropped"] += overflow
+            return False
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything still buffered and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._rows:
+            self.flush()
+
+    def summary(self) -> dict:
+        """
+        Status counts computed from this attempt's persisted result rows, or
+        None when they are incomplete (rows dropped or never written) or the
+        query failed. Call after `close()`.
+        """
+        if self._rows or self.stats["dropped"]:
+            print(f" Execution log: rows of report {self.report_id} are incomplete, not summarising them")
+            return None
+        try:
+            response = self.client.rpc("test_execution_summary", {
+                "p_report_id": self.report_id, "p_attempt": self.attempt
+            }).execute()
+            return response.data
+        except Exception as e:
+            print(f" Execution log: could not summarise report {self.report_id}: {e}")
+            return None
+
+
+def summarize_results(results: list) -> dict:
+    """Status counts and success rate for a report's results."""
+    counts = {}
+    for result in results:
+        counts[result.get("status")] = counts.get(result.get("status"), 0) + 1
+    total = len(results)
+    return {
+        "total": total,
+        "passed": counts.get("pass", 0),
+        "failed": counts.get("fail", 0),
+        "warnings": counts.get("warning", 0),
+        "errors": counts.get("error", 0),
+        "skipped": counts.get("skipped", 0),
+        "invalid": counts.get("invalid", 0),
+        "success_rate": round((counts.get("pass", 0) / total * 100) if total > 0 else 0, 2)
+    }
+
+
+def _iso(ts: float = None) -> str:
+    moment = datetime.fromtimestamp(ts, timezone.utc) if ts else datetime.now(timezone.utc)
+    return moment.isoformat()
@@ -1,13 +1,36 @@
 import os
 import json
-import requests
+import time
+import asyncio
 import fitz  # PyMuPDF for PDF parsing
 from dotenv import load_dotenv
+from utils.llm_cache import cached_completion, cached_completion_async
+from utils.llm_http import get_llm_http_client
+from utils.srs_index import relevant_context, retrieval_fingerprint
 
 load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Point at scripts/gemini_stub_server.py (http://127.0.0.1:8765) to run without the real API
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+API_URL = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent"
+STREAM_API_URL = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent"
+
+# Bump whenever the testcase prompt changes; cached results from older prompts stop matching
+PROMPT_VERSION = "2"
+BATCH_PROMPT_VERSION = "1"
+
+# "batch" generates the plans for all of a run's test types in one request (or a few);
+# "per_type" sends one request per type, and is also the fallback for types a batch missed
+GENERATION_MODE = os.getenv("GENERATION_MODE", "batch")
+# Types per batch request, so the combined output fits in MAX_BATCH_OUTPUT_TOKENS
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "3"))
+MAX_OUTPUT_TOKENS = 2048
+MAX_BATCH_OUTPUT_TOKENS = 8192
+GEMINI_TIMEOUT_SECONDS = 90
+# Per-type generation streams the response, so testcases can run while the rest are still generated
+GENERATION_STREAMING = os.getenv("GENERATION_STREAMING", "true").lower() == "true"
 
 if not API_KEY:
     raise RuntimeError("GEMINI_API_KEY is not set in environment variables!")
@@ -28,33 +51,20 @@ def extract_text_from_pdf(pdf_path: str) -> str:
     except Exception as e:
         raise RuntimeError(f"Error extracting text from PDF: {e}")
 
-def generate_testcases(test_type: str, srs_source: str, is_pdf: bool = True):
-    """
-    Generate structured JSON testcases for the given test_type from an SRS document.
-    - If is_pdf=True → srs_source is a PDF path.
-    - If is_pdf=False → srs_source is treated as raw SRS text.
-    """
-    if is_pdf:
-        srs_content = extract_text_from_pdf(srs_source)
-    else:
-        srs_content = srs_source
-
-    # Prompt design
-    prompt = f"""
-You are a QA assistant. Generate ONLY valid JSON testcases for **{test_type} testing**
-based on the following SRS document.
-
+RULES = """
 ⚠️ STRICT RULES:
 - Output ONLY a valid JSON array, no markdown, no explanations.
 - Each testcase must include:
   id, name, action, selector, expected, description, srsReference
 - Valid "action" values:
   "goto", "click", "type", "assert", "login"
+- Optionally set "freshState": true when a testcase must start from a freshly
+  loaded page rather than the state left by the previous testcase.
 - Ensure JSON is well-formed and parsable by json.loads().
 
 Example schema:
 [
-  {{
+  {
     "id": "test_login_valid",
     "name": "Valid Login",
     "action": "login",
@@ -62,67 +72,358 @@ Example schema:
     "expected": "dashboard",
     "description": "Verify successful login with valid credentials",
     "srsReference": "REQ-1.2"
-  }}
+  }
 ]
+"""
+
+
+def prompt_fingerprint() -> str:
+    """
+    Identifies the prompts a test type's plans can come from, for result
+    cache keys. A run may generate a type in a batch, alone (a single-type
+    run, or a type the batch missed) or streamed, so the fingerprint covers
+    every template rather than the path GENERATION_MODE prefers.
+    """
+    return f"{PROMPT_VERSION}+batch{BATCH_PROMPT_VERSION}{retrieval_fingerprint()}"
+
+
+def build_prompt(test_type: str, srs_content: str) -> str:
+    return f"""
+You are a QA assistant. Generate ONLY valid JSON testcases for **{test_type} testing**
+based on the following SRS document.
+{RULES}
+SRS Document:
+{srs_content}
+"""
+
 
+def build_batch_prompt(test_types: list, srs_content: str) -> str:
+    keys = ", ".join(f'"{t}"' for t in test_types)
+    return f"""
+You are a QA assistant. Generate ONLY valid JSON testcases for each of these
+test types: {keys}, based on the following SRS document.
+
+Output ONE JSON object with exactly the keys {keys}. The value of each key is
+that test type's testcase array; the rules below apply to each array.
+{RULES}
 SRS Document:
 {srs_content}
 """
 
-    body = {
+
+def parse_json_text(text: str):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:].strip()
+    return json.loads(text)
+
+
+def is_json_text(text: str) -> bool:
+    try:
+        parse_json_text(text)
+        return True
+    except ValueError:
+        return False
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array of objects arriving in chunks:
+    `feed` returns each element object as soon as its closing brace has
+    arrived. Anything before the opening bracket (a ```json fence) is
+    skipped.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self._current = []
+
+    def feed(self, chunk: str) -> list:
+        items = []
+        for char in chunk:
+            if not self.started:
+                self.started = char == "["
+                continue
+            if self.depth == 0:
+                # Between elements: only an object opens one; commas, whitespace and "]" pass
+                if char == "{":
+                    self.depth = 1
+                    self._current = [char]
+                continue
+            self._current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    items.append(json.loads("".join(self._current)))
+                    self._current = []
+        return items
+
+
+def generation_config(max_output_tokens: int = MAX_OUTPUT_TOKENS, json_output: bool = False) -> dict:
+    config = {
+        "temperature": 0.4,
+        "topP": 0.9,
+        "maxOutputTokens": max_output_tokens
+    }
+    if json_output:
+        config["responseMimeType"] = "application/json"
+    return config
+
+
+def call_gemini(prompt: str, max_output_tokens: int = MAX_OUTPUT_TOKENS, json_output: bool = False):
+    """
+    Response text for `prompt`, from the LLM cache or one generateContent
+    round trip. Returns (text, stats): stats has the latency and, from the
+    response's usageMetadata, the tokens sent and received.
+    """
+    config = generation_config(max_output_tokens, json_output)
+    return cached_completion("gemini", GEMINI_MODEL, prompt, config, lambda: _post_gemini(prompt, config),
+                             accept=is_json_text)
+
+
+async def call_gemini_async(prompt: str, max_output_tokens: int = MAX_OUTPUT_TOKENS, json_output: bool = False):
+    """call_gemini for coroutines; the request is awaited on the shared client, not run in a thread."""
+    config = generation_config(max_output_tokens, json_output)
+    return await cached_completion_async("gemini", GEMINI_MODEL, prompt, config,
+                                         lambda: _post_gemini_async(prompt, config), accept=is_json_text)
+
+
+def _request_body(prompt: str, config: dict) -> dict:
+    return {
         "contents": [
             {
                 "role": "user",
                 "parts": [{"text": prompt}]
             }
         ],
-        "generationConfig": {
-            "temperature": 0.4,
-            "topP": 0.9,
-            "maxOutputTokens": 2048
-        }
+        "generationConfig": config
     }
 
-    headers = {"Content-Type": "application/json"}
 
+def _http_stats(prompt: str, http_stats: dict) -> dict:
+    return {"requests": 1, "prompt_chars": len(prompt), "latency_ms": http_stats["latency_ms"],
+            "retries": http_stats["retries"], "http_version": http_stats.get("http_version")}
+
+
+def _usage_stats(prompt: str, http_stats: dict, usage: dict) -> dict:
+    print("Gemini status:", http_stats["status"], f"({http_stats['retries']} retries)")
+    stats = _http_stats(prompt, http_stats)
+    stats["prompt_tokens"] = usage.get("promptTokenCount")
+    stats["output_tokens"] = usage.get("candidatesTokenCount")
+    return stats
+
+
+class _StreamedText:
+    """Collects the text of a streamGenerateContent SSE response, passing each fragment to `on_text`."""
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.parts = []
+        self.usage = {}
+
+    def on_line(self, line):
+        if not line or not line.startswith("data:"):
+            return
+        chunk = json.loads(line[5:])
+        self.usage = chunk.get("usageMetadata", self.usage)
+        for candidate in chunk.get("candidates", [])[:1]:
+            for part in candidate.get("content", {}).get("parts", []):
+                if part.get("text"):
+                    self.parts.append(part["text"])
+                    self.on_text(part["text"])
+
+    def result(self, prompt: str, http_stats: dict):
+        stats = _usage_stats(prompt, http_stats, self.usage)
+        if not self.parts:
+            raise RuntimeError("Gemini stream ended without any text")
+        return "".join(self.parts).strip(), stats
+
+
+async def _stream_gemini(prompt: str, config: dict, on_text):
+    """streamGenerateContent over SSE; `on_text` gets each text fragment, on the caller's loop, as it arrives."""
+    streamed = _StreamedText(on_text)
+    _, http_stats = await get_llm_http_client(GEMINI_TIMEOUT_SECONDS).post_lines_async(
+        f"{STREAM_API_URL}?alt=sse&key={API_KEY}", _request_body(prompt, config), streamed.on_line
+    )
+    return streamed.result(prompt, http_stats)
+
+
+def _response_text(prompt: str, data: dict, http_stats: dict):
+    stats = _usage_stats(prompt, http_stats, data.get("usageMetadata", {}))
     try:
-        response = requests.post(
-            f"{API_URL}?key={API_KEY}",
-            headers=headers,
-            json=body,
-            timeout=90
-        )
+        text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+    except Exception:
+        text = json.dumps(data, indent=2)
+        raise RuntimeError(f"Unexpected Gemini response format:\n{text[:500]}")
+    return text, stats
+
+
+def _post_gemini(prompt: str, config: dict):
+    data, http_stats = get_llm_http_client(GEMINI_TIMEOUT_SECONDS).post_json(
+        f"{API_URL}?key={API_KEY}", _request_body(prompt, config)
+    )
+    return _response_text(prompt, data, http_stats)
+
+
+async def _post_gemini_async(prompt: str, config: dict):
+    data, http_stats = await get_llm_http_client(GEMINI_TIMEOUT_SECONDS).post_json_async(
+        f"{API_URL}?key={API_KEY}", _request_body(prompt, config)
+    )
+    return _response_text(prompt, data, http_stats)
+
+
+def generation_error(test_type: str, e) -> list:
+    return [{
+        "id": f"{test_type}-error",
+        "name": "Gemini generation failed",
+        "status": "error",
+        "type": test_type,
+        "description": "Could not generate testcases",
+        "details": str(e),
+        "srsReference": "N/A"
+    }]
+
+
+def generate_testcases_with_stats(test_type: str, srs_source: str, is_pdf: bool = True):
+    """generate_testcases, also returning the request's token and latency stats."""
+    if is_pdf:
+        srs_content = extract_text_from_pdf(srs_source)
+    else:
+        srs_content = srs_source
 
-        print("Gemini status:", response.status_code)
-        if response.status_code != 200:
-            print("Gemini error:", response.text[:500])
-            response.raise_for_status()
+    context, srs_stats = relevant_context(srs_content, [test_type])
+    prompt = build_prompt(test_type, context)
+    stats = {"mode": "per_type", "requests": 1, "prompt_chars": len(prompt)}
+    try:
+        text, stats = call_gemini(prompt)
+        stats.update(mode="per_type", srs=srs_stats)
+        return parse_json_text(text), stats
+    except Exception as e:
+        print(f"Gemini generation failed: {e}")
+        stats.update(srs=srs_stats, error=str(e)[:200])
+        return generation_error(test_type, e), stats
 
-        data = response.json()
 
-        text = None
-        try:
-            text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
-        except Exception:
-            text = json.dumps(data, indent=2)
-            raise RuntimeError(f"Unexpected Gemini response format:\n{text[:500]}")
+def generate_testcases(test_type: str, srs_source: str, is_pdf: bool = True):
+    """
+    Generate structured JSON testcases for the given test_type from an SRS document.
+    - If is_pdf=True → srs_source is a PDF path.
+    - If is_pdf=False → srs_source is treated as raw SRS text.
+    """
+    testcases, _ = generate_testcases_with_stats(test_type, srs_source, is_pdf)
+    return testcases
+
 
-        if text.startswith("```"):
-            text = text.strip("`")
-            if text.lower().startswith("json"):
-                text = text[4:].strip()
+async def generate_testcases_async(test_type: str, srs_content: str):
+    """generate_testcases_with_stats for coroutines, from SRS text."""
+    context, srs_stats = await asyncio.to_thread(relevant_context, srs_content, [test_type])
+    prompt = build_prompt(test_type, context)
+    stats = {"mode": "per_type", "requests": 1, "prompt_chars": len(prompt)}
+    try:
+        text, stats = await call_gemini_async(prompt)
+        stats.update(mode="per_type", srs=srs_stats)
+        return parse_json_text(text), stats
+    except Exception as e:
+        print(f"Gemini generation failed: {e}")
+        stats.update(srs=srs_stats, error=str(e)[:200])
+        return generation_error(test_type, e), stats
 
-        
-        return json.loads(text)
 
+async def generate_testcases_stream(test_type: str, srs_content: str, on_testcase):
+    """
+    generate_testcases over streamGenerateContent: `on_testcase` is called
+    on the caller's loop with each testcase as soon as the response
+    contains all of it (all at once on a cache hit). Returns (testcases,
+    stats) like generate_testcases_with_stats; stats adds first_testcase_ms.
+    """
+    context, srs_stats = await asyncio.to_thread(relevant_context, srs_content, [test_type])
+    prompt = build_prompt(test_type, context)
+    config = generation_config()
+    parser = JsonArrayStream()
+    delivered = []
+    started = time.perf_counter()
+    first_testcase_ms = None
+
+    def deliver(testcases):
+        nonlocal first_testcase_ms
+        for testcase in testcases:
+            if first_testcase_ms is None:
+                first_testcase_ms = int((time.perf_counter() - started) * 1000)
+            delivered.append(testcase)
+            on_testcase(testcase)
+
+    stats = {"mode": "per_type", "streamed": True, "requests": 1, "prompt_chars": len(prompt)}
+    try:
+        text, stats = await cached_completion_async(
+            "gemini", GEMINI_MODEL, prompt, config,
+            lambda: _stream_gemini(prompt, config, lambda t: deliver(parser.feed(t))), accept=is_json_text
+        )
+        if stats["cached"]:
+            deliver(parse_json_text(text))
+        stats.update(mode="per_type", streamed=True)
     except Exception as e:
         print(f"Gemini generation failed: {e}")
-        return [{
-            "id": f"{test_type}-error",
-            "name": "Gemini generation failed",
-            "status": "error",
-            "type": test_type,
-            "description": "Could not generate testcases",
-            "details": str(e),
-            "srsReference": "N/A"
-        }]
+        stats["error"] = str(e)[:200]
+    stats.update(srs=srs_stats, first_testcase_ms=first_testcase_ms)
+    if not delivered:
+        return generation_error(test_type, stats.get("error", "No testcases in the response")), stats
+    return delivered, stats
+
+
+async def _generate_batch_chunk(test_types: list, srs_content: str):
+    max_tokens = min(MAX_BATCH_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS * len(test_types))
+    context, srs_stats = await asyncio.to_thread(relevant_context, srs_content, test_types)
+    text, stats = await call_gemini_async(build_batch_prompt(test_types, context), max_tokens, json_output=True)
+    stats["srs"] = srs_stats
+    plans = parse_json_text(text)
+    if not isinstance(plans, dict):
+        raise ValueError(f"Expected a JSON object keyed by test type, got {type(plans).__name__}")
+    return {t: plans[t] for t in test_types if isinstance(plans.get(t), list)}, stats
+
+
+async def generate_testcases_batch(test_types: list, srs_content: str):
+    """
+    Plans for several test types from one request per GENERATION_BATCH_SIZE
+    types, sent concurrently. Returns (plans, stats); `plans` maps each
+    type that came back to its testcase list, and the caller generates any
+    missing type per type.
+    """
+    chunks = [test_types[k:k + GENERATION_BATCH_SIZE] for k in range(0, len(test_types), GENERATION_BATCH_SIZE)]
+    plans = {}
+    stats = {"mode": "batch", "requests": 0, "cached_requests": 0, "prompt_chars": 0, "prompt_tokens": 0,
+             "output_tokens": 0, "latency_saved_ms": 0, "retries": 0, "srs_chars": len(srs_content), "context_chars": 0,
+             "errors": []}
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(_generate_batch_chunk(chunk, srs_content) for chunk in chunks),
+                                    return_exceptions=True)
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Gemini batch generation failed for {chunk}: {outcome}")
+            stats["errors"].append(str(outcome)[:200])
+            continue
+        chunk_plans, chunk_stats = outcome
+        plans.update(chunk_plans)
+        stats["cached_requests" if chunk_stats["cached"] else "requests"] += 1
+        for field in ("prompt_chars", "prompt_tokens", "output_tokens", "latency_saved_ms", "retries"):
+            stats[field] += chunk_stats.get(field) or 0
+        stats["context_chars"] += chunk_stats["srs"]["context_chars"]
+    stats["latency_ms"] = int((time.perf_counter() - started) * 1000)
+    stats["types"] = sorted(plans)
+    stats["missing"] = [t for t in test_types if t not in plans]
+    return plans, stats
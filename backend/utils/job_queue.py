@@ -0,0 +1,335 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "supabase")
+# Anchored to the backend directory so the server, worker.py and scripts share one queue
+JOB_QUEUE_SQLITE_PATH = os.getenv("JOB_QUEUE_SQLITE_PATH", os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "temp", "job_queue.db")))
+
+
+class SupabaseJobQueue:
+    """
+    Job queue on top of `test_reports`: a report with status 'pending' and a
+    job_payload is a queued run. Workers lease it through the
+    claim_test_job / heartbeat_test_job functions in supabase_schema.sql,
+    which use FOR UPDATE SKIP LOCKED so that concurrent workers never
+    claim the same run.
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            from utils.supabase_client import supabase as client
+        self.client = client
+
+    def enqueue(self, job_id: str, payload: dict):
+        self.client.table("test_reports").update({
+            "status": "pending",
+            "job_payload": payload
+        }).eq("id", job_id).execute()
+
+    def claim(self, worker_id: str, lease_seconds: int, global_running_limit: int = None,
+              user_running_limit: int = None):
+        response = self.client.rpc("claim_test_job", {
+            "p_worker_id": worker_id,
+            "p_lease_seconds": lease_seconds,
+            "p_global_running_limit": global_running_limit,
+            "p_user_running_limit": user_running_limit
+        }).execute()
+        return response.data[0] if response.data else None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        response = self.client.rpc("heartbeat_test_job", {
+            "p_job_id": job_id,
+            "p_worker_id": worker_id,
+            "p_lease_seconds": lease_seconds
+        }).execute()
+        return bool(response.data)
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        response = self.client.rpc("requeue_expired_test_jobs", {"p_max_attempts": max_attempts}).execute()
+        return response.data or 0
+
+    def release(self, job_id: str, worker_id: str):
+        self.client.table("test_reports").update({
+            "lease_owner": None,
+            "lease_expires_at": None
+        }).eq("id", job_id).eq("lease_owner", worker_id).execute()
+
+    def cancel(self, job_id: str) -> bool:
+        response = self.client.table("test_reports").update({
+            "status": "cancelled"
+        }).eq("id", job_id).in_("status", ["pending", "running"]).execute()
+        return bool(response.data)
+
+    def status(self, job_id: str):
+        response = self.client.table("test_reports").select("status").eq("id", job_id).execute()
+        return response.data[0]["status"] if response.data else None
+
+    def stats(self, user_id: str = None) -> dict:
+        response = self.client.rpc("test_queue_stats", {"p_user_id": user_id}).execute()
+        return response.data or {"running": 0, "pending": 0, "user_running": 0, "user_pending": 0}
+
+    def record_usage(self, job_id: str, usage: dict):
+        self.client.table("test_reports").update({"resource_usage": usage}).eq("id", job_id).execute()
+
+    def report_worker(self, worker_id: str, status: dict):
+        self.client.table("worker_status").upsert({
+            "worker_id": worker_id,
+            **status,
+            "heartbeat_at": datetime.now(timezone.utc).isoformat()
+        }, on_conflict="worker_id").execute()
+
+    def worker_statuses(self, max_age_seconds: float) -> list:
+        """What each worker reported in its last heartbeat, for workers heard from within `max_age_seconds`."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+        response = self.client.table("worker_status").select("*").gt("heartbeat_at", cutoff.isoformat()).execute()
+        return response.data or []
+
+    def recent_usage(self, limit: int = 20) -> list:
+        response = self.client.table("test_reports") \
+            .select("resource_usage") \
+            .not_.is_("resource_usage", "null") \
+            .order("completed_at", desc=True) \
+            .limit(limit).execute()
+        return [row["resource_usage"] for row in response.data or []]
+
+
+class SQLiteJobQueue:
+    """
+    Local stand-in with the same interface as SupabaseJobQueue, for running
+    the queue and workers without Postgres. SQLite has no SKIP LOCKED;
+    claims take the database write lock (BEGIN IMMEDIATE) instead, which
+    gives the same one-claimer-per-job guarantee across processes.
+
+    Only the lease (owner, expiry, attempts) lives here. A run's status is
+    owned by its `test_reports` row, as on Supabase: every transition the
+    queue makes is written through to `reports` inside the same SQLite
+    transaction, status() reads the report, and release() copies back the
+    status run_all_tests left on it. The lease owner is written through
+    too, so the run's own writes can be scoped to the lease on either queue.
+    """
+
+    def __init__(self, reports, path: str = JOB_QUEUE_SQLITE_PATH):
+        self.path = path
+        self.reports = reports
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS test_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    job_payload TEXT,
+                    lease_owner TEXT,
+                    lease_expires_at TEXT,
+                    heartbeat_at TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error_message TEXT,
+                    resource_usage TEXT,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_test_jobs_status ON test_jobs(status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS worker_status (
+                    worker_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    heartbeat_at TEXT NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc)
+
+    def _row(self, row):
+        job = dict(row)
+        job["job_payload"] = json.loads(job["job_payload"]) if job["job_payload"] else None
+        return job
+
+    def _write_report(self, job_id: str, fields: dict):
+        self.reports.table("test_reports").update(fields).eq("id", job_id).execute()
+
+    def _report_status(self, job_id: str):
+        response = self.reports.table("test_reports").select("status").eq("id", job_id).execute()
+        return response.data[0]["status"] if response.data else None
+
+    def enqueue(self, job_id: str, payload: dict):
+        job_id = job_id or str(uuid.uuid4())
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO test_jobs (id, status, job_payload, created_at) VALUES (?, 'pending', ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = 'pending', job_payload = excluded.job_payload",
+                (job_id, json.dumps(payload), self._now().isoformat())
+            )
+            self._write_report(job_id, {"status": "pending", "job_payload": payload})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: int, global_running_limit: int = None,
+              user_running_limit: int = None):
+        conn = self._connect()
+        now = self._now()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            running = conn.execute("SELECT COUNT(*) FROM test_jobs WHERE status = 'running'").fetchone()[0]
+            row = None
+            if global_running_limit is None or running < global_running_limit:
+                row = conn.execute(
+                    "SELECT id FROM test_jobs AS candidate "
+                    "WHERE status = 'pending' AND job_payload IS NOT NULL AND (? IS NULL OR ("
+                    "  SELECT COUNT(*) FROM test_jobs AS active WHERE active.status = 'running' "
+                    "  AND json_extract(active.job_payload, '$.user_id') = json_extract(candidate.job_payload, '$.user_id')"
+                    ") < ?) ORDER BY created_at LIMIT 1",
+                    (user_running_limit, user_running_limit)
+                ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE test_jobs SET status = 'running', lease_owner = ?, lease_expires_at = ?, "
+                "heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, (now + timedelta(seconds=lease_seconds)).isoformat(), now.isoformat(), row["id"])
+            )
+            job = conn.execute("SELECT * FROM test_jobs WHERE id = ?", (row["id"],)).fetchone()
+            self._write_report(row["id"], {"status": "running", "lease_owner": worker_id})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self._row(job)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        now = self._now()
+        cursor = self._connect().execute(
+            "UPDATE test_jobs SET heartbeat_at = ?, lease_expires_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (now.isoformat(), (now + timedelta(seconds=lease_seconds)).isoformat(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        conn = self._connect()
+        now = self._now().isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(
+                "SELECT id, attempts FROM test_jobs WHERE status = 'running' AND lease_expires_at < ?", (now,)
+            ).fetchall()
+            for job in expired:
+                if job["attempts"] >= max_attempts:
+                    error = "Worker lease expired too many times"
+                    conn.execute(
+                        "UPDATE test_jobs SET status = 'failed', error_message = ?, lease_owner = NULL, "
+                        "lease_expires_at = NULL WHERE id = ?", (error, job["id"])
+                    )
+                    self._write_report(job["id"], {"status": "failed", "error_message": error, "completed_at": now,
+                                                   "lease_owner": None})
+                else:
+                    conn.execute(
+                        "UPDATE test_jobs SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL "
+                        "WHERE id = ?", (job["id"],)
+                    )
+                    self._write_report(job["id"], {"status": "pending", "lease_owner": None})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(expired)
+
+    def release(self, job_id: str, worker_id: str):
+        """Drop the lease. The status is whatever the run recorded on its report; the queue never sets one."""
+        cursor = self._connect().execute(
+            "UPDATE test_jobs SET status = COALESCE(?, status), lease_owner = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND lease_owner = ?",
+            (self._report_status(job_id), job_id, worker_id)
+        )
+        if cursor.rowcount == 1:
+            self._write_report(job_id, {"lease_owner": None})
+
+    def cancel(self, job_id: str) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE test_jobs SET status = 'cancelled' WHERE id = ? AND status IN ('pending', 'running')",
+                (job_id,)
+            )
+            if cursor.rowcount == 1:
+                self._write_report(job_id, {"status": "cancelled"})
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def status(self, job_id: str):
+        return self._report_status(job_id)
+
+    def stats(self, user_id: str = None) -> dict:
+        row = self._connect().execute(
+            "SELECT "
+            "  COALESCE(SUM(status = 'running'), 0) AS running, "
+            "  COALESCE(SUM(status = 'pending'), 0) AS pending, "
+            "  COALESCE(SUM(status = 'running' AND json_extract(job_payload, '$.user_id') = ?), 0) AS user_running, "
+            "  COALESCE(SUM(status = 'pending' AND json_extract(job_payload, '$.user_id') = ?), 0) AS user_pending "
+            "FROM test_jobs WHERE status IN ('pending', 'running') AND job_payload IS NOT NULL",
+            (user_id, user_id)
+        ).fetchone()
+        return dict(row)
+
+    def record_usage(self, job_id: str, usage: dict):
+        self._connect().execute("UPDATE test_jobs SET resource_usage = ? WHERE id = ?", (json.dumps(usage), job_id))
+        self._write_report(job_id, {"resource_usage": usage})
+
+    def report_worker(self, worker_id: str, status: dict):
+        self._connect().execute(
+            "INSERT INTO worker_status (worker_id, status, heartbeat_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET status = excluded.status, heartbeat_at = excluded.heartbeat_at",
+            (worker_id, json.dumps(status), self._now().isoformat())
+        )
+
+    def worker_statuses(self, max_age_seconds: float) -> list:
+        cutoff = (self._now() - timedelta(seconds=max_age_seconds)).isoformat()
+        rows = self._connect().execute(
+            "SELECT * FROM worker_status WHERE heartbeat_at > ? ORDER BY worker_id", (cutoff,)
+        ).fetchall()
+        return [{"worker_id": row["worker_id"], **json.loads(row["status"]), "heartbeat_at": row["heartbeat_at"]}
+                for row in rows]
+
+    def recent_usage(self, limit: int = 20) -> list:
+        rows = self._connect().execute(
+            "SELECT resource_usage FROM test_jobs WHERE resource_usage IS NOT NULL "
+            "ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(row["resource_usage"]) for row in rows]
+
+    def get(self, job_id: str):
+        row = self._connect().execute("SELECT * FROM test_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+
+def get_job_queue(backend: str = JOB_QUEUE_BACKEND):
+    if backend == "sqlite":
+        from utils.supabase_client import supabase
+        return SQLiteJobQueue(supabase)
+    return SupabaseJobQueue()
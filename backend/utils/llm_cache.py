@@ -0,0 +1,128 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from utils.disk_cache import DiskCache, cache_key
+
+# On by default: a hit only skips generation, the site is still tested
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "temp", "cache", "llm.db")))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 86400)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Whitespace-only differences (indentation, trailing newlines, PDF line breaks) do not change the key."""
+    return " ".join(prompt.split())
+
+
+def llm_cache_key(provider: str, model: str, prompt: str, config: dict) -> str:
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return cache_key("llm", provider, model, prompt_hash, config)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide LLM response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES)
+    return _cache
+
+
+def _cached(cache, key, prompt: str):
+    """(text, stats) stored under `key`, or None."""
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        print(f"LLM cache read failed: {e}")
+        return None
+    if entry is None:
+        return None
+    saved_bytes = len(prompt.encode("utf-8")) + len(entry["text"].encode("utf-8"))
+    cache.add_counters(hits=1, bytes_saved=saved_bytes, latency_saved_ms=entry["latency_ms"])
+    # Nothing was sent or received; the stored request's tokens are reported as saved instead
+    stats = {**entry["stats"], "requests": 0, "retries": 0, "cached": True, "latency_ms": 0,
+             "latency_saved_ms": entry["latency_ms"]}
+    for field in ("prompt_tokens", "output_tokens"):
+        if field in stats:
+            stats[f"{field}_saved"] = stats[field] or 0
+            stats[field] = 0
+    return entry["text"], stats
+
+
+def _store(cache, key, text: str, stats: dict, accept):
+    stats["cached"] = False
+    if cache is None:
+        return
+    try:
+        cache.add_counters(misses=1)
+        if accept is None or accept(text):
+            cache.set(key, {"text": text, "latency_ms": stats.get("latency_ms", 0), "stats": stats,
+                            "stored_at": time.time()})
+    except Exception as e:
+        print(f"LLM cache write failed: {e}")
+
+
+def cached_completion(provider: str, model: str, prompt: str, config: dict, complete, accept=None):
+    """
+    Text for `prompt` from the cache, or from `complete()` -> (text, stats)
+    on a miss. Only responses `accept(text)` agrees with are stored, so a
+    malformed completion is retried next time rather than replayed.
+    Returns (text, stats); stats["cached"] says which it was.
+    """
+    cache = get_llm_cache()
+    key = llm_cache_key(provider, model, prompt, config) if cache is not None else None
+    hit = _cached(cache, key, prompt) if cache is not None else None
+    if hit is not None:
+        return hit
+    text, stats = complete()
+    _store(cache, key, text, stats, accept)
+    return text, stats
+
+
+async def cached_completion_async(provider: str, model: str, prompt: str, config: dict, complete, accept=None):
+    """
+    cached_completion for coroutines: `complete()` returns an awaitable of
+    (text, stats). Cache reads and writes run in a worker thread, so SQLite
+    never blocks the event loop.
+    """
+    cache = get_llm_cache()
+    key = llm_cache_key(provider, model, prompt, config) if cache is not None else None
+    hit = await asyncio.to_thread(_cached, cache, key, prompt) if cache is not None else None
+    if hit is not None:
+        return hit
+    text, stats = await complete()
+    if cache is None:
+        _store(cache, key, text, stats, accept)
+    else:
+        await asyncio.to_thread(_store, cache, key, text, stats, accept)
+    return text, stats
+
+
+def llm_cache_metrics():
+    """Hit rate, bytes and latency saved, summed over every process sharing the cache file."""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    counters = cache.counters()
+    hits, misses = int(counters.get("hits", 0)), int(counters.get("misses", 0))
+    return {
+        "enabled": True,
+        "entries": len(cache),
+        "size_bytes": cache.size_bytes(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "bytes_saved": int(counters.get("bytes_saved", 0)),
+        "latency_saved_ms": int(counters.get("latency_saved_ms", 0))
+    }
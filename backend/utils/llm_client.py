@@ -1,6 +1,8 @@
 import os
+import time
 from groq import Groq
 from dotenv import load_dotenv
+from utils.llm_cache import cached_completion
 
 load_dotenv()
 
@@ -10,6 +12,8 @@ if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY must be set in environment variables for AI code generation.")
 
 groq_client = Groq(api_key=GROQ_API_KEY)
+GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+SYSTEM_PROMPT = "You are an expert web developer AI that generates complete HTML files."
 
 def generate_code_with_llm(srs_content: str, user_arguments: str) -> str:
     """
@@ -36,24 +40,33 @@ def generate_code_with_llm(srs_content: str, user_arguments: str) -> str:
     Based on the above, generate the complete HTML file. Do NOT include any markdown backticks or language specifiers (e.g., ```html). Just output the raw HTML content.
     """
 
-    try:
+    config = {"system": SYSTEM_PROMPT, "temperature": 0.7, "max_tokens": 4000}
+
+    def complete():
+        started = time.perf_counter()
         chat_completion = groq_client.chat.completions.create(
             messages=[
                 {
                     "role": "system",
-                    "content": "You are an expert web developer AI that generates complete HTML files.",
+                    "content": SYSTEM_PROMPT,
                 },
                 {
                     "role": "user",
                     "content": prompt,
                 },
             ],
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            temperature=0.7,
-            max_tokens=4000,
+            model=GROQ_MODEL,
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"],
         )
-        generated_code = chat_completion.choices[0].message.content
-        print("AI Code Generation successful.")
+        return chat_completion.choices[0].message.content, {
+            "latency_ms": int((time.perf_counter() - started) * 1000)
+        }
+
+    try:
+        generated_code, stats = cached_completion("groq", GROQ_MODEL, prompt, config, complete,
+                                                  accept=lambda text: bool(text and text.strip()))
+        print("AI Code Generation successful." + (" (cached)" if stats["cached"] else ""))
         return generated_code
     except Exception as e:
         print(f"Error generating code with LLM: {e}")
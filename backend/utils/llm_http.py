@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import importlib.util
+import httpx
+
+# Pooled connections to the LLM provider, shared by every thread and event loop in the process
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+# Attempts after the first on 429, 5xx and transport errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+# Consecutive failed calls that open the breaker, and how long it stays open before a trial call
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Streamed lines waiting for an async caller; past this the stream is read no further until it catches up
+LLM_STREAM_BUFFER_LINES = int(os.getenv("LLM_STREAM_BUFFER_LINES", "64"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider failed too often recently; the call was not attempted."""
+
+
+class LLMHTTPError(RuntimeError):
+    def __init__(self, status_code, body):
+        super().__init__(f"LLM request failed with HTTP {status_code}: {body[:500]}")
+        self.status_code = status_code
+
+
+def backoff_seconds(attempt: int, retry_after=None) -> float:
+    """Full-jitter exponential backoff; a Retry-After header is honoured up to LLM_BACKOFF_MAX_SECONDS."""
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Closed until `failures` calls in a row fail, then open (calls fail
+    fast) for `reset_seconds`; after that one trial call is let through,
+    and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_seconds else "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_cancelled(self):
+        """A call the caller abandoned says nothing about the provider; it only gives up the trial."""
+        with self._lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_running or self.consecutive_failures >= self.failures:
+                if self.opened_at is None or self.trial_running:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class LLMHTTPClient:
+    """
+    One pooled httpx.AsyncClient (HTTP/2 where the server offers it) on a
+    private event loop thread. Worker threads use the blocking post_json
+    and post_lines; coroutines on any other loop await post_json_async and
+    post_lines_async. Both submit to that loop, so every call shares the
+    same connections and TLS sessions and no caller's loop is blocked.
+    """
+
+    def __init__(self, timeout_seconds: float = 90):
+        self.timeout_seconds = timeout_seconds
+        self.breaker = CircuitBreaker()
+        self.metrics = {"calls": 0, "failures": 0, "retries": 0, "rejected": 0, "latency_ms": 0}
+        self._metrics_lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-http", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def _http_client(self):
+        # Created on the client loop, which every request runs on
+        if self._client is None:
+            http2 = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+            if LLM_HTTP2 and not http2:
+                print("LLM HTTP/2 unavailable (install httpx[http2]); using HTTP/1.1")
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(self.timeout_seconds, connect=10),
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_MAX_CONNECTIONS)
+            )
+        return self._client
+
+    def _record(self, stats, failed):
+        with self._metrics_lock:
+            self.metrics["calls"] += 1
+            self.metrics["failures"] += int(failed)
+            self.metrics["retries"] += stats["retries"]
+            self.metrics["latency_ms"] += stats["latency_ms"]
+
+    async def _request(self, url, body, on_line=None):
+        """
+        (json or None, stats): POST `body`, retrying what the provider may
+        recover from. With `on_line`, the response is streamed and each line
+        is awaited through it instead.
+        """
+        if not self.breaker.allow():
+            with self._metrics_lock:
+                self.metrics["rejected"] += 1
+            raise CircuitOpenError(f"LLM circuit open after {self.breaker.consecutive_failures} failed calls")
+        client = self._http_client()
+        stats = {"retries": 0}
+        started = time.perf_counter()
+        # "failed" counts against the provider; a request it rejected as invalid, or one the caller
+        # cancelled, does not
+        outcome = "failed"
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                retry_after = None
+                delivering = False
+                try:
+                    async with client.stream("POST", url, json=body) as response:
+                        stats["http_version"] = response.http_version
+                        stats["status"] = response.status_code
+                        if response.status_code == 200:
+                            if on_line is None:
+                                data = json.loads(await response.aread())
+                            else:
+                                data = None
+                                delivering = True
+                                async for line in response.aiter_lines():
+                                    await on_line(line)
+                            outcome = "ok"
+                            return data, stats
+                        error_body = (await response.aread()).decode("utf-8", "replace")
+                        if response.status_code not in RETRY_STATUSES:
+                            outcome = "rejected"
+                            raise LLMHTTPError(response.status_code, error_body)
+                        retry_after = response.headers.get("retry-after")
+                        error = LLMHTTPError(response.status_code, error_body)
+                except httpx.TransportError as e:
+                    # Lines already delivered cannot be taken back, so a broken stream is not retried
+                    if delivering:
+                        raise
+                    error = e
+                if attempt == LLM_MAX_RETRIES:
+                    raise error
+                stats["retries"] += 1
+                delay = backoff_seconds(attempt, retry_after)
+                print(f"LLM request failed ({error}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            stats["latency_ms"] = int((time.perf_counter() - started) * 1000)
+            if outcome == "failed":
+                self.breaker.record_failure()
+            elif outcome == "cancelled":
+                self.breaker.record_cancelled()
+            else:
+                self.breaker.record_success()
+            self._record(stats, outcome != "ok")
+
+    def _submit(self, url, body, on_line=None):
+        return asyncio.run_coroutine_threadsafe(self._request(url, body, on_line), self._ensure_loop())
+
+    def post_json(self, url: str, body: dict):
+        """Blocking POST for worker threads. Returns (response json, stats)."""
+        return self._submit(url, body).result()
+
+    def post_lines(self, url: str, body: dict, on_line):
+        """
+        Blocking streamed POST: `on_line` gets each response line, on the
+        client's loop thread. Only failures before the response starts are
+        retried, so no line is delivered twice.
+        """
+        async def deliver(line):
+            on_line(line)
+
+        return self._submit(url, body, deliver).result()
+
+    async def post_json_async(self, url: str, body: dict):
+        """post_json for coroutines: awaits the request without holding a thread."""
+        return await asyncio.wrap_future(self._submit(url, body))
+
+    async def post_lines_async(self, url: str, body: dict, on_line):
+        """
+        post_lines for coroutines. `on_line` runs on the caller's event loop,
+        in order, and every call has run by the time this returns. Lines pass
+        through a bounded queue, so a slow `on_line` holds the stream back;
+        if it raises, the request is cancelled and the error re-raised here.
+        """
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue(maxsize=LLM_STREAM_BUFFER_LINES)
+
+        async def deliver(line):
+            # Runs on the client loop: waits there while the caller's queue is full
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(lines.put(line), loop))
+
+        request = asyncio.wrap_future(self._submit(url, body, deliver))
+        line = None
+        try:
+            # Every put completes before the request does, so a finished request leaves only its last lines
+            while not (request.done() and lines.empty()):
+                line = asyncio.ensure_future(lines.get())
+                await asyncio.wait({line, request}, return_when=asyncio.FIRST_COMPLETED)
+                if line.done():
+                    on_line(line.result())
+                else:
+                    line.cancel()
+        except BaseException:
+            if line is not None:
+                line.cancel()
+            request.cancel()
+            raise
+        return request.result()
+
+    def metrics_snapshot(self) -> dict:
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        metrics["breaker"] = self.breaker.state
+        metrics["breaker_opens"] = self.breaker.opens
+        metrics["average_latency_ms"] = round(metrics["latency_ms"] / metrics["calls"]) if metrics["calls"] else 0
+        return metrics
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_http_client(timeout_seconds: float = 90) -> LLMHTTPClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMHTTPClient(timeout_seconds)
+    return _client
+
+
+def llm_http_metrics() -> dict:
+    """Calls, retries, failures and breaker state for this process; empty until the first call."""
+    return _client.metrics_snapshot() if _client is not None else {"calls": 0}
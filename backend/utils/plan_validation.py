@@ -0,0 +1,178 @@
+import re
+
+# Actions execute_test knows how to run
+SUPPORTED_ACTIONS = {"goto", "click", "type", "assert", "login"}
+# Actions that change the page, after which the load-time DOM no longer describes it
+MUTATING_ACTIONS = {"goto", "click", "type", "login"}
+
+# Selector engines only Playwright understands; these are never checked against the index
+_PLAYWRIGHT_PREFIXES = ("text=", "xpath=", "id=", "data-testid=", "role=", "internal:", "//", "..")
+_IDENT = r"(?:\\.|[\w-])+"
+_SIMPLE = re.compile(rf"(#{_IDENT})|(\.{_IDENT})|(\[[^\]]*\])|(::?[\w-]+)|({_IDENT}|\*)")
+_NAME_ATTR = re.compile(r"""^\[\s*name\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s\]]+))\s*(?:[is]\s*)?\]$""")
+_UNESCAPE = re.compile(r"\\(.)")
+
+
+def _split_top_level(selector: str, separators: str):
+    """Split on any of `separators` outside brackets, parentheses and quotes."""
+    parts, current, depth, quote = [], [], 0, None
+    for char in selector:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 0 and char in separators:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if depth or quote:
+        return None
+    parts.append("".join(current))
+    return parts
+
+
+def _strip_arguments(compound: str) -> str:
+    """Drop pseudo-class arguments such as :not(.a) or :has-text("x"), which say nothing about existence."""
+    out, depth = [], 0
+    for char in compound:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            out.append(char)
+    return "".join(out)
+
+
+def _compound_reason(compound: str, dom_map):
+    """Why this compound selector matches no element on the page, or None if it might."""
+    compound = _strip_arguments(compound)
+    reason = None
+    position = 0
+    while position < len(compound):
+        match = _SIMPLE.match(compound, position)
+        if not match:
+            # Syntax this check does not model (namespaces, nesting): assume it can match
+            return None
+        position = match.end()
+        if reason:
+            continue
+        id_part, class_part, attr_part, _, tag_part = match.groups()
+        if id_part:
+            value = _UNESCAPE.sub(r"\1", id_part[1:])
+            if value not in dom_map.all_ids:
+                reason = f"no element with id '{value}'"
+        elif class_part:
+            value = _UNESCAPE.sub(r"\1", class_part[1:])
+            if value not in dom_map.all_classes:
+                reason = f"no element with class '{value}'"
+        elif attr_part:
+            name = _NAME_ATTR.match(attr_part)
+            if name:
+                value = next(v for v in name.groups() if v is not None)
+                if value not in dom_map.all_names:
+                    reason = f"no element named '{value}'"
+        elif tag_part and tag_part != "*" and match.start() == 0:
+            if tag_part.lower() not in dom_map.all_tags:
+                reason = f"no <{tag_part.lower()}> element"
+    return reason
+
+
+def _css_part(selector: str):
+    """The plain CSS in a selector, or None for selectors using Playwright's own engines."""
+    selector = selector.strip()
+    if selector.startswith("css="):
+        selector = selector[4:]
+    if ">>" in selector or selector.startswith(_PLAYWRIGHT_PREFIXES) or selector.startswith("("):
+        return None
+    return selector
+
+
+def selector_syntax_error(selector: str):
+    css = _css_part(selector)
+    if css is not None and _split_top_level(css, ",") is None:
+        return f"Selector {selector} is not valid CSS: unbalanced brackets or quotes"
+    return None
+
+
+def selector_reason(selector: str, dom_map):
+    """
+    Why `selector` cannot match anything in `dom_map`, or None when it
+    might. Conservative: only plain CSS is checked, and only its ids,
+    classes, tags and [name=] attributes, so anything unusual passes.
+    """
+    css = _css_part(selector)
+    alternatives = _split_top_level(css, ",") if css is not None else None
+    if not alternatives:
+        return None
+    reasons = []
+    for alternative in alternatives:
+        compounds = _split_top_level(alternative.strip(), " >+~\t\n")
+        if compounds is None:
+            return None
+        reason = next((r for r in (_compound_reason(c, dom_map) for c in compounds if c) if r), None)
+        if reason is None:
+            return None
+        reasons.append(reason)
+    return "; ".join(reasons)
+
+
+def validate_testcase(testcase: dict, dom_map=None, check_dom=True):
+    """
+    Reason the testcase cannot possibly run, or None if it is viable.
+    The DOM checks only apply when `check_dom` says the testcase runs on
+    the page as loaded, and `dom_map` saw every element of it.
+    """
+    action = testcase.get("action")
+    selector = testcase.get("selector")
+    if action not in SUPPORTED_ACTIONS:
+        return f"Unsupported action {action!r}"
+    if action == "goto":
+        return None
+    if not isinstance(selector, str) or not selector.strip():
+        return f"A {action} step needs a selector"
+    if action == "login":
+        fields = [f for f in selector.split(",") if f.strip()]
+        if len(fields) < 2:
+            return "A login step needs username and password selectors"
+        return None
+    syntax_error = selector_syntax_error(selector)
+    if syntax_error:
+        return syntax_error
+    if check_dom and dom_map is not None and getattr(dom_map, "complete", False):
+        reason = selector_reason(selector, dom_map)
+        if reason:
+            return f"Selector {selector} matches nothing on the loaded page: {reason}"
+    return None
+
+
+def validate_plan(testcases: list, dom_map=None, mutated=False) -> dict:
+    """
+    Map of testcase index to (reason, from_dom) for every invalid testcase;
+    `from_dom` marks verdicts that rest on the DOM index alone. Selectors
+    are only checked against the index until the first state-changing step
+    (or on freshState steps, which reload the page first): later steps
+    may target elements the earlier ones make appear. `mutated` says the
+    page has already changed before the first of `testcases` runs.
+    """
+    invalid = {}
+    for i, tc in enumerate(testcases):
+        check_dom = not mutated or bool(tc.get("freshState"))
+        reason = validate_testcase(tc, dom_map, check_dom=False)
+        if reason:
+            invalid[i] = (reason, False)
+            continue
+        reason = validate_testcase(tc, dom_map) if check_dom else None
+        if reason:
+            invalid[i] = (reason, True)
+        elif tc.get("action") in MUTATING_ACTIONS:
+            mutated = True
+    return invalid
@@ -0,0 +1,65 @@
+import os
+
+
+def available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where that is not readable."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_map():
+    """ppid -> [pid] for every process visible in /proc (empty off Linux)."""
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are positional.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def descendants(pid, children=None):
+    children = child_map() if children is None else children
+    found, stack = set(), [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+
+def rss_mb(pids):
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb // 1024
+
+
+def process_tree_rss_mb(pid=None):
+    """Resident memory of `pid` (default: this process) plus all of its descendants."""
+    pid = os.getpid() if pid is None else pid
+    return rss_mb({pid} | descendants(pid))
@@ -0,0 +1,51 @@
+import os
+import hashlib
+import threading
+from utils.disk_cache import DiskCache, cache_key
+
+# Off by default: a hit replays earlier results without touching the site
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+# Anchored to the backend directory, like the run artifacts, so every process shares one file
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "temp", "cache", "results.db")))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+
+# Results with these statuses say nothing about the site and are never replayed
+UNCACHEABLE_STATUSES = {"error", "skipped"}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def result_cache_key(srs_hash: str, url: str, fingerprint: dict, test_type: str) -> str:
+    """
+    Identical SRS content, target URL, rendered DOM, test type and
+    prompt/model version give identical keys.
+    """
+    return cache_key("results", srs_hash, url, fingerprint["dom_hash"], test_type,
+                     fingerprint["model"], fingerprint["prompt_version"])
+
+
+def cacheable(results: list) -> bool:
+    return bool(results) and not any(r.get("status") in UNCACHEABLE_STATUSES for r in results)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache, or None when RESULT_CACHE_ENABLED is off."""
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(RESULT_CACHE_PATH, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_ENTRIES)
+    return _cache
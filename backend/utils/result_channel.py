@@ -0,0 +1,115 @@
+import json
+import time
+import socket
+import asyncio
+
+# Longest single record the server accepts (a result's details can carry page text)
+MAX_RECORD_BYTES = 16 * 1024 * 1024
+
+
+class ResultChannelWriter:
+    """
+    Runner side of the result channel: one JSON record per line over a
+    loopback TCP connection to the server that started the run. Records
+    never touch stdout, so logging cannot corrupt them.
+    """
+
+    def __init__(self, address: str):
+        host, port = address.rsplit(":", 1)
+        self._sock = socket.create_connection((host, int(port)))
+
+    def emit(self, record_type: str, **fields):
+        record = {"type": record_type, "ts": time.time(), **fields}
+        line = json.dumps(record, default=str) + "\n"
+        self._sock.sendall(line.encode("utf-8"))
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class NullChannel:
+    """Used when a runner is started without a channel, e.g. from the command line."""
+
+    def emit(self, record_type: str, **fields):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_channel(address: str = None):
+    if not address:
+        return NullChannel()
+    try:
+        return ResultChannelWriter(address)
+    except OSError as e:
+        print(f"[ResultChannel] Could not connect to {address}: {e}")
+        return NullChannel()
+
+
+class ResultChannelServer:
+    """
+    Server side: accepts one connection per test type and hands each record
+    to `on_record` as soon as it arrives. Result records are also kept so
+    `collect()` can return a type's results in plan order.
+    """
+
+    def __init__(self, on_record=None):
+        self.on_record = on_record
+        self.address = None
+        self._server = None
+        self._results = {}
+        self._finished = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0, limit=MAX_RECORD_BYTES)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.address = f"{host}:{port}"
+        return self
+
+    def _finished_event(self, test_type):
+        return self._finished.setdefault(test_type, asyncio.Event())
+
+    async def _handle(self, reader, writer):
+        test_type = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"[ResultChannel] Dropping malformed record: {e}")
+                    continue
+
+                test_type = record.get("test_type", test_type)
+                if record["type"] == "result":
+                    self._results.setdefault(test_type, []).append((record.get("index", 0), record["result"]))
+                if self.on_record:
+                    try:
+                        self.on_record(record)
+                    except Exception as e:
+                        print(f"[ResultChannel] Record handler failed: {e}")
+        finally:
+            writer.close()
+            if test_type is not None:
+                self._finished_event(test_type).set()
+
+    async def collect(self, test_type: str, timeout: float = 5.0):
+        """Results received for `test_type`, ordered by plan index, once its runner has disconnected."""
+        try:
+            await asyncio.wait_for(self._finished_event(test_type).wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[ResultChannel] {test_type} channel still open after {timeout}s, using what arrived")
+        records = sorted(self._results.get(test_type, []), key=lambda item: item[0])
+        return [result for _, result in records]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,198 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import threading
+
+# How often a run's tail reads new test_execution_logs rows and re-reads the report's status, and how
+# long it outlives its last subscriber, so a browser reconnecting after a stream ends finds it running
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "0.75"))
+EVENTS_STATUS_SECONDS = float(os.getenv("EVENTS_STATUS_SECONDS", "3"))
+EVENTS_TAIL_IDLE_SECONDS = float(os.getenv("EVENTS_TAIL_IDLE_SECONDS", "15"))
+EVENTS_BATCH_SIZE = 200
+# EventSource cannot send headers, so a stream is opened with a short-lived token scoped to one run;
+# the session JWT never goes in a URL, where access logs would keep it
+EVENTS_TOKEN_TTL_SECONDS = int(os.getenv("EVENTS_TOKEN_TTL_SECONDS", "300"))
+EVENTS_TOKEN_SECRET = os.getenv("EVENTS_TOKEN_SECRET") or os.getenv("SUPABASE_KEY", "")
+
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def sse_event(event: str, data, event_id=None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(EVENTS_TOKEN_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_stream_token(test_run_id, user_id, ttl_seconds: int = None) -> str:
+    """Signed token that opens the event stream of one run, for `ttl_seconds`."""
+    ttl_seconds = EVENTS_TOKEN_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    claims = {"run": str(test_run_id), "sub": user_id, "exp": int(time.time() + ttl_seconds)}
+    payload = _b64(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_stream_token(token: str, test_run_id):
+    """(user_id, None) for a valid token of this run, else (None, "expired" or "invalid")."""
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None, "invalid"
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None, "invalid"
+    if claims.get("run") != str(test_run_id) or not claims.get("sub"):
+        return None, "invalid"
+    if claims.get("exp", 0) < time.time():
+        return None, "expired"
+    return claims["sub"], None
+
+
+class RunEventTail:
+    """
+    One poller per run and process, shared by every open stream of the run.
+    It tails test_execution_logs by seq and re-reads the report's status now
+    and then, keeping each event formatted once; a subscriber replays what
+    it has not seen yet and then waits for more, without querying Supabase.
+    """
+
+    def __init__(self, client, test_run_id, status: str):
+        self.client = client
+        self.test_run_id = test_run_id
+        self.status = status
+        # (seq, event, sse text); seq is None for status and done events
+        self.events = []
+        self.finished = False
+        self.subscribers = 0
+        self.idle_since = time.monotonic()
+        self._cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._poll, name=f"run-events-{self.test_run_id}", daemon=True).start()
+        return self
+
+    def replay(self, cursor: int):
+        """(status, texts, position, finished): the stage and result events after `cursor`, and the done event."""
+        with self._cond:
+            texts = [text for seq, event, text in self.events
+                     if (seq is not None and seq > cursor) or event == "done"]
+            return self.status, texts, len(self.events), self.finished
+
+    def wait(self, position: int, timeout: float):
+        """(texts, position, finished): events published after `position`, waiting up to `timeout` for some."""
+        with self._cond:
+            if position == len(self.events) and not self.finished:
+                self._cond.wait(timeout)
+            return [text for _, _, text in self.events[position:]], len(self.events), self.finished
+
+    def _publish(self, events, finished=False):
+        with self._cond:
+            self.events.extend(events)
+            self.finished = self.finished or finished
+            self._cond.notify_all()
+
+    def _read_rows(self, cursor):
+        return self.client.table('test_execution_logs') \
+            .select('seq, test_type, event_type, message, status, details, timestamp') \
+            .eq('report_id', self.test_run_id) \
+            .gt('seq', cursor) \
+            .in_('event_type', ['stage', 'result']) \
+            .order('seq') \
+            .limit(EVENTS_BATCH_SIZE) \
+            .execute().data or []
+
+    def _poll(self):
+        cursor = 0
+        status_checked_at = 0
+        finishing = False
+        while True:
+            try:
+                rows = self._read_rows(cursor)
+                events = []
+                for row in rows:
+                    cursor = row['seq']
+                    if row['event_type'] == 'result':
+                        data = {"test_type": row['test_type'], "result": row['details']}
+                    else:
+                        data = {"test_type": row['test_type'], "stage": row['message'], **(row['details'] or {}),
+                                "timestamp": row['timestamp']}
+                    events.append((cursor, row['event_type'], sse_event(row['event_type'], data, cursor)))
+                if events:
+                    self._publish(events)
+                if len(rows) == EVENTS_BATCH_SIZE:
+                    continue
+
+                # The report row only needs checking now and then; results arrive through the log rows
+                if time.monotonic() - status_checked_at >= EVENTS_STATUS_SECONDS:
+                    status_checked_at = time.monotonic()
+                    report = self.client.table('test_reports').select('status, summary') \
+                        .eq('id', self.test_run_id).single().execute().data
+                    if report['status'] != self.status:
+                        self.status = report['status']
+                        self._publish([(None, "status", sse_event("status", {"status": self.status}))])
+                    if self.status in FINAL_STATUSES:
+                        if finishing:
+                            done = {"status": self.status, "summary": report.get('summary') or {}}
+                            self._publish([(None, "done", sse_event("done", done))], finished=True)
+                            _forget(self)
+                            return
+                        # Tail once more: rows written just before the status flipped may not have been read yet
+                        finishing = True
+                        status_checked_at = 0
+                        continue
+            except Exception as e:
+                print(f" Event tail of {self.test_run_id} failed to read, retrying: {e}")
+
+            if not _still_watched(self):
+                return
+            time.sleep(EVENTS_POLL_SECONDS)
+
+
+_tails = {}
+_tails_lock = threading.Lock()
+
+
+def subscribe(client, test_run_id, status: str) -> RunEventTail:
+    """The run's shared tail, started on first use; pair with unsubscribe()."""
+    with _tails_lock:
+        tail = _tails.get(test_run_id)
+        if tail is None:
+            tail = _tails[test_run_id] = RunEventTail(client, test_run_id, status).start()
+        tail.subscribers += 1
+    return tail
+
+
+def unsubscribe(tail: RunEventTail):
+    with _tails_lock:
+        tail.subscribers -= 1
+        if tail.subscribers == 0:
+            tail.idle_since = time.monotonic()
+
+
+def _still_watched(tail: RunEventTail) -> bool:
+    """False, and the tail is dropped, once it has had no subscriber for EVENTS_TAIL_IDLE_SECONDS."""
+    with _tails_lock:
+        if tail.subscribers or time.monotonic() - tail.idle_since < EVENTS_TAIL_IDLE_SECONDS:
+            return True
+        if _tails.get(tail.test_run_id) is tail:
+            del _tails[tail.test_run_id]
+        return False
+
+
+def _forget(tail: RunEventTail):
+    # A finished tail keeps serving the streams that hold it; new ones start a fresh tail
+    with _tails_lock:
+        if _tails.get(tail.test_run_id) is tail:
+            del _tails[tail.test_run_id]
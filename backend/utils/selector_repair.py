@@ -0,0 +1,188 @@
+import os
+import re
+import math
+
+# Smallest trigram similarity (0..1) at which a real element replaces a missing selector;
+# calibrated so random selectors over a page's own vocabulary are not "repaired"
+REPAIR_MIN_SCORE = float(os.getenv("REPAIR_MIN_SCORE", "0.65"))
+# Weight of containment (the share of the query's trigrams found in a term), so "Send" finds "Send message"
+CONTAINMENT_WEIGHT = 0.8
+# Shorter query terms match too much of any page to be worth repairing from
+MIN_QUERY_CHARS = 3
+# Postings read per query term; past this the lookup settles for the candidates found so far
+MAX_POSTINGS_SCANNED = int(os.getenv("REPAIR_MAX_POSTINGS_SCANNED", "5000"))
+
+# Elements whose text names them; a container's text is its whole subtree and is left out
+TEXT_LABEL_TAGS = {"a", "button", "label", "input", "textarea", "select"}
+
+# Elements each action can sensibly target
+ACTION_TAGS = {
+    "type": {"input", "textarea"},
+    "click": {"input", "button", "a", "div", "img", "label", "select", "textarea"},
+    "assert": {"input", "button", "a", "form", "div", "img", "label", "textarea", "select"},
+}
+
+# Tags that stand in for each other: a submit button is often an <input type=submit>
+TAG_EQUIVALENTS = {"button": {"button", "input"}, "input": {"input", "button"}}
+
+_WORD_BREAK = re.compile(r"([a-z0-9])([A-Z])")
+_SEPARATORS = re.compile(r"[\W_]+")
+_IDENT = r"((?:\\.|[\w-])+)"
+# What each part of a selector names, and so which kind of term it may be repaired to:
+# "key" is an id or name attribute, "class" a class, "text" a label or visible text
+_QUERY_PARTS = [
+    ("key", re.compile(rf"#{_IDENT}")),
+    ("class", re.compile(rf"\.{_IDENT}")),
+    ("key", re.compile(r"""\[\s*name\s*[~|^$*]?=\s*["']?([^"'\]]+)["']?\s*\]""")),
+    ("text", re.compile(r"""\[\s*(?:placeholder|aria-label|title|alt|value)\s*[~|^$*]?=\s*["']?([^"'\]]+)["']?\s*\]""")),
+    ("text", re.compile(r"""(?:^|>>\s*)text\s*=\s*["']?([^"'>]+)["']?""")),
+    ("text", re.compile(r""":(?:has-text|text|text-is)\(\s*["']([^"']+)["']\s*\)""")),
+]
+# A leading tag name; "text=..." and other selector engine prefixes are not tags
+_LEADING_TAG = re.compile(r"^\s*([a-zA-Z][a-zA-Z0-9-]*)\b(?!\s*=)")
+
+
+def normalize_term(term: str) -> str:
+    """submitBtn, submit-btn and "Submit btn" all become "submit btn"."""
+    term = _WORD_BREAK.sub(r"\1 \2", term.replace("\\", ""))
+    return " ".join(_SEPARATORS.sub(" ", term).lower().split())
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[k:k + 3] for k in range(len(padded) - 2)}
+
+
+def query_terms(selector: str):
+    """([(kind, term)], tag) a broken selector asks for: its ids, classes, names, labels and text."""
+    terms = []
+    for kind, pattern in _QUERY_PARTS:
+        terms.extend((kind, normalize_term(m.group(1))) for m in pattern.finditer(selector))
+    tag = _LEADING_TAG.match(selector)
+    return [(k, t) for k, t in terms if len(t) >= MIN_QUERY_CHARS], tag.group(1).lower() if tag else None
+
+
+def tag_matches(tag, candidate_tag) -> bool:
+    return tag is None or candidate_tag in TAG_EQUIVALENTS.get(tag, {tag})
+
+
+class TermIndex:
+    """
+    Trigram index over distinct terms of one kind. Each term is indexed
+    once, whichever elements carry it; postings map a trigram to the terms
+    containing it, so a query only touches terms sharing trigrams with it.
+    """
+
+    def __init__(self):
+        self.terms = []
+        self.term_ids = {}
+        self.term_grams = []
+        self.term_targets = []
+        self.postings = {}
+
+    def add(self, term, target):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            grams = frozenset(trigrams(term))
+            self.terms.append(term)
+            self.term_grams.append(grams)
+            self.term_targets.append([])
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(term_id)
+        self.term_targets[term_id].append(target)
+
+    def search(self, term: str, min_score: float):
+        """
+        [(term id, score)] for terms at least `min_score` similar to `term`:
+        Jaccard, or weighted containment if higher. Both are at most
+        shared / len(grams), so a match shares at least `need` of the
+        query's trigrams that occur at all, and so one of the rarest
+        len(present) - need + 1 of them; only those postings are read, up
+        to MAX_POSTINGS_SCANNED.
+        """
+        grams = trigrams(term)
+        need = max(1, math.ceil(min_score * len(grams) - 1e-9))
+        present = [gram for gram in grams if gram in self.postings]
+        if len(present) < need:
+            return []
+        rarest = sorted(present, key=lambda gram: len(self.postings[gram]))[:len(present) - need + 1]
+        candidates, scanned = set(), 0
+        for gram in rarest:
+            postings = self.postings[gram]
+            candidates.update(postings[:MAX_POSTINGS_SCANNED - scanned])
+            scanned += len(postings)
+            if scanned >= MAX_POSTINGS_SCANNED:
+                break
+        matches = []
+        for term_id in candidates:
+            term_grams = self.term_grams[term_id]
+            shared = len(grams & term_grams)
+            if shared < need:
+                continue
+            score = max(shared / (len(grams) + len(term_grams) - shared), CONTAINMENT_WEIGHT * shared / len(grams))
+            if score >= min_score:
+                matches.append((term_id, score))
+        return matches
+
+
+class SelectorRepairIndex:
+    """
+    Trigram indexes over the ids and names, classes, and labels and text of
+    every uniquely selectable element in a DomIndex. A broken selector is
+    only repaired from terms of the kind it names (an id is not replaced by
+    some element's text) and, when it names a tag, to an element of that tag.
+    """
+
+    def __init__(self, dom_map):
+        self.targets = []
+        self.kinds = {"key": TermIndex(), "class": TermIndex(), "text": TermIndex()}
+        for record in dom_map.records:
+            selector = record.selector()
+            if not selector or not dom_map.is_unique(selector):
+                continue
+            position = len(self.targets)
+            self.targets.append((selector, record.tag))
+            terms = [("key", record.id), ("key", record.name),
+                     ("text", record.label if record.tag in TEXT_LABEL_TAGS else None),
+                     ("text", dom_map.labels_for.get(record.id) if record.id else None)]
+            terms.extend(("class", c) for c in record.classes)
+            for kind, term in {(kind, normalize_term(t)) for kind, t in terms if t}:
+                if term:
+                    self.kinds[kind].add(term, position)
+
+    @classmethod
+    def of(cls, dom_map):
+        """
+        The repair index kept with `dom_map`, built on first use so a plan
+        validated one testcase at a time indexes the page once.
+        """
+        if dom_map.repair_index is None:
+            dom_map.repair_index = cls(dom_map)
+        return dom_map.repair_index
+
+    def __len__(self):
+        return len(self.targets)
+
+    def repair(self, selector: str, action: str = None):
+        """
+        (selector, score) of the closest real element to a selector that
+        matches nothing, or None when no element is close enough.
+        """
+        terms, tag = query_terms(selector)
+        allowed = ACTION_TAGS.get(action)
+        best, best_score = None, 0.0
+        for kind, term in terms:
+            index = self.kinds[kind]
+            for term_id, score in index.search(term, REPAIR_MIN_SCORE):
+                if score <= best_score:
+                    continue
+                for target in index.term_targets[term_id]:
+                    candidate, candidate_tag = self.targets[target]
+                    if (allowed and candidate_tag not in allowed) or not tag_matches(tag, candidate_tag):
+                        continue
+                    best, best_score = candidate, score
+                    break
+        if best is None or best == selector:
+            return None
+        return best, round(min(best_score, 1.0), 3)
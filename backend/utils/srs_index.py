@@ -0,0 +1,234 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from utils.disk_cache import DiskCache, cache_key
+
+# Send each test type only its most relevant SRS sections instead of the whole document
+SRS_RETRIEVAL_ENABLED = os.getenv("SRS_RETRIEVAL_ENABLED", "true").lower() == "true"
+SRS_TOP_K = int(os.getenv("SRS_TOP_K", "8"))
+# Documents shorter than this are sent whole: there is nothing worth cutting
+SRS_RETRIEVAL_MIN_CHARS = int(os.getenv("SRS_RETRIEVAL_MIN_CHARS", "6000"))
+# Longer sections are split at line breaks so one chapter cannot take the whole budget
+MAX_SECTION_CHARS = int(os.getenv("SRS_MAX_SECTION_CHARS", "1500"))
+SRS_INDEX_CACHE_PATH = os.getenv("SRS_INDEX_CACHE_PATH", os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "temp", "cache", "srs.db")))
+SRS_INDEX_CACHE_TTL_SECONDS = float(os.getenv("SRS_INDEX_CACHE_TTL_SECONDS", str(30 * 86400)))
+SRS_INDEX_CACHE_MAX_ENTRIES = int(os.getenv("SRS_INDEX_CACHE_MAX_ENTRIES", "200"))
+# Bump when sectioning or tokenizing changes, so cached indexes are rebuilt
+SRS_INDEX_VERSION = "1"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# What each test type looks for in an SRS
+TYPE_QUERIES = {
+    "functional": "functional requirement feature user shall login logout register submit form input field "
+                  "validation workflow search create update delete account data",
+    "uiux": "user interface ui ux layout design navigation menu button page screen display responsive mobile "
+            "usability visual theme color font consistency feedback message",
+    "accessibility": "accessibility accessible wcag aria screen reader keyboard focus contrast alt text label "
+                     "disability assistive caption",
+    "compatibility": "compatibility browser chrome firefox safari edge device mobile tablet desktop platform "
+                     "operating system version resolution responsive",
+    "performance": "performance response time load speed fast latency second concurrent users throughput "
+                   "scalability availability cache page size",
+}
+
+_REQ_ID = re.compile(r"^\s*\[?((?:REQ|FR|NFR|UR|SR|PR|UI|SEC|PERF)[-_.]?\d+(?:\.\d+)*)\]?\b", re.IGNORECASE)
+_NUMBERED_HEADING = re.compile(r"^\s*(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z][^.:;]{1,80}$")
+_MARKDOWN_HEADING = re.compile(r"^\s*#{1,6}\s+\S")
+_CAPS_HEADING = re.compile(r"^\s*[A-Z][A-Z0-9 &/,()-]{3,60}$")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by can for from has have if in into is it its may must not of on or shall should that the
+their then there these this to was were when which will with within without all any each other than such
+""".split())
+
+
+def stem(word: str) -> str:
+    """Just enough stemming that "loads", "loaded" and "loading" meet."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    return [stem(w) for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS]
+
+
+def _is_heading(line: str) -> bool:
+    return bool(_MARKDOWN_HEADING.match(line) or _NUMBERED_HEADING.match(line) or _CAPS_HEADING.match(line))
+
+
+def _chunk(lines: list) -> list:
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) > MAX_SECTION_CHARS:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def split_sections(text: str) -> list:
+    """
+    [{"title", "text"}] in document order. A section starts at a heading
+    (numbered, markdown or all caps) or a requirement id (REQ-1, FR-2.3);
+    requirements keep the heading they sit under as part of their title.
+    A heading with no text of its own only titles what follows it.
+    """
+    sections = []
+    heading, title, lines = "", "", []
+
+    def close():
+        body = [l for l in lines if l.strip()]
+        if not body:
+            return
+        if len(body) == 1 and _is_heading(body[0]):
+            return
+        for chunk in _chunk(body):
+            sections.append({"title": title, "text": chunk})
+
+    for line in text.splitlines():
+        line = line.rstrip()
+        requirement = _REQ_ID.match(line)
+        if requirement or _is_heading(line):
+            close()
+            if requirement:
+                title = f"{heading} / {requirement.group(1)}" if heading else requirement.group(1)
+            else:
+                heading = title = " ".join(line.lstrip("# ").split())
+            lines = []
+        lines.append(line)
+    close()
+    return sections
+
+
+class SrsIndex:
+    """
+    BM25 index over the sections of one SRS. Postings map each term to
+    [section, term frequency] pairs; everything is plain lists and dicts,
+    so an index round-trips through JSON for the cache.
+    """
+
+    def __init__(self, sections: list, lengths: list = None, postings: dict = None):
+        self.sections = sections
+        if postings is None:
+            lengths, postings = [], {}
+            for position, section in enumerate(sections):
+                terms = tokenize(f"{section['title']} {section['text']}")
+                lengths.append(len(terms))
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, count in counts.items():
+                    postings.setdefault(term, []).append([position, count])
+        self.lengths = lengths
+        self.postings = postings
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0
+
+    @classmethod
+    def from_text(cls, text: str):
+        return cls(split_sections(text))
+
+    def to_dict(self) -> dict:
+        return {"sections": self.sections, "lengths": self.lengths, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["sections"], data["lengths"], data["postings"])
+
+    def __len__(self):
+        return len(self.sections)
+
+    def scores(self, query: str) -> list:
+        scores = [0.0] * len(self.sections)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.sections) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / (self.average_length or 1))
+                scores[position] += idf * count * (BM25_K1 + 1) / (count + norm)
+        return scores
+
+    def top(self, query: str, k: int = SRS_TOP_K) -> list:
+        """Positions of the `k` best sections; ties (and a query nothing matches) favour earlier sections."""
+        scores = self.scores(query)
+        return sorted(sorted(range(len(scores)), key=lambda n: (-scores[n], n))[:k])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_srs_index_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(SRS_INDEX_CACHE_PATH, SRS_INDEX_CACHE_TTL_SECONDS, SRS_INDEX_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def load_srs_index(srs_content: str):
+    """(index, cached): the SRS's index from the cache, built and stored on a miss."""
+    key = cache_key("srs_index", SRS_INDEX_VERSION, MAX_SECTION_CHARS,
+                    hashlib.sha256(srs_content.encode("utf-8")).hexdigest())
+    cache = get_srs_index_cache()
+    try:
+        data = cache.get(key)
+        if data is not None:
+            return SrsIndex.from_dict(data), True
+    except Exception as e:
+        print(f"SRS index cache read failed: {e}")
+    index = SrsIndex.from_text(srs_content)
+    try:
+        cache.set(key, index.to_dict())
+    except Exception as e:
+        print(f"SRS index cache write failed: {e}")
+    return index, False
+
+
+def section_text(section: dict) -> str:
+    """The section as prompted; requirements and split-off chunks are prefixed with their heading."""
+    if not section["title"] or section["text"].lstrip("# ").startswith(section["title"]):
+        return section["text"]
+    return f"{section['title']}\n{section['text']}"
+
+
+def type_query(test_type: str) -> str:
+    return f"{test_type} {TYPE_QUERIES.get(test_type, '')}"
+
+
+def relevant_context(srs_content: str, test_types: list):
+    """
+    (context, stats): the union of each test type's top SRS_TOP_K sections,
+    in document order, or the whole document when retrieval is off, the
+    document is short, or it has too few sections to choose from.
+    """
+    stats = {"srs_chars": len(srs_content), "context_chars": len(srs_content), "retrieval": False}
+    if not SRS_RETRIEVAL_ENABLED or len(srs_content) < SRS_RETRIEVAL_MIN_CHARS:
+        return srs_content, stats
+    index, cached = load_srs_index(srs_content)
+    if len(index) <= SRS_TOP_K:
+        return srs_content, stats
+    selected = sorted({n for t in test_types for n in index.top(type_query(t))})
+    # Page headers and footers repeat verbatim; each distinct section is sent once
+    context = "\n\n".join(dict.fromkeys(section_text(index.sections[n]) for n in selected))
+    stats.update(context_chars=len(context), retrieval=True, sections=len(index), sections_used=len(selected),
+                 index_cached=cached)
+    return context, stats
+
+
+def retrieval_fingerprint() -> str:
+    """What shapes the SRS context a prompt gets, for cache keys."""
+    if not SRS_RETRIEVAL_ENABLED:
+        return ""
+    return f"+srs{SRS_INDEX_VERSION}k{SRS_TOP_K}m{SRS_RETRIEVAL_MIN_CHARS}c{MAX_SECTION_CHARS}"
@@ -0,0 +1,191 @@
+import os
+import time
+import socket
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.job_queue import get_job_queue
+from utils.admission import get_admission_controller, node_memory_budget_mb
+from utils.resources import process_tree_rss_mb
+from utils.cancellation import request_cancel, clear_cancel
+from utils.execution_engine import get_engine
+from server import start_test_task, TEST_EXECUTION_ENGINE
+
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+REQUEUE_INTERVAL_SECONDS = int(os.getenv("REQUEUE_INTERVAL_SECONDS", "30"))
+RESOURCE_SAMPLE_SECONDS = float(os.getenv("RESOURCE_SAMPLE_SECONDS", "2"))
+JOB_CANCEL_POLL_SECONDS = float(os.getenv("JOB_CANCEL_POLL_SECONDS", "1"))
+# How often the worker reports its browser pool and load for the API's /health
+WORKER_STATUS_SECONDS = float(os.getenv("WORKER_STATUS_SECONDS", "15"))
+# Reported with each run so the API can size the fleet; measured before this worker runs anything
+WORKER_NODE = os.getenv("WORKER_NODE") or socket.gethostname()
+NODE_MEMORY_BUDGET_MB = node_memory_budget_mb()
+
+# Runs currently executing in this process; shared RSS is split between them
+_active_jobs = 0
+_active_lock = threading.Lock()
+
+
+def heartbeat_loop(queue, job_id, owner, stop_event, lease_lost):
+    """
+    Renew the lease until the run finishes. Once it cannot be renewed another
+    worker may take the job over, so `lease_lost` is set and the run stops.
+    """
+    renewed_at = time.monotonic()
+    while not stop_event.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            if queue.heartbeat(job_id, owner, JOB_LEASE_SECONDS):
+                renewed_at = time.monotonic()
+                continue
+            # Only running jobs are renewed; a cancelled one stops through its flag and still stores its report
+            if queue.status(job_id) == "cancelled":
+                request_cancel(job_id)
+            else:
+                print(f"[Worker {owner}] Lost lease on job {job_id}, stopping it")
+                lease_lost.set()
+            return
+        except Exception as e:
+            print(f"[Worker {owner}] Heartbeat failed for job {job_id}: {e}")
+            if time.monotonic() - renewed_at > JOB_LEASE_SECONDS:
+                print(f"[Worker {owner}] Lease on job {job_id} has expired unrenewed, stopping it")
+                lease_lost.set()
+                return
+
+
+def cancel_watcher(queue, job_id, owner, stop_event):
+    """Turn a 'cancelled' status set by the API into a local cancel flag for the running job."""
+    while not stop_event.wait(JOB_CANCEL_POLL_SECONDS):
+        try:
+            if queue.status(job_id) == "cancelled":
+                print(f"[Worker {owner}] Job {job_id} cancelled, stopping it")
+                request_cancel(job_id)
+                return
+        except Exception as e:
+            print(f"[Worker {owner}] Cancel check failed for job {job_id}: {e}")
+
+
+def usage_sampler(stop_event, usage):
+    """Track this run's share of the worker's peak process-tree RSS."""
+    while True:
+        with _active_lock:
+            active = max(_active_jobs, 1)
+        usage["peak_rss_mb"] = max(usage["peak_rss_mb"], process_tree_rss_mb() // active)
+        if stop_event.wait(RESOURCE_SAMPLE_SECONDS):
+            return
+
+
+def process_job(queue, job, owner):
+    global _active_jobs
+    job_id = job["id"]
+    payload = job.get("job_payload") or {}
+    print(f"[Worker {owner}] Claimed job {job_id} (attempt {job.get('attempts')})")
+
+    with _active_lock:
+        _active_jobs += 1
+    usage = {"peak_rss_mb": 0, "test_types": len(payload.get("test_types") or []), "node": WORKER_NODE,
+             "memory_budget_mb": NODE_MEMORY_BUDGET_MB}
+    started = time.monotonic()
+
+    stop_event = threading.Event()
+    lease_lost = threading.Event()
+    heartbeat = threading.Thread(target=heartbeat_loop, args=(queue, job_id, owner, stop_event, lease_lost),
+                                 daemon=True)
+    sampler = threading.Thread(target=usage_sampler, args=(stop_event, usage), daemon=True)
+    watcher = threading.Thread(target=cancel_watcher, args=(queue, job_id, owner, stop_event), daemon=True)
+    heartbeat.start()
+    sampler.start()
+    watcher.start()
+    try:
+        start_test_task(payload["url"], job_id, payload["test_types"], payload.get("temp_srs_path"),
+                        payload.get("force", False), lease_owner=owner, lease_lost=lease_lost)
+    finally:
+        stop_event.set()
+        heartbeat.join()
+        sampler.join()
+        watcher.join()
+        # The watcher may have raised the flag after the run finished; it is stopped now
+        clear_cancel(job_id)
+        with _active_lock:
+            _active_jobs -= 1
+        usage["duration_seconds"] = round(time.monotonic() - started, 1)
+        try:
+            queue.record_usage(job_id, usage)
+            queue.release(job_id, owner)
+        except Exception as e:
+            print(f"[Worker {owner}] Failed to release job {job_id}: {e}")
+    print(f"[Worker {owner}] Finished job {job_id}")
+
+
+def worker_slot(queue, admission, slot):
+    owner = f"{WORKER_ID}/{slot}"
+    while True:
+        try:
+            limits = admission.limits()
+            job = queue.claim(owner, JOB_LEASE_SECONDS, limits["global_running"], limits["user_running"])
+        except Exception as e:
+            print(f"[Worker {owner}] Claim failed: {e}")
+            job = None
+
+        if job is None:
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        process_job(queue, job, owner)
+
+
+def report_status(queue):
+    """
+    Report this worker's load and browser pool counters. The pools live in
+    this process's engine workers, which the API process cannot see.
+    """
+    with _active_lock:
+        active = _active_jobs
+    pool = get_engine().browser_pool_metrics() if TEST_EXECUTION_ENGINE != "subprocess" else None
+    queue.report_worker(WORKER_ID, {"node": WORKER_NODE, "active_jobs": active, "browser_pool": pool})
+
+
+def status_loop(queue):
+    while True:
+        try:
+            report_status(queue)
+        except Exception as e:
+            print(f"[Worker {WORKER_ID}] Status report failed: {e}")
+        time.sleep(WORKER_STATUS_SECONDS)
+
+
+def requeue_loop(queue):
+    while True:
+        try:
+            requeued = queue.requeue_expired(JOB_MAX_ATTEMPTS)
+            if requeued:
+                print(f"[Worker {WORKER_ID}] Requeued {requeued} job(s) with expired leases")
+        except Exception as e:
+            print(f"[Worker {WORKER_ID}] Requeue failed: {e}")
+        time.sleep(REQUEUE_INTERVAL_SECONDS)
+
+
+def main():
+    queue = get_job_queue()
+    admission = get_admission_controller(queue)
+    print(f" FigmaGuard worker {WORKER_ID} starting with {WORKER_CONCURRENCY} slot(s)")
+
+    threading.Thread(target=requeue_loop, args=(queue,), daemon=True).start()
+    threading.Thread(target=status_loop, args=(queue,), daemon=True).start()
+    slots = [
+        threading.Thread(target=worker_slot, args=(queue, admission, slot), daemon=True)
+        for slot in range(WORKER_CONCURRENCY)
+    ]
+    for slot in slots:
+        slot.start()
+    for slot in slots:
+        slot.join()
+
+
+if __name__ == "__main__":
+    main()
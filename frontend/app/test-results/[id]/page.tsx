@@ -8,6 +8,7 @@ import Header from "@/components/header"
 import Footer from "@/components/footer"
 import TestResultsView from "@/components/test-results-view"
 import { Loader2 } from "lucide-react"
+import { useTestRunEvents } from "@/hooks/use-test-run-events"
 
 export default function TestResultsPage() {
   const [testReport, setTestReport] = useState<any>(null)
@@ -21,6 +22,14 @@ export default function TestResultsPage() {
     fetchTestReport()
   }, [params.id])
 
+  // A run still in progress is followed over the event stream rather than re-fetched
+  const inProgress = testReport?.status === "pending" || testReport?.status === "running"
+  const live = useTestRunEvents(params.id as string, inProgress)
+
+  useEffect(() => {
+    if (live.done) fetchTestReport()
+  }, [live.done])
+
   const fetchTestReport = async () => {
     try {
       const { data, error } = await supabase
@@ -74,7 +83,13 @@ export default function TestResultsPage() {
       <ThemeProvider defaultTheme="dark" storageKey="figma-guard-theme">
         <Header />
         <main className="pt-24">
-          <TestResultsView testReport={testReport} />
+          <TestResultsView
+            testReport={
+              inProgress
+                ? { ...testReport, status: live.status || testReport.status, report_data: live.reportData }
+                : testReport
+            }
+          />
         </main>
         <Footer />
       </ThemeProvider>
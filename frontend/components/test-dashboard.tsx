@@ -1,48 +1,25 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState } from "react"
 import { useSearchParams } from "next/navigation"
 import { Tabs, TabsList, TabsTrigger, TabsContent } from "@/components/ui/tabs"
 import TestResults from "@/components/test-results"
 import WebPreview from "@/components/web-preview"
 import { Loader2 } from "lucide-react"
+import { useTestRunEvents } from "@/hooks/use-test-run-events"
 
 export default function TestDashboard() {
   const [activeTab, setActiveTab] = useState("all")
-  const [isLoading, setIsLoading] = useState(true)
-  const [testData, setTestData] = useState<any>(null) // State to hold fetched test data
   const searchParams = useSearchParams()
 
   const url = searchParams.get("url") || "https://example.com"
   const documentName = searchParams.get("document") || "requirements.pdf"
   const testRunId = searchParams.get("testRunId") // New: Get testRunId from query params
 
-  useEffect(() => {
-    const fetchTestData = async () => {
-      if (!testRunId) {
-        setIsLoading(false)
-        return // No test run ID, so nothing to fetch
-      }
-
-      try {
-        const response = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"}/api/test-results/${testRunId}`,
-        )
-        if (!response.ok) {
-          throw new Error("Failed to fetch test results")
-        }
-        const data = await response.json()
-        setTestData(data)
-      } catch (error) {
-        console.error("Error fetching test data:", error)
-        // Handle error, maybe show an error message to the user
-      } finally {
-        setIsLoading(false)
-      }
-    }
-
-    fetchTestData()
-  }, [testRunId])
+  // Results are pushed as each test finishes, so show them as soon as the first one arrives
+  const { reportData: testData, stages, done, error } = useTestRunEvents(testRunId)
+  const isLoading = !!testRunId && !done && !error && testData.all.length === 0
+  const runningStages = Object.values(stages).filter((s) => !["finished", "cancelled", "failed"].includes(s.stage))
 
   return (
     <section className="py-8 relative overflow-hidden">
@@ -112,7 +89,11 @@ export default function TestDashboard() {
                 <div className="flex flex-col items-center">
                   <Loader2 className="h-12 w-12 text-[#6A5ACD] animate-spin mb-4" />
                   <p className="text-lg font-medium">Running tests...</p>
-                  <p className="text-muted-foreground">This may take a few moments</p>
+                  <p className="text-muted-foreground">
+                    {runningStages.length > 0
+                      ? runningStages.map((s) => `${s.test_type}: ${s.stage}`).join(" • ")
+                      : "This may take a few moments"}
+                  </p>
                 </div>
               </div>
             ) : (
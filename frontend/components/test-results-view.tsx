@@ -61,6 +61,8 @@ export default function TestResultsView({ testReport }: TestResultsViewProps) {
         return <Badge className="bg-red-500/10 text-red-500 border-red-500/20">FAIL</Badge>
       case "warning":
         return <Badge className="bg-yellow-500/10 text-yellow-500 border-yellow-500/20">WARNING</Badge>
+      case "invalid":
+        return <Badge variant="secondary">INVALID</Badge>
       default:
         return <Badge variant="secondary">UNKNOWN</Badge>
     }
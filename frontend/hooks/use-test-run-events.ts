@@ -0,0 +1,135 @@
+"use client"
+
+import { useEffect, useState } from "react"
+import { createClientComponentClient } from "@supabase/auth-helpers-nextjs"
+
+const TEST_TYPES = ["functional", "uiux", "accessibility", "compatibility", "performance"]
+
+export type TestRunStage = {
+  test_type: string
+  stage: string
+  count?: number
+  timestamp?: string
+}
+
+export type TestRunEvents = {
+  reportData: Record<string, any[]>
+  stages: Record<string, TestRunStage>
+  status: string | null
+  summary: any
+  done: boolean
+  error: string | null
+}
+
+function emptyReportData(): Record<string, any[]> {
+  return Object.fromEntries(["all", ...TEST_TYPES].map((type) => [type, []]))
+}
+
+// Live stage transitions and per-test results for a test run, pushed by the
+// backend's /api/test-runs/<id>/events stream instead of polling the report.
+export function useTestRunEvents(testRunId: string | null | undefined, enabled = true): TestRunEvents {
+  const [state, setState] = useState<TestRunEvents>({
+    reportData: emptyReportData(),
+    stages: {},
+    status: null,
+    summary: null,
+    done: false,
+    error: null,
+  })
+
+  useEffect(() => {
+    if (!testRunId || !enabled) return
+
+    const supabase = createClientComponentClient()
+    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000"
+    let source: EventSource | null = null
+    let closed = false
+    // Id of the last stage or result received, so a reopened stream resumes after it
+    let lastEventId: string | null = null
+
+    const streamToken = async (): Promise<string | null> => {
+      const {
+        data: { session },
+      } = await supabase.auth.getSession()
+      if (!session) {
+        setState((prev) => ({ ...prev, error: "Authentication required" }))
+        return null
+      }
+      const response = await fetch(`${backendUrl}/api/test-runs/${testRunId}/events/token`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${session.access_token}` },
+      })
+      if (!response.ok) throw new Error(`Stream token request failed with HTTP ${response.status}`)
+      return (await response.json()).token
+    }
+
+    const open = async () => {
+      let token: string | null
+      try {
+        token = await streamToken()
+      } catch {
+        setState((prev) => ({ ...prev, error: "Could not open test run updates" }))
+        return
+      }
+      if (closed || !token) return
+
+      // EventSource cannot send headers, so a short-lived token scoped to this run goes in the
+      // query string; the session token itself never appears in a URL
+      const query = new URLSearchParams({ token })
+      if (lastEventId) query.set("after", lastEventId)
+      source = new EventSource(`${backendUrl}/api/test-runs/${testRunId}/events?${query}`)
+
+      source.addEventListener("status", (event) => {
+        const { status } = JSON.parse((event as MessageEvent).data)
+        setState((prev) => ({ ...prev, status }))
+      })
+
+      source.addEventListener("stage", (event) => {
+        lastEventId = (event as MessageEvent).lastEventId || lastEventId
+        const stage: TestRunStage = JSON.parse((event as MessageEvent).data)
+        setState((prev) => ({ ...prev, stages: { ...prev.stages, [stage.test_type]: stage } }))
+      })
+
+      source.addEventListener("result", (event) => {
+        lastEventId = (event as MessageEvent).lastEventId || lastEventId
+        const { test_type, result } = JSON.parse((event as MessageEvent).data)
+        setState((prev) => ({
+          ...prev,
+          reportData: {
+            ...prev.reportData,
+            all: [...prev.reportData.all, result],
+            [test_type]: [...(prev.reportData[test_type] || []), result],
+          },
+        }))
+      })
+
+      source.addEventListener("done", (event) => {
+        const { status, summary } = JSON.parse((event as MessageEvent).data)
+        setState((prev) => ({ ...prev, status, summary, done: true }))
+        // The server ends the stream here; stop EventSource from reconnecting
+        source?.close()
+      })
+
+      source.addEventListener("expired", () => {
+        // The stream token ran out on a reconnect: fetch a new one and resume from the last event
+        source?.close()
+        open()
+      })
+
+      source.onerror = () => {
+        if (source?.readyState === EventSource.CLOSED) {
+          setState((prev) => ({ ...prev, error: "Lost connection to test run updates" }))
+        }
+      }
+    }
+
+    open()
+
+    return () => {
+      closed = true
+      source?.close()
+    }
+  }, [testRunId, enabled])
+
+  return state
+}